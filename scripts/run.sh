@@ -22,6 +22,33 @@ echo "Test duration: ${TEST_DURATION}s"
 echo "Output directory: $OUTPUT_DIR"
 echo ""
 
+# Описание прогона для каталога прогонов (src/catalog.py): конфигурация, бинарник, время начала и конца
+write_run_info() {
+    python3 - "$OUTPUT_DIR/run_info.json" "$BINARY_PATH" "$MONITORING_INTERVAL" "$TEST_DURATION" "$1" << 'PYEOF'
+import hashlib, json, os, platform, sys
+from datetime import datetime
+
+path, binary, interval, duration, stage = sys.argv[1:]
+info = {}
+if os.path.exists(path):
+    with open(path) as f:
+        info = json.load(f)
+now = datetime.now().isoformat(timespec='seconds')
+if stage == 'start':
+    digest = hashlib.sha256()
+    with open(binary, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    info.update(binary=os.path.abspath(binary), binary_sha256=digest.hexdigest(),
+                binary_size=os.path.getsize(binary), interval=float(interval), duration=float(duration),
+                started_at=now, host=platform.node(), kernel=platform.release())
+else:
+    info['finished_at'] = now
+with open(path, 'w') as f:
+    json.dump(info, f, indent=2)
+PYEOF
+}
+
 # Проверка бинарного файла
 check_binary() {
     echo -e "${YELLOW}Checking binary file...${NC}"
@@ -232,7 +259,8 @@ See: monitoring_data/plots/tcp_analysis.png
 See: monitoring_data/plots/interrupt_analysis.png
 
 ## Raw Data
-All raw metrics are available in CSV format in the \`monitoring_data\` directory.
+All raw metrics are stored in binary format (\`*.bin\`, layout in \`schema.json\`) in the \`monitoring_data\` directory.
+To convert them to CSV: \`python3 ./src/export_csv.py monitoring_data\`
 
 ## Additional Information
 - Application logs: app_stdout.log, app_stderr.log
@@ -257,6 +285,7 @@ trap cleanup EXIT INT TERM
 main() {
     mkdir -p "$OUTPUT_DIR"
     check_binary
+    write_run_info start
 
     start_application
     sleep 2
@@ -279,6 +308,7 @@ main() {
     sleep 5
 
     cleanup
+    write_run_info finish
     generate_report
 
     echo ""
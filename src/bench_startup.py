@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Замер запуска и памяти монитора
+Время запуска monitoring.py, тяжёлые модули, которые он загружает, и RSS
+работающего сборщика -- всё, что монитор добавляет к метрикам измеряемой машины
+"""
+import argparse
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+MONITOR = SRC_DIR / 'monitoring.py'
+
+# Модули, которых в процессе сборщика быть не должно
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib', 'seaborn', 'scipy')
+
+# Запуск самого monitoring.py --help в том же интерпретаторе и печать загруженных им тяжёлых модулей
+MONITOR_RUN = """
+import runpy, sys
+sys.argv = [{monitor!r}, '--help']
+sys.path.insert(0, {src!r})
+try:
+    runpy.run_path({monitor!r}, run_name='__main__')
+except SystemExit:
+    pass
+print(' '.join(name for name in {heavy!r} if name in sys.modules), file=sys.stderr)
+"""
+
+
+def startup_times(arguments, runs):
+    """Время от запуска интерпретатора с arguments до его выхода, секунды"""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def spread(times):
+    """Разброс времён в мс: min, медиана, p90 и max"""
+    ordered = sorted(times)
+    p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+    return (f"min {ordered[0] * 1000:.0f} ms, median {statistics.median(ordered) * 1000:.0f} ms, "
+            f"p90 {p90 * 1000:.0f} ms, max {ordered[-1] * 1000:.0f} ms")
+
+
+def heavy_imports():
+    """Тяжёлые модули в процессе monitoring.py после разбора аргументов"""
+    code = MONITOR_RUN.format(monitor=str(MONITOR), src=str(SRC_DIR), heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, check=True)
+    return result.stderr.split()
+
+
+def status_kb(pid, field):
+    """Поле VmRSS/VmHWM из /proc/<pid>/status в КБ"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return None
+
+
+def collector_memory(seconds, interval):
+    """RSS и пиковый RSS сборщика, который seconds секунд следит за спящим процессом, КБ"""
+    target = subprocess.Popen(['sleep', str(seconds + 30)])
+    with tempfile.TemporaryDirectory() as output_dir:
+        monitor = subprocess.Popen([sys.executable, str(MONITOR), str(target.pid), output_dir, str(interval)],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            time.sleep(seconds)
+            if monitor.poll() is not None:
+                print(f"Error: monitoring.py exited with code {monitor.returncode}")
+                return None, None
+            return status_kb(monitor.pid, 'VmRSS'), status_kb(monitor.pid, 'VmHWM')
+        finally:
+            monitor.send_signal(signal.SIGINT)
+            try:
+                monitor.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                monitor.kill()
+            target.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время запуска и память монитора")
+    parser.add_argument("--runs", type=int, default=10, help="Число запусков для замера времени")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Сколько секунд держать сборщик для замера RSS")
+    parser.add_argument("--interval", type=float, default=0.5, help="Интервал сбора сборщика")
+    args = parser.parse_args()
+
+    times = startup_times([str(MONITOR), '--help'], args.runs)
+    bare = startup_times(['-c', 'pass'], args.runs)
+    print(f"Startup (monitoring.py --help, {args.runs} runs): {spread(times)}")
+    print(f"Bare interpreter: {spread(bare)}")
+
+    heavy = heavy_imports()
+    print(f"Heavy modules imported: {', '.join(heavy) if heavy else 'none'}")
+
+    rss, peak = collector_memory(args.seconds, args.interval)
+    if rss is not None:
+        print(f"Collector RSS after {args.seconds:g}s: {rss / 1024:.1f} MB (peak {peak / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
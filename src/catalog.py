@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Каталог прогонов анализа в SQLite
+Индексирует каталоги performance_analysis_* (описание, длительность, сводка
+метрик, аномалии) и отвечает на запросы по всем прогонам без повторного анализа
+"""
+import argparse
+import sqlite3
+from datetime import datetime, timedelta
+from modules.catalog import CATALOG_FILENAME, STATS, RunCatalog
+
+
+def since_option(args):
+    """Начало интервала запроса в ISO формате из --since или --days"""
+    if args.days is not None:
+        return (datetime.now() - timedelta(days=args.days)).isoformat(timespec='seconds')
+    return args.since
+
+
+def print_rows(rows):
+    """Напечатать строки результата таблицей"""
+    if not rows:
+        print("No rows")
+        return
+    columns = list(rows[0].keys())
+    cells = [[f"{value:.4g}" if isinstance(value, float) else str(value) for value in (row[c] for c in columns)]
+             for row in rows]
+    widths = [max(len(column), *(len(row[i]) for row in cells)) for i, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in cells:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Каталог прогонов анализа производительности")
+    parser.add_argument("--db", default=CATALOG_FILENAME, help=f"Файл каталога (по умолчанию {CATALOG_FILENAME})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="Добавить новые и изменившиеся прогоны")
+    scan.add_argument("roots", nargs="*", default=["."],
+                      help="Каталоги прогонов или каталоги, в которых они лежат (по умолчанию текущий)")
+    scan.add_argument("--force", action="store_true", help="Пересчитать все прогоны, даже неизменившиеся")
+
+    queries = []
+    runs = commands.add_parser("runs", help="Список прогонов")
+    queries.append(runs)
+    anomalies = commands.add_parser("anomalies", help="Прогоны с аномалиями, например --issue leak")
+    anomalies.add_argument("--issue", default=None, help="Подстрока названия аномалии")
+    anomalies.add_argument("--severity", choices=("CRITICAL", "HIGH", "MEDIUM", "LOW"), default=None)
+    queries.append(anomalies)
+    stats = commands.add_parser("stats", help="Статистика ряда по прогонам, например cpu.runqueue --stat p95")
+    stats.add_argument("metric", metavar="FAMILY.METRIC", help="Ряд; у счётчиков -- скорость, например "
+                                                               "threads.involuntary_switches_rate")
+    stats.add_argument("--stat", choices=STATS, default="mean")
+    queries.append(stats)
+    for query in queries:
+        query.add_argument("--since", default=None, metavar="DATE", help="Только прогоны, начатые не раньше DATE (ISO)")
+        query.add_argument("--days", type=float, default=None, metavar="N", help="Только прогоны за последние N дней")
+
+    sql = commands.add_parser("sql", help="Произвольный SQL запрос (таблицы runs, metrics, anomalies)")
+    sql.add_argument("query")
+    args = parser.parse_args()
+
+    catalog = RunCatalog(args.db)
+    try:
+        if args.command == "scan":
+            scanned, unchanged, removed = catalog.scan(args.roots, force=args.force)
+            print(f"Catalog {args.db}: {scanned} runs indexed, {unchanged} unchanged, {removed} removed")
+        elif args.command == "runs":
+            print_rows([{key: row[key] for key in ('started_at', 'duration', 'binary', 'anomalies', 'run_dir')}
+                        for row in catalog.runs(since_option(args))])
+        elif args.command == "anomalies":
+            print_rows([{key: row[key] for key in ('started_at', 'severity', 'issue', 'details', 'run_dir')}
+                        for row in catalog.anomalies(args.issue, args.severity, since_option(args))])
+        elif args.command == "stats":
+            family, _, metric = args.metric.partition('.')
+            rows = catalog.stats(family, metric, args.stat, since_option(args))
+            print_rows(rows)
+            values = [row['value'] for row in rows if row['value'] is not None]
+            if values:
+                print(f"\n{args.stat} of {args.metric} over {len(values)} runs: min {min(values):.4g}, "
+                      f"mean {sum(values) / len(values):.4g}, max {max(values):.4g} {rows[0]['unit']}")
+        else:
+            print_rows(catalog.query(args.query))
+    except sqlite3.Error as e:
+        parser.error(f"query failed: {e}")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
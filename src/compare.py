@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Сравнение двух прогонов (база и кандидат) для проверки регрессий
+Печатает доверительные интервалы разностей и вердикт pass/fail; код выхода 1 при регрессии
+"""
+import argparse
+import copy
+import json
+import sys
+import time
+from modules.regression import CONFIDENCE, REGRESSION_METRICS, RESAMPLES, WARMUP, compare_runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A/B сравнение двух прогонов с бутстреп интервалами")
+    parser.add_argument("baseline", help="Каталог с метриками базового прогона")
+    parser.add_argument("candidate", help="Каталог с метриками кандидата")
+    parser.add_argument("--warmup", type=float, default=WARMUP, metavar="SEC",
+                        help=f"Сколько секунд с начала записи отбросить (по умолчанию {WARMUP:g})")
+    parser.add_argument("--resamples", type=int, default=RESAMPLES, metavar="N",
+                        help=f"Число бутстреп выборок (по умолчанию {RESAMPLES})")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE,
+                        help=f"Уровень доверительного интервала (по умолчанию {CONFIDENCE})")
+    parser.add_argument("--tolerance", action="append", default=[], metavar="[NAME=]REL",
+                        help="Допустимый относительный рост: для всех рядов или для одного "
+                             f"({', '.join(metric['name'] for metric in REGRESSION_METRICS)}); можно повторять")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора бутстрепа")
+    parser.add_argument("--output", default=None, metavar="FILE", help="Записать вердикт в JSON файл")
+    args = parser.parse_args()
+
+    metrics = copy.deepcopy(REGRESSION_METRICS)
+    names = {metric['name']: metric for metric in metrics}
+    for option in args.tolerance:
+        name, _, value = option.rpartition('=')
+        try:
+            value = float(value)
+        except ValueError:
+            parser.error(f"--tolerance expects [NAME=]REL, got {option!r}")
+        if name and name not in names:
+            parser.error(f"unknown metric {name!r} in --tolerance")
+        for metric in ([names[name]] if name else metrics):
+            metric['tolerance'] = value
+
+    started = time.perf_counter()
+    result = compare_runs(args.baseline, args.candidate, metrics, args.warmup, args.resamples, args.confidence,
+                          args.seed)
+
+    print(f"Baseline:  {args.baseline}\nCandidate: {args.candidate}")
+    print(f"{args.resamples} block bootstrap resamples, {args.confidence:.0%} intervals, "
+          f"warm-up {args.warmup:g}s\n")
+    for check in result['checks']:
+        label = f"{check['metric']:22s} {check['stat']:5s}"
+        if check['status'] == 'skipped':
+            print(f"{label} SKIPPED   {check['reason']}")
+            continue
+        unit = check['unit']
+        print(f"{label} {check['status'].upper():9s} {check['baseline']:12.4g} -> {check['candidate']:<12.4g} "
+              f"diff {check['diff']:+.4g} {unit} [{check['ci'][0]:+.4g}, {check['ci'][1]:+.4g}], "
+              f"allowed +{check['allowed']:.4g}")
+    print(f"\nVerdict: {result['verdict'].upper()} ({time.perf_counter() - started:.2f}s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Verdict saved to: {args.output}")
+    sys.exit(1 if result['verdict'] == 'fail' else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,79 @@
 Автоматический детектор аномалий в метриках производительности
 Анализирует собранные данные и выявляет проблемы
 """
-import sys
+import argparse
+import json
 from modules import AnomalyDetector
+from modules.anomaly_detector import CHANGE_POINT_METRICS
+from modules.batch_detector import COMBINED_REPORT, detect_runs, run_data_dir
+from modules.rules import RULES, load_rules
+from modules.schema import FILENAMES
 
 def main():
-    data_dir = sys.argv[1] if len(sys.argv) > 1 else "monitoring_data"
+    parser = argparse.ArgumentParser(description="Поиск аномалий в метриках производительности")
+    parser.add_argument("data_dirs", nargs="*", default=["monitoring_data"], metavar="data_dir",
+                        help="Каталоги с метриками монитора или каталоги прогонов performance_analysis_* "
+                             "(несколько -- пакетный режим)")
+    parser.add_argument("--from", dest="start", type=float, default=None, metavar="SEC",
+                        help="Начало окна анализа (секунды timestamp)")
+    parser.add_argument("--to", dest="end", type=float, default=None, metavar="SEC",
+                        help="Конец окна анализа (секунды timestamp)")
+    parser.add_argument("--tier", choices=("auto", "raw", "10s", "1m"), default="raw",
+                        help="Уровень данных: raw -- сырые сэмплы, auto -- самая грубая свёртка, разрешающая "
+                             "окно; на свёртках правила проверяются по максимуму корзины, а сэмплы -- это корзины")
+    parser.add_argument("--rules", default=None, metavar="FILE",
+                        help="JSON файл с правилами вместо встроенных (формат -- см. --dump-rules)")
+    parser.add_argument("--dump-rules", action="store_true",
+                        help="Напечатать встроенные правила в JSON и выйти")
+    parser.add_argument("--cache", action="store_true",
+                        help="Кэшировать разобранные метрики в <data_dir>/.cache: повторный анализ почти бесплатен")
+    parser.add_argument("--chunk-rows", type=int, default=None, metavar="N",
+                        help="Читать метрики кусками по N строк: память ограничена куском, а не длиной записи "
+                             "(примерно N * 8 байт на колонку каждого семейства)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Проверять правила только на строках, дописанных с прошлого запуска "
+                             "(контрольная точка в <data_dir>/.cache); всегда по сырым данным всей записи")
+    parser.add_argument("--change-points", action="store_true",
+                        help="Искать смены режима (сдвиги среднего) в ключевых рядах: когда и на сколько")
+    parser.add_argument("--change-metric", action="append", default=None, metavar="FAMILY.COLUMN",
+                        help="Ряд для поиска смен режима вместо ключевых (можно повторять, "
+                             "например memory.rss_mb); у счётчиков берётся скорость")
+    parser.add_argument("--jobs", type=int, default=None, metavar="N",
+                        help="Пакетный режим: задачи (прогон x семейство) в N процессах (по умолчанию -- все ядра)")
+    parser.add_argument("--report", default=COMBINED_REPORT, metavar="FILE",
+                        help=f"Общий отчёт пакетного режима (по умолчанию {COMBINED_REPORT})")
+    args = parser.parse_args()
 
-    detector = AnomalyDetector(data_dir)
+    if args.dump_rules:
+        print(json.dumps(RULES, indent=2))
+        return
+    rules = RULES
+    if args.rules is not None:
+        try:
+            rules = load_rules(args.rules)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot load rules: {e}")
+    change_metrics = CHANGE_POINT_METRICS if args.change_points else None
+    if args.change_metric:
+        change_metrics = [tuple(metric.split('.', 1)) for metric in args.change_metric]
+        for metric in change_metrics:
+            if len(metric) != 2 or metric[0] not in FILENAMES:
+                parser.error(f"--change-metric expects FAMILY.COLUMN, got {'.'.join(metric)!r}")
+    window = (args.start, args.end) if args.start is not None or args.end is not None else None
+
+    tier = None if args.tier == 'raw' else args.tier
+    if args.incremental:
+        if window is not None:
+            parser.error("--incremental checks the whole recording and cannot be combined with --from/--to")
+        tier = None
+
+    if len(args.data_dirs) > 1 or args.jobs is not None:
+        detect_runs(args.data_dirs, args.jobs, rules, change_metrics, args.report, window=window, tier=tier,
+                    cache=args.cache, chunk_rows=args.chunk_rows, incremental=args.incremental)
+        return
+    detector = AnomalyDetector(run_data_dir(args.data_dirs[0]), window, tier, rules,
+                               cache=args.cache, chunk_rows=args.chunk_rows, change_metrics=change_metrics,
+                               incremental=args.incremental)
     detector.run_detection()
 
 if __name__ == "__main__":
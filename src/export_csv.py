@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+
+"""
+Экспорт метрик из двоичного формата в CSV
+Создаёт файлы с теми же именами и колонками, что и монитор в режиме --format csv
+"""
+import sys
+from pathlib import Path
+from modules.loader import export_csv
+
+def main():
+    data_dir = Path(sys.argv[1] if len(sys.argv) > 1 else "monitoring_data")
+    output_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else data_dir
+
+    export_csv(data_dir, output_dir)
+
+if __name__ == "__main__":
+    main()
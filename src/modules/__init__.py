@@ -1,3 +1,26 @@
-from .perf_monitor import PerformanceMonitor
-from .visualizer import MetricsVisualizer
-from .anomaly_detector import AnomalyDetector
\ No newline at end of file
+import importlib
+
+# Классы пакета и их модули. Модули импортируются при первом обращении (PEP 562):
+# монитору хватает стандартной библиотеки, а pandas, matplotlib и seaborn
+# визуализатора и детектора загружаются, только когда они нужны
+_EXPORTS = {
+    'PerformanceMonitor': '.perf_monitor',
+    'ProcfsMonitor': '.procfs_monitor',
+    'TargetSet': '.targets',
+    'MetricsVisualizer': '.visualizer',
+    'AnomalyDetector': '.anomaly_detector',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,109 @@
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from .anomaly_detector import AnomalyDetector
+from .rules import RULES, SEVERITIES
+
+# Каталог метрик внутри каталога прогона performance_analysis_* (см. scripts/run.sh)
+RUN_DATA_DIRNAME = 'monitoring_data'
+
+# Общий отчёт по всем прогонам
+COMBINED_REPORT = 'combined_anomaly_report.json'
+
+
+def run_data_dir(path):
+    """Каталог метрик прогона: monitoring_data внутри каталога прогона или сам каталог"""
+    path = Path(path)
+    nested = path / RUN_DATA_DIRNAME
+    return nested if nested.is_dir() else path
+
+
+def _detect_family(task):
+    """Правила и смены режима одного семейства одного прогона; выполняется в процессе пула
+
+    rules и metrics -- пары (номер в общем списке, правило или ряд), чтобы
+    находки можно было расставить в порядке общего списка. Вывод детектора
+    (сообщения загрузчика и ошибки) собирается в строку и печатается
+    родителем, чтобы не перемешиваться.
+    """
+    data_dir, rules, metrics, options = task
+    detector = AnomalyDetector(data_dir, rules=[rule for _, rule in rules], **options)
+    log = io.StringIO()
+    findings, shifts = [], []
+    with redirect_stdout(log):
+        try:
+            if rules:
+                findings = [(rules[j][0], anomaly) for j, anomaly in detector.evaluate_rules()]
+            if metrics:
+                shifts = [(metrics[j][0], anomaly)
+                          for j, anomaly in detector.find_change_points([metric for _, metric in metrics])]
+        except Exception as e:
+            print(f"Error analyzing {data_dir}: {e}")
+    return findings, shifts, detector.change_points, log.getvalue()
+
+
+def detect_runs(data_dirs, jobs=None, rules=RULES, change_metrics=None, report=COMBINED_REPORT, **options):
+    """Детектирование по многим прогонам в пуле процессов
+
+    Работа делится на задачи (прогон x семейство): каждая проверяет правила
+    и ищет смены режима только своего семейства, поэтому задачи независимы
+    и занимают все ядра. Находки каждого прогона собираются в порядке
+    правил, а затем рядов смены режима -- так же, как при последовательном
+    run_detection, независимо от того, какая задача закончилась раньше.
+    Для каждого прогона пишется его anomaly_report.json, для всех вместе --
+    общий отчёт report. options передаются AnomalyDetector (window, tier,
+    cache, chunk_rows). Возвращает детекторы прогонов с собранными находками.
+    """
+    data_dirs = [run_data_dir(data_dir) for data_dir in data_dirs]
+    rules = list(rules)
+    metrics = list(change_metrics or ())
+    families = list(dict.fromkeys([rule['family'] for rule in rules] + [family for family, _ in metrics]))
+
+    tasks = []
+    for data_dir in data_dirs:
+        for family in families:
+            tasks.append((
+                data_dir,
+                [(i, rule) for i, rule in enumerate(rules) if rule['family'] == family],
+                [(k, metric) for k, metric in enumerate(metrics) if metric[0] == family],
+                options,
+            ))
+
+    jobs = jobs or os.cpu_count()
+    print(f"Analyzing {len(data_dirs)} runs x {len(families)} metric families with {jobs} processes...")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(_detect_family, tasks))
+
+    detectors = []
+    for n, data_dir in enumerate(data_dirs):
+        parts = results[n * len(families):(n + 1) * len(families)]
+        detector = AnomalyDetector(data_dir, rules=rules, change_metrics=change_metrics, **options)
+        print(f"\n{'#' * 60}\n# {data_dir}\n{'#' * 60}")
+        for _, _, change_points, log in parts:
+            print(log, end='')
+            detector.change_points.update(change_points)
+        detector.detect_anomalies(sorted((pair for part in parts for pair in part[0]), key=lambda pair: pair[0]))
+        if metrics:
+            detector.detect_change_points(metrics, found=sorted((pair for part in parts for pair in part[1]),
+                                                                key=lambda pair: pair[0]))
+        detector.generate_summary()
+        detectors.append(detector)
+
+    print("\n" + "=" * 60)
+    print("COMBINED SUMMARY")
+    print("=" * 60)
+    for detector in detectors:
+        counts = [sum(anomaly['severity'] == severity for anomaly in detector.anomalies) for severity in SEVERITIES]
+        print(f"{len(detector.anomalies):4d} anomalies "
+              f"({', '.join(f'{severity.lower()} {count}' for severity, count in zip(SEVERITIES, counts))}) "
+              f"in {detector.data_dir}")
+
+    combined = [{'data_dir': str(detector.data_dir), 'anomalies': detector.anomalies} for detector in detectors]
+    with open(report, 'w') as f:
+        json.dump(combined, f, indent=2)
+    print(f"\nCombined report saved to: {report}")
+    return detectors
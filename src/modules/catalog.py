@@ -0,0 +1,266 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .anomaly_detector import AnomalyDetector
+from .batch_detector import run_data_dir
+from .loader import clear_cache, family_names, load_frame, time_range
+from .schema import (COLUMN_TYPES, COUNTER_COLUMNS, DEFAULT_TYPE, ROLLUP_FAMILIES, SCHEDULE_COLUMNS, column_unit,
+                     rate_column)
+
+# Файл каталога по умолчанию
+CATALOG_FILENAME = 'perf_catalog.sqlite'
+
+# Описание прогона, которое пишет scripts/run.sh в каталог прогона
+RUN_INFO_FILENAME = 'run_info.json'
+
+# Имя каталога прогона scripts/run.sh: performance_analysis_YYYYmmdd_HHMMSS
+RUN_DIR_PREFIX = 'performance_analysis_'
+RUN_DIR_TIME = '%Y%m%d_%H%M%S'
+
+# Статистики колонки, которые хранятся в каталоге
+STATS = ('samples', 'mean', 'min', 'max', 'p50', 'p95', 'p99')
+
+# Файлы метрик, по которым определяется, изменился ли прогон
+METRIC_SUFFIXES = {'.bin', '.csv'}
+METRIC_FILES = {'schema.json', 'manifest.json'}
+SKIP_DIRS = {'.cache', 'plots'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_dir TEXT PRIMARY KEY,
+    data_dir TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    scanned_at REAL NOT NULL,
+    started_at TEXT,
+    duration REAL,
+    binary TEXT,
+    interval REAL,
+    info TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_dir TEXT NOT NULL REFERENCES runs(run_dir) ON DELETE CASCADE,
+    family TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    unit TEXT,
+    samples INTEGER, mean REAL, min REAL, max REAL, p50 REAL, p95 REAL, p99 REAL,
+    PRIMARY KEY (run_dir, family, metric)
+);
+CREATE TABLE IF NOT EXISTS anomalies (
+    run_dir TEXT NOT NULL REFERENCES runs(run_dir) ON DELETE CASCADE,
+    category TEXT, severity TEXT, issue TEXT, details TEXT
+);
+CREATE INDEX IF NOT EXISTS anomalies_issue ON anomalies(issue);
+"""
+
+
+def is_run(path):
+    """Есть ли в каталоге (или в его monitoring_data) записанные метрики"""
+    return path.is_dir() and bool(family_names(run_data_dir(path)))
+
+
+def find_runs(root):
+    """Прогоны под корнем: сам корень, если это прогон, иначе его подкаталоги-прогоны по имени"""
+    root = Path(root)
+    if is_run(root):
+        return [root]
+    if not root.is_dir():
+        return []
+    return [path for path in sorted(root.iterdir()) if is_run(path)]
+
+
+def run_signature(run_dir):
+    """Версия прогона: пути, mtime и размеры файлов метрик и описания прогона
+
+    Отчёты, графики и кэш загрузчика не учитываются: их появление прогон
+    не меняет.
+    """
+    digest = hashlib.sha1()
+    for directory, dirs, files in os.walk(run_dir):
+        dirs[:] = sorted(name for name in dirs if name not in SKIP_DIRS)
+        for name in sorted(files):
+            if name in METRIC_FILES or name == RUN_INFO_FILENAME or os.path.splitext(name)[1] in METRIC_SUFFIXES:
+                stat = os.stat(os.path.join(directory, name))
+                digest.update(f"{os.path.join(directory, name)}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+    return digest.hexdigest()
+
+
+def read_run_info(run_dir):
+    """Описание прогона из run_info.json или {}, если его нет"""
+    try:
+        with open(run_dir / RUN_INFO_FILENAME) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Error reading {run_dir / RUN_INFO_FILENAME}: {e}")
+        return {}
+
+
+def run_started_at(run_dir, info):
+    """Время начала прогона в ISO формате: из описания, из имени каталога или по mtime"""
+    if info.get('started_at'):
+        return info['started_at']
+    if run_dir.name.startswith(RUN_DIR_PREFIX):
+        try:
+            return datetime.strptime(run_dir.name[len(RUN_DIR_PREFIX):], RUN_DIR_TIME).isoformat()
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(run_dir.stat().st_mtime).isoformat(timespec='seconds')
+
+
+def summary_columns(family, df):
+    """Ряды семейства для сводки: числовые колонки, у счётчиков -- скорость"""
+    counters = COUNTER_COLUMNS.get(family, ())
+    columns = []
+    for column in df.columns:
+        if column in ('tick', 'timestamp', *SCHEDULE_COLUMNS) or column.endswith('_rate'):
+            continue
+        if COLUMN_TYPES.get(column, DEFAULT_TYPE) != DEFAULT_TYPE:
+            continue
+        columns.append(rate_column(column) if column in counters else column)
+    return columns
+
+
+def column_stats(values):
+    """Статистики ряда без NaN: число значений, среднее, min, max и перцентили"""
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return dict.fromkeys(STATS) | {'samples': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'samples': len(values), 'mean': float(values.mean()), 'min': float(values.min()),
+            'max': float(values.max()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+class RunCatalog:
+    """Каталог прогонов в SQLite: описание, длительность, сводка метрик и аномалии каждого прогона
+
+    Сводка считается по сырым данным семейств со строкой на тик (cpu,
+    memory, ...): для каждой числовой колонки (у счётчиков -- для скорости)
+    число сэмплов, среднее, min, max, p50, p95 и p99. Аномалии -- находки
+    правил детектора. При повторном сканировании пересчитываются только
+    новые прогоны и те, у которых изменились файлы метрик (см. run_signature);
+    прогоны, каталогов которых больше нет, удаляются.
+    """
+
+    def __init__(self, path=CATALOG_FILENAME):
+        self.path = Path(path)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def scan(self, roots, force=False):
+        """Обновить каталог по прогонам под roots; возвращает (пересчитано, без изменений, удалено)"""
+        signatures = {row['run_dir']: row['signature'] for row in self.db.execute('SELECT run_dir, signature FROM runs')}
+        scanned = unchanged = 0
+        for root in roots:
+            for run_dir in find_runs(root):
+                key = str(run_dir.resolve())
+                signature = run_signature(key)
+                if not force and signatures.get(key) == signature:
+                    unchanged += 1
+                    continue
+                try:
+                    self._index(run_dir, key, signature)
+                    scanned += 1
+                except Exception as e:
+                    self.db.rollback()
+                    print(f"Error indexing {run_dir}: {e}")
+                finally:
+                    # Кадры прогона больше не понадобятся, память не должна расти с числом прогонов
+                    clear_cache()
+
+        removed = [run for run in signatures if not Path(run).is_dir()]
+        with self.db:
+            self.db.executemany('DELETE FROM runs WHERE run_dir = ?', [(run,) for run in removed])
+        return scanned, unchanged, len(removed)
+
+    def _index(self, run_dir, key, signature):
+        """Пересчитать сводку одного прогона и заменить его записи в каталоге"""
+        started = time.perf_counter()
+        data_dir = run_data_dir(run_dir)
+        info = read_run_info(run_dir)
+        extent = time_range(data_dir)
+        duration = extent[1] - extent[0] if extent is not None else info.get('duration')
+
+        metrics = []
+        for family in family_names(data_dir):
+            if family not in ROLLUP_FAMILIES:
+                continue
+            df = load_frame(data_dir, family, rates=True)
+            if df is None or not len(df):
+                continue
+            for column in summary_columns(family, df):
+                stats = column_stats(df[column].to_numpy(dtype=float))
+                metrics.append((key, family, column, column_unit(column), *(stats[name] for name in STATS)))
+
+        # Те же кадры уже в кэше загрузчика, правила их не перечитывают
+        detector = AnomalyDetector(data_dir, tier=None)
+        with redirect_stdout(io.StringIO()):
+            anomalies = [(key, anomaly['category'], anomaly['severity'], anomaly['issue'], anomaly['details'])
+                         for _, anomaly in detector.evaluate_rules()]
+
+        with self.db:
+            self.db.execute('DELETE FROM runs WHERE run_dir = ?', (key,))
+            self.db.execute(
+                'INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, str(data_dir.resolve()), signature, time.time(), run_started_at(run_dir, info), duration,
+                 info.get('binary'), info.get('interval'), json.dumps(info)),
+            )
+            self.db.executemany(f"INSERT INTO metrics VALUES (?, ?, ?, ?, {', '.join('?' * len(STATS))})", metrics)
+            self.db.executemany('INSERT INTO anomalies VALUES (?, ?, ?, ?, ?)', anomalies)
+        print(f"Indexed {run_dir}: {len(metrics)} metrics, {len(anomalies)} anomalies "
+              f"({time.perf_counter() - started:.2f}s)")
+
+    @staticmethod
+    def _since(since, alias='runs'):
+        """Условие на время начала прогона и его параметры"""
+        if since is None:
+            return '', []
+        return f" AND {alias}.started_at >= ?", [since]
+
+    def runs(self, since=None):
+        """Прогоны с числом аномалий, по времени начала"""
+        where, params = self._since(since)
+        return self.db.execute(
+            'SELECT runs.*, (SELECT COUNT(*) FROM anomalies WHERE anomalies.run_dir = runs.run_dir) AS anomalies '
+            f'FROM runs WHERE 1 = 1{where} ORDER BY started_at', params).fetchall()
+
+    def anomalies(self, issue=None, severity=None, since=None):
+        """Аномалии прогонов; issue -- подстрока названия без учёта регистра"""
+        where, params = self._since(since)
+        if issue is not None:
+            where += ' AND anomalies.issue LIKE ?'
+            params.append(f"%{issue}%")
+        if severity is not None:
+            where += ' AND anomalies.severity = ?'
+            params.append(severity)
+        return self.db.execute(
+            'SELECT runs.started_at, runs.run_dir, anomalies.* FROM anomalies JOIN runs USING (run_dir) '
+            f'WHERE 1 = 1{where} ORDER BY runs.started_at', params).fetchall()
+
+    def stats(self, family, metric, stat='mean', since=None):
+        """Статистика stat ряда family.metric по прогонам"""
+        if stat not in STATS:
+            raise ValueError(f"unknown statistic {stat!r}, expected one of {', '.join(STATS)}")
+        where, params = self._since(since)
+        return self.db.execute(
+            f'SELECT runs.started_at, runs.run_dir, metrics.unit, metrics.{stat} AS value '
+            'FROM metrics JOIN runs USING (run_dir) WHERE metrics.family = ? AND metrics.metric = ?'
+            f'{where} ORDER BY runs.started_at', [family, metric, *params]).fetchall()
+
+    def query(self, sql, params=()):
+        """Произвольный SQL запрос к каталогу"""
+        return self.db.execute(sql, params).fetchall()
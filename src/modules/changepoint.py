@@ -0,0 +1,139 @@
+import bisect
+import math
+
+import numpy as np
+
+# Минимальная длина участка между точками смены режима, в сэмплах
+MIN_SIZE = 5
+
+# Больше стольких точек в ряду не ищется
+MAX_POINTS = 10
+
+
+def noise_sigma(values):
+    """Оценка шума ряда по первым разностям (MAD), не чувствительная к самим сдвигам"""
+    if len(values) < 3:
+        return 0.0
+    diff = np.diff(values)
+    mad = np.median(np.abs(diff - np.median(diff)))
+    return mad / 0.6745 / math.sqrt(2)
+
+
+def _layer_gains(sums, squares, starts, length, min_size):
+    """Лучший разрез каждого интервала [start, start + length) одного слоя
+
+    Все интервалы слоя одной длины, поэтому выигрыши всех разрезов всех
+    интервалов считаются одной операцией над матрицей (интервал x разрез).
+    """
+    offsets = np.arange(min_size, length - min_size + 1)
+    a = starts[:, None]
+    b = a + length
+    t = a + offsets[None, :]
+    total = squares[b] - squares[a] - (sums[b] - sums[a]) ** 2 / length
+    left = squares[t] - squares[a] - (sums[t] - sums[a]) ** 2 / (t - a)
+    right = squares[b] - squares[t] - (sums[b] - sums[t]) ** 2 / (b - t)
+    gains = total - left - right
+    best = np.argmax(gains, axis=1)
+    rows = np.arange(len(starts))
+    return gains[rows, best], t[rows, best]
+
+
+def change_points(values, penalty=None, min_size=MIN_SIZE, max_points=MAX_POINTS):
+    """Индексы, с которых начинается новый режим (сдвиг среднего), по возрастанию
+
+    Seeded binary segmentation: ряд покрывается интервалами всех масштабов
+    (длины n, n/2, n/4, ... с перекрытием в половину длины), в каждом
+    интервале ищется лучший разрез по квадратичной стоимости -- сумме
+    квадратов отклонений от среднего участка, которая считается за O(1) по
+    накопленным суммам. Каждый масштаб обрабатывается одной векторной
+    операцией, всего O(n log n). Затем разрезы берутся жадно по убыванию
+    выигрыша, пока он больше штрафа; интервалы, содержащие уже принятую
+    точку, пропускаются; в конце убираются точки, которые не окупают штраф
+    между соседними. В отличие от простой бинарной сегментации короткие
+    всплески находятся в коротких интервалах.
+
+    Штраф по умолчанию -- BIC: 2 * sigma^2 * ln(n) с оценкой шума по noise_sigma.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < 2 * min_size:
+        return []
+
+    # Центрирование уменьшает потерю точности в накопленных суммах квадратов
+    centered = values - values.mean()
+    sums = np.concatenate(([0.0], np.cumsum(centered)))
+    squares = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    if penalty is None:
+        sigma = noise_sigma(values) or 1e-9 * (np.abs(centered).max() or 1.0)
+        penalty = 2 * sigma * sigma * math.log(n)
+
+    gains, splits, lefts, rights = [], [], [], []
+    length = n
+    while length >= 2 * min_size:
+        step = max(length // 2, 1)
+        starts = np.arange(0, n - length + 1, step)
+        if starts[-1] != n - length:
+            starts = np.append(starts, n - length)
+        layer_gains, layer_splits = _layer_gains(sums, squares, starts, length, min_size)
+        gains.append(layer_gains)
+        splits.append(layer_splits)
+        lefts.append(starts)
+        rights.append(starts + length)
+        length //= 2
+
+    gains, splits = np.concatenate(gains), np.concatenate(splits)
+    lefts, rights = np.concatenate(lefts), np.concatenate(rights)
+    order = np.argsort(-gains, kind='stable')
+    order = order[gains[order] > penalty]
+
+    points = []
+    for i in order:
+        if len(points) >= max_points:
+            break
+        # Интервал, внутри которого уже есть принятая точка, больше не делится
+        k = bisect.bisect_right(points, lefts[i])
+        if k < len(points) and points[k] < rights[i]:
+            continue
+        bisect.insort(points, int(splits[i]))
+
+    # Жадный выбор может оставить лишнюю точку рядом с настоящей: убираем точки,
+    # выигрыш которых между соседними точками уже не больше штрафа
+    def cost(a, b):
+        return squares[b] - squares[a] - (sums[b] - sums[a]) ** 2 / (b - a)
+
+    while points:
+        bounds = [0, *points, n]
+        local = [cost(bounds[i], bounds[i + 2]) - cost(bounds[i], bounds[i + 1]) - cost(bounds[i + 1], bounds[i + 2])
+                 for i in range(len(points))]
+        weakest = int(np.argmin(local))
+        if local[weakest] > penalty:
+            break
+        points.pop(weakest)
+    return points
+
+
+def regime_shifts(values, timestamps, **options):
+    """Смены режима ряда: время, среднее до и после, величина сдвига
+
+    NaN (маркеры пропуска) выбрасываются. Средние считаются по соседним
+    участкам между найденными точками.
+    """
+    values = np.asarray(values, dtype=float)
+    timestamps = np.asarray(timestamps, dtype=float)
+    valid = ~np.isnan(values)
+    values, timestamps = values[valid], timestamps[valid]
+
+    points = change_points(values, **options)
+    bounds = [0, *points, len(values)]
+    shifts = []
+    for i, point in enumerate(points):
+        before = values[bounds[i]:point].mean()
+        after = values[point:bounds[i + 2]].mean()
+        shifts.append({
+            'index': point,
+            'timestamp': float(timestamps[point]),
+            'before': float(before),
+            'after': float(after),
+            'shift': float(after - before),
+        })
+    return shifts
@@ -0,0 +1,372 @@
+import json
+import math
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+
+from .downsample import envelope
+from .loader import clear_cache, has_family, load_frame
+from .ring_reader import attach
+from .schema import RING_FILENAME
+
+# Панели страницы: семейство и его ряды; у рядов <счётчик>_rate -- скорость счётчика в секунду
+PANELS = [
+    {'title': 'System CPU Usage (%)', 'family': 'cpu', 'columns': ['user', 'system', 'iowait']},
+    {'title': 'Process CPU Usage (%)', 'family': 'cpu', 'columns': ['proc_total']},
+    {'title': 'Process Memory (MB)', 'family': 'memory', 'columns': ['rss_mb', 'vsz_mb']},
+    {'title': 'Page Faults Rate (faults/s)', 'family': 'memory',
+     'columns': ['page_faults_minor_rate', 'page_faults_major_rate']},
+    {'title': 'Process I/O Rate (KB/s)', 'family': 'disk',
+     'columns': ['proc_read_bytes_rate', 'proc_write_bytes_rate']},
+    {'title': 'Network Bandwidth (bytes/s)', 'family': 'network', 'columns': ['rx_bytes_rate', 'tx_bytes_rate']},
+    {'title': 'Number of Threads', 'family': 'threads', 'columns': ['num_threads']},
+    {'title': 'Context Switches Rate (switches/s)', 'family': 'threads',
+     'columns': ['voluntary_switches_rate', 'involuntary_switches_rate']},
+    {'title': 'TCP Queues (bytes)', 'family': 'tcp', 'columns': ['recv_q_total', 'send_q_total']},
+]
+
+HOST = '127.0.0.1'
+PORT = 8050
+
+# Как часто поток клиента проверяет кольца, секунды
+INTERVAL = 1.0
+
+# Без новых данных клиенту раз в столько секунд уходит комментарий: так замечается закрытая вкладка
+KEEPALIVE = 15.0
+
+# До стольких корзин прореживается история при открытии страницы
+HISTORY_BUCKETS = 1000
+
+# Пока колец нет (монитор запущен без --ring или ещё не стартовал), подключение повторяется так часто
+ATTACH_RETRY = 5.0
+
+
+def family_columns(panels=PANELS):
+    """Ряды каждого семейства, нужные панелям: {семейство: [ряд, ...]}"""
+    columns = {}
+    for panel in panels:
+        names = columns.setdefault(panel['family'], [])
+        names.extend(name for name in panel['columns'] if name not in names)
+    return columns
+
+
+def counter_of(name):
+    """Счётчик, скорость которого -- ряд name, или None для обычной колонки"""
+    return name[:-len('_rate')] if name.endswith('_rate') else None
+
+
+def _json_values(values):
+    """Значения ряда для JSON: NaN и бесконечности -- null"""
+    return [value if math.isfinite(value) else None for value in np.asarray(values, dtype=float).tolist()]
+
+
+def history(data_dir, buckets=HISTORY_BUCKETS):
+    """Записанная история рядов панелей, прореженная до buckets корзин: {семейство: {timestamp, columns}}
+
+    Кадры берутся загрузчиком с самой грубой свёрткой, разрешающей запись
+    (tier 'auto'), и после прореживания сразу выбрасываются из кэша
+    загрузчика, чтобы долгоживущий сервер не держал в памяти всю запись.
+    Точки семейства -- объединение огибающих min/max всех его рядов, так что
+    выбросы каждого ряда сохраняются.
+    """
+    result = {}
+    try:
+        for family, names in family_columns().items():
+            if not has_family(data_dir, family):
+                continue
+            df = load_frame(data_dir, family, tier='auto', rates=True)
+            if df is None or not len(df):
+                continue
+            timestamps = df['timestamp'].to_numpy(dtype=float)
+            series = {}
+            for name in names:
+                counter = counter_of(name)
+                if name in df.columns:
+                    series[name] = df[name].to_numpy(dtype=float)
+                elif counter is not None and counter in df.columns:
+                    values = df[counter].to_numpy(dtype=float)
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        series[name] = np.diff(values, prepend=np.nan) / np.diff(timestamps, prepend=np.nan)
+            index = np.unique(np.concatenate([envelope(values, buckets) for values in series.values()]
+                                             or [np.arange(len(timestamps))]))
+            result[family] = {
+                'timestamp': _json_values(timestamps[index]),
+                'columns': {name: _json_values(values[index]) for name, values in series.items()},
+            }
+    finally:
+        clear_cache()
+    return result
+
+
+def live_samples(family, records, names, previous):
+    """Новые записи кольца семейства в ряды панелей: {family, timestamp, columns}
+
+    Скорости счётчиков считаются по соседним записям; previous -- последние
+    значения счётчиков семейства из прошлой пачки, он обновляется на месте.
+    Записи копируются из памяти кольца, так что результат не зависит от
+    писателя.
+    """
+    timestamps = records['timestamp'].astype(float)
+    last = previous.setdefault(family, {})
+    fields = records.dtype.names
+    columns = {}
+    for name in names:
+        counter = counter_of(name)
+        if name in fields:
+            columns[name] = _json_values(records[name])
+        elif counter is not None and counter in fields:
+            values = records[counter].astype(float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rates = (np.diff(values, prepend=last.get(counter, np.nan))
+                         / np.diff(timestamps, prepend=last.get('timestamp', np.nan)))
+            columns[name] = _json_values(rates)
+            last[counter] = values[-1]
+    last['timestamp'] = timestamps[-1]
+    return {'family': family, 'timestamp': _json_values(timestamps), 'columns': columns}
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """Страница, история рядов (/history) и поток новых записей колец (/events, Server-Sent Events)"""
+
+    data_dir = Path('monitoring_data')
+    interval = INTERVAL
+
+    def log_message(self, format, *args):
+        # Журнал запросов в stderr на измеряемой машине не нужен
+        pass
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/':
+            self._send(PAGE.encode(), 'text/html; charset=utf-8')
+        elif path == '/history':
+            body = {'panels': PANELS, 'families': history(self.data_dir),
+                    'live': (self.data_dir / RING_FILENAME).exists()}
+            self._send(json.dumps(body).encode(), 'application/json')
+        elif path == '/events':
+            self._events()
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _attach(self):
+        """Кольца семейств панелей работающего монитора или None"""
+        try:
+            rings = attach(self.data_dir)
+        except (OSError, ValueError):
+            return None
+        return {family: rings[family] for family in family_columns() if family in rings}
+
+    def _events(self):
+        """Отдавать клиенту новые записи колец, пока он не отключится
+
+        При подключении отдаётся всё, что есть в кольцах (клиент сам
+        отбрасывает точки, которые уже есть в истории), дальше -- только
+        записи, опубликованные с прошлой проверки, так что стоимость
+        обновления пропорциональна объёму новых данных.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        names = family_columns()
+        rings, positions, previous, records = None, {}, {}, None
+        attempted = quiet = 0.0
+        try:
+            while True:
+                now = time.monotonic()
+                if rings is None and now - attempted >= ATTACH_RETRY:
+                    attempted = now
+                    rings = self._attach()
+                    if rings is not None:
+                        positions = {family: 0 for family in rings}
+                        self._event('status', {'live': True})
+
+                sent = False
+                for family, ring in (rings or {}).items():
+                    positions[family], records = ring.read(positions[family])
+                    if len(records):
+                        self._event('samples', live_samples(family, records, names[family], previous))
+                        sent = True
+                if sent:
+                    quiet = now
+                elif now - quiet >= KEEPALIVE:
+                    self.wfile.write(b': keepalive\n\n')
+                    quiet = now
+                self.wfile.flush()
+                time.sleep(self.interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            for ring in (rings or {}).values():
+                ring.close()
+
+    def _event(self, name, data):
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+
+
+def serve(data_dir, host=HOST, port=PORT, interval=INTERVAL):
+    """Запустить локальный сервер панели мониторинга и обслуживать его до Ctrl+C"""
+    handler = type('Handler', (DashboardHandler,), {'data_dir': Path(data_dir), 'interval': interval})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    if not (Path(data_dir) / RING_FILENAME).exists():
+        print(f"Warning: {Path(data_dir) / RING_FILENAME} not found, live updates need monitoring.py --ring N")
+    print(f"Dashboard for {data_dir}: http://{host}:{server.server_address[1]}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping dashboard...")
+    finally:
+        server.server_close()
+
+
+# Страница панели: история рисуется один раз, новые точки дописываются; в браузере
+# хранится не больше MAX_POINTS точек на семейство -- старая половина ужимается
+# до min/max по четвёркам точек, так что выбросы не теряются
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Performance monitor</title>
+<style>
+body { font-family: sans-serif; margin: 16px; background: #fafafa; }
+#status { color: #666; margin-bottom: 12px; }
+#panels { display: grid; grid-template-columns: repeat(auto-fill, minmax(560px, 1fr)); gap: 12px; }
+.panel { background: #fff; border: 1px solid #ddd; padding: 8px; }
+.panel h3 { font-size: 14px; margin: 0 0 4px; }
+.legend { font-size: 12px; color: #333; }
+.legend span { margin-right: 12px; }
+canvas { width: 100%; height: 220px; }
+</style>
+</head>
+<body>
+<div id="status">Loading history...</div>
+<div id="panels"></div>
+<script>
+const COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728'];
+const MAX_POINTS = 4000;
+const data = {};
+const panels = [];
+let pending = false;
+
+function compact(series) {
+  // Старая половина: четвёрки точек -> min и max каждого ряда в порядке появления
+  const half = Math.floor(series.timestamp.length / 8) * 4;
+  const times = [];
+  const columns = {};
+  for (const name in series.columns) columns[name] = [];
+  for (let i = 0; i < half; i += 4) {
+    times.push(series.timestamp[i], series.timestamp[i + 3]);
+    for (const name in series.columns) {
+      const block = series.columns[name].slice(i, i + 4).filter(v => v !== null);
+      if (!block.length) { columns[name].push(null, null); continue; }
+      const low = Math.min(...block), high = Math.max(...block);
+      columns[name].push(...(block.indexOf(low) < block.indexOf(high) ? [low, high] : [high, low]));
+    }
+  }
+  series.timestamp = times.concat(series.timestamp.slice(half));
+  for (const name in series.columns) series.columns[name] = columns[name].concat(series.columns[name].slice(half));
+}
+
+function append(message) {
+  const series = data[message.family];
+  if (!series) return;
+  const last = series.timestamp.length ? series.timestamp[series.timestamp.length - 1] : -Infinity;
+  for (let i = 0; i < message.timestamp.length; i++) {
+    if (message.timestamp[i] <= last) continue;
+    series.timestamp.push(message.timestamp[i]);
+    for (const name in series.columns) series.columns[name].push((message.columns[name] || [])[i] ?? null);
+  }
+  if (series.timestamp.length > MAX_POINTS) compact(series);
+  for (const panel of panels) if (panel.family === message.family) panel.dirty = true;
+  schedule();
+}
+
+function schedule() {
+  if (pending) return;
+  pending = true;
+  requestAnimationFrame(() => { pending = false; panels.filter(p => p.dirty).forEach(draw); });
+}
+
+function draw(panel) {
+  panel.dirty = false;
+  const series = data[panel.family];
+  const canvas = panel.canvas, ctx = canvas.getContext('2d');
+  canvas.width = canvas.clientWidth * devicePixelRatio;
+  canvas.height = canvas.clientHeight * devicePixelRatio;
+  ctx.setTransform(devicePixelRatio, 0, 0, devicePixelRatio, 0, 0);
+  const width = canvas.clientWidth, height = canvas.clientHeight, left = 60, bottom = 20;
+  ctx.clearRect(0, 0, width, height);
+  const t = series ? series.timestamp : [];
+  if (t.length < 2) return;
+  let low = Infinity, high = -Infinity;
+  for (const name of panel.columns) for (const v of series.columns[name] || []) {
+    if (v === null) continue;
+    if (v < low) low = v;
+    if (v > high) high = v;
+  }
+  if (low === Infinity) return;
+  if (low === high) { low -= 1; high += 1; }
+  const t0 = t[0], t1 = t[t.length - 1];
+  const x = v => left + (v - t0) / (t1 - t0) * (width - left - 4);
+  const y = v => 4 + (high - v) / (high - low) * (height - bottom - 8);
+  ctx.fillStyle = '#666';
+  ctx.font = '11px sans-serif';
+  ctx.fillText(high.toPrecision(4), 2, 12);
+  ctx.fillText(low.toPrecision(4), 2, height - bottom);
+  ctx.fillText(t0.toFixed(0) + ' s', left, height - 4);
+  ctx.fillText(t1.toFixed(0) + ' s', width - 60, height - 4);
+  const legend = [];
+  panel.columns.forEach((name, k) => {
+    const values = series.columns[name];
+    if (!values) return;
+    ctx.strokeStyle = COLORS[k % COLORS.length];
+    ctx.beginPath();
+    let drawing = false;
+    for (let i = 0; i < t.length; i++) {
+      if (values[i] === null) { drawing = false; continue; }
+      drawing ? ctx.lineTo(x(t[i]), y(values[i])) : ctx.moveTo(x(t[i]), y(values[i]));
+      drawing = true;
+    }
+    ctx.stroke();
+    const latest = values[values.length - 1];
+    legend.push(`<span style="color:${ctx.strokeStyle}">${name}: ${latest === null ? '-' : latest.toPrecision(4)}</span>`);
+  });
+  panel.legend.innerHTML = legend.join('');
+}
+
+fetch('/history').then(r => r.json()).then(history => {
+  Object.assign(data, history.families);
+  for (const spec of history.panels) {
+    if (!data[spec.family]) data[spec.family] = {timestamp: [], columns: {}};
+    for (const name of spec.columns) data[spec.family].columns[name] ??= data[spec.family].timestamp.map(() => null);
+    const element = document.createElement('div');
+    element.className = 'panel';
+    element.innerHTML = `<h3>${spec.title}</h3><div class="legend"></div><canvas></canvas>`;
+    document.getElementById('panels').appendChild(element);
+    panels.push({...spec, canvas: element.querySelector('canvas'), legend: element.querySelector('.legend'), dirty: true});
+  }
+  schedule();
+  const status = document.getElementById('status');
+  status.textContent = history.live ? 'Live' : 'History only: waiting for monitoring.py --ring N';
+  const events = new EventSource('/events');
+  events.addEventListener('samples', e => append(JSON.parse(e.data)));
+  events.addEventListener('status', () => { status.textContent = 'Live'; });
+  events.onerror = () => { status.textContent = 'Disconnected, reconnecting...'; };
+  addEventListener('resize', () => { panels.forEach(p => p.dirty = true); schedule(); });
+});
+</script>
+</body>
+</html>
+"""
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Ряды, в которых на корзину приходится не больше стольких сэмплов, рисуются как есть
+MIN_BUCKET = 2
+
+
+def _extremes(y, buckets):
+    """Начала корзин и позиции минимума, максимума и первого пропуска (NaN) в каждой
+
+    Ряд делится на корзины по равному числу сэмплов и дополняется NaN до
+    матрицы (корзина x сэмпл), так что все корзины считаются одной
+    операцией. Возвращает (начала, min, max, пропуск, есть ли пропуск);
+    позиции -- относительно начала корзины.
+    """
+    n = len(y)
+    size = -(-n // buckets)
+    rows = -(-n // size)
+    padded = np.full(rows * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(rows, size)
+
+    # Хвост последней корзины за концом ряда -- тоже NaN, но пропуском ряда он не считается
+    empty = np.isnan(padded)
+    missing = empty.copy()
+    missing.reshape(-1)[n:] = False
+    low = np.where(empty, np.inf, padded).argmin(axis=1)
+    high = np.where(empty, -np.inf, padded).argmax(axis=1)
+    return np.arange(rows) * size, low, high, missing.argmax(axis=1), missing.any(axis=1)
+
+
+def envelope(y, buckets):
+    """Индексы точек ряда для рисования линией: огибающая min/max по корзинам
+
+    Ряд делится на buckets корзин по равному числу сэмплов (обычно по одной
+    на столбец пикселей оси); в каждой корзине остаются минимум и максимум
+    в порядке времени, а также первый пропуск (NaN), чтобы не сливать
+    разрывы ряда. Первая и последняя точки остаются всегда. Одиночные
+    выбросы поэтому видны так же, как на полном ряде, а число точек -- не
+    больше 3 * buckets + 2 при любой длине записи.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if buckets <= 0 or n <= MIN_BUCKET * buckets:
+        return np.arange(n)
+    offsets, low, high, gap, has_gap = _extremes(y, buckets)
+    picked = [offsets + low, offsets + high, (offsets + gap)[has_gap], [0, n - 1]]
+    return np.unique(np.minimum(np.concatenate(picked), n - 1))
+
+
+def downsample(x, y, buckets):
+    """Ряд (x, y), прореженный огибающей envelope до buckets корзин"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    index = envelope(y, buckets)
+    return x[index], y[index]
+
+
+def band(x, y, buckets):
+    """Полоса заливки от нуля до ряда, прореженная до buckets корзин: (x, низ, верх)
+
+    Заливка зигзага min/max оставляла бы незакрашенные треугольники, поэтому
+    для каждой корзины берётся вся закрашенная на полном ряде полоса:
+    от min(0, минимум) до max(0, максимум). Корзина без данных рисуется
+    разрывом.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if buckets <= 0 or n <= MIN_BUCKET * buckets:
+        return x, np.minimum(y, 0), np.maximum(y, 0)
+    offsets, low, high, _, _ = _extremes(y, buckets)
+    # Корзина подписывается временем своего первого сэмпла, последняя точка -- концом ряда
+    edges = np.append(x[offsets], x[-1])
+    lows = np.minimum(y[np.minimum(offsets + low, n - 1)], 0)
+    highs = np.maximum(y[np.minimum(offsets + high, n - 1)], 0)
+    return edges, np.append(lows, lows[-1]), np.append(highs, highs[-1])
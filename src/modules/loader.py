@@ -0,0 +1,493 @@
+import hashlib
+import io
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from .schema import (COLUMNS, COUNTER_COLUMNS, DEFAULT_TYPE, FILENAMES, MISSING_INT, ROLLUP_FAMILIES,
+                     ROLLUP_TIERS, SCHEMA_FILENAME, TICKS, column_type, rate_column, rollup_family)
+from .store import read_manifest
+
+# Семейство по имени CSV файла
+FAMILIES = {filename: family for family, filename in FILENAMES.items()}
+
+# Свёртка подходит для окна, если в нём не меньше стольких её точек
+RESOLUTION_POINTS = 500
+
+# Строк в куске по умолчанию при чтении кусками (iter_frames)
+CHUNK_ROWS = 100_000
+
+# Подкаталог каталога данных для кэша загруженных кадров на диске
+CACHE_DIRNAME = '.cache'
+
+# Дочитывание файлов (iter_appended): размер блока CSV и длина начала файла для отпечатка
+TAIL_BLOCK_BYTES = 1 << 24
+HEAD_BYTES = 4096
+
+# Кэши в процессе: разобранные файлы по пути и готовые кадры load_frame по запросу.
+# Запись действительна, пока у файлов те же mtime и размер.
+_files = {}
+_frames = {}
+
+
+def read_schema(data_dir):
+    """Описание двоичных файлов каталога или None для CSV каталога"""
+    path = data_dir / SCHEMA_FILENAME
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def open_records(data_dir, family, schema=None):
+    """Записи семейства из двоичного файла как numpy.memmap без копирования
+
+    Недописанная последняя запись (монитор остановлен посреди записи)
+    отбрасывается. Возвращает None, если семейства нет в двоичном формате.
+    """
+    schema = schema or read_schema(data_dir)
+    if schema is None or family not in schema['families']:
+        return None
+
+    entry = schema['families'][family]
+    path = data_dir / entry['file']
+    dtype = np.dtype([tuple(field) for field in entry['fields']])
+    count = path.stat().st_size // dtype.itemsize if path.exists() else 0
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def records_frame(records):
+    """DataFrame поверх записей: числовые колонки -- представления memmap, текст декодируется"""
+    columns = {}
+    for name in records.dtype.names:
+        column = records[name]
+        if column.dtype.kind == 'S':
+            column = np.char.decode(column, errors='replace')
+        columns[name] = column
+    return pd.DataFrame(columns, copy=False)
+
+
+def overlapping_segments(manifest, window=None):
+    """Записи манифеста о сегментах, пересекающих окно (start, end)
+
+    Сегмент считается покрывающим время до начала следующего сегмента,
+    потому что строки последнего тика собираются уже после его отметки.
+    """
+    start, end = window or (None, None)
+    segments = manifest['segments']
+    selected = []
+    for i, segment in enumerate(segments):
+        covered_until = segments[i + 1]['start'] if i + 1 < len(segments) else math.inf
+        if start is not None and covered_until < start:
+            continue
+        if end is not None and segment['start'] > end:
+            continue
+        selected.append(segment)
+    return selected
+
+
+def segment_dirs(data_dir, window=None):
+    """Каталоги с данными: сегменты, пересекающие окно (start, end), или сам каталог"""
+    manifest = read_manifest(data_dir)
+    if manifest is None:
+        return [data_dir]
+    return [data_dir / segment['name'] for segment in overlapping_segments(manifest, window)]
+
+
+def time_range(data_dir):
+    """Время первого и последнего тика записи или None, если тики не сохранялись"""
+    manifest = read_manifest(data_dir)
+    if manifest is not None:
+        segments = manifest['segments']
+        return (segments[0]['start'], segments[-1]['end']) if segments else None
+    ticks = open_records(data_dir, TICKS)
+    if ticks is None or len(ticks) == 0:
+        return None
+    return float(ticks['timestamp'][0]), float(ticks['timestamp'][-1])
+
+
+def pick_tier(data_dir, family, window=None):
+    """Самый грубый уровень свёртки, который ещё разрешает окно; None -- сырые данные
+
+    Уровень разрешает окно, если в окне не меньше RESOLUTION_POINTS его
+    корзин. Если в окне есть сегменты, из которых сырые данные уже удалены,
+    берётся самый подробный уровень свёртки.
+    """
+    if family not in ROLLUP_FAMILIES:
+        return None
+    tiers = [tier for tier in ROLLUP_TIERS if has_family(data_dir, rollup_family(family, tier))]
+    extent = time_range(data_dir)
+    if not tiers or extent is None:
+        return None
+
+    start, end = window or (None, None)
+    start = extent[0] if start is None else max(start, extent[0])
+    end = extent[1] if end is None else min(end, extent[1])
+    for tier in reversed(tiers):
+        if (end - start) / ROLLUP_TIERS[tier] >= RESOLUTION_POINTS:
+            return tier
+
+    manifest = read_manifest(data_dir)
+    if manifest is not None and not all(segment.get('raw', True)
+                                        for segment in overlapping_segments(manifest, window)):
+        return tiers[0]
+    return None
+
+
+def _family_path(directory, family):
+    """Файл семейства в каталоге: двоичный, если он описан в schema.json, иначе CSV; None -- нет"""
+    schema = read_schema(directory)
+    if schema is not None and family in schema['families']:
+        return directory / schema['families'][family]['file']
+    if family in FILENAMES and (directory / FILENAMES[family]).exists():
+        return directory / FILENAMES[family]
+    return None
+
+
+def _signature(path):
+    """Версия файла для кэша: mtime и размер"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _typed(df):
+    """Привести колонки кадра из CSV к типам схемы
+
+    Целые колонки получают MISSING_INT вместо пропусков, как в двоичном
+    формате. Мусор в числовых колонках разбирается так же, как при записи
+    двоичного формата: запятая (mpstat в некоторых локалях) читается как
+    точка, остальное становится NaN.
+    """
+    for column in df.columns:
+        kind = column_type(column)
+        if kind.startswith('S'):
+            df[column] = df[column].fillna('').astype(str)
+            continue
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            text = df[column].astype(str).str.replace(',', '.', regex=False)
+            df[column] = pd.to_numeric(text, errors='coerce')
+        if kind != DEFAULT_TYPE:
+            df[column] = df[column].fillna(MISSING_INT).astype(kind)
+    return df
+
+
+def _read_csv(path, family):
+    """CSV семейства с типами колонок из схемы
+
+    Числа читаются сразу как float64; если в них попался мусор, файл
+    разбирается заново без типов и приводится через _typed.
+    """
+    columns = COLUMNS[family]
+    numeric = [column for column in columns if not column_type(column).startswith('S')]
+    try:
+        df = pd.read_csv(path, usecols=lambda column: column in columns,
+                         dtype={column: 'float64' for column in numeric})
+    except ValueError:
+        df = pd.read_csv(path, usecols=lambda column: column in columns)
+    return _typed(df)
+
+
+def _load_directory(directory, family):
+    """Метрики семейства из одного каталога: двоичный файл или, если его нет, CSV
+
+    Разобранный файл кэшируется в процессе, пока не изменились его mtime и размер.
+    """
+    path = _family_path(directory, family)
+    signature = None if path is None else _signature(path)
+    if signature is None:
+        return None
+    cached = _files.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    if path.suffix == '.csv':
+        df = _read_csv(path, family)
+    else:
+        df = records_frame(open_records(directory, family))
+    _files[path] = (signature, df)
+    return df
+
+
+def add_rates(df, family):
+    """Добавить к кадру скорости накопительных счётчиков семейства (колонки <счётчик>_rate)"""
+    counters = [column for column in COUNTER_COLUMNS.get(family.split('@')[0], ()) if column in df.columns]
+    if not counters:
+        return df
+    elapsed = df['timestamp'].diff()
+    return df.assign(**{rate_column(column): df[column].diff() / elapsed for column in counters})
+
+
+def _cache_path(data_dir, family, window, rates):
+    """Файл кэша запроса на диске; версия данных хранится внутри файла"""
+    digest = hashlib.sha1(repr((window, rates)).encode()).hexdigest()[:12]
+    return data_dir / CACHE_DIRNAME / f"{family}-{digest}.pkl"
+
+
+def _read_cache(path, signature):
+    """Кадр из кэша на диске или None, если кэша нет или он устарел"""
+    try:
+        cached = pd.read_pickle(path)
+    except (OSError, ValueError, EOFError, KeyError, ImportError, AttributeError):
+        return None
+    return cached['frame'] if cached.get('signature') == signature else None
+
+
+def _write_cache(path, signature, df):
+    """Записать кэш атомарно; ошибка записи не мешает анализу"""
+    try:
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        pd.to_pickle({'signature': signature, 'frame': df}, tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Error writing cache {path}: {e}")
+
+
+def _in_window(df, window, tier):
+    """Строки кадра из окна (start, end); корзина свёртки попадает в окно, если пересекается с ним"""
+    if window is None:
+        return df
+    start, end = window
+    first = df['bucket'] if tier is not None else df['timestamp']
+    last = df['bucket'] + ROLLUP_TIERS[tier] if tier is not None else df['timestamp']
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= (last >= start).to_numpy()
+    if end is not None:
+        mask &= (first <= end).to_numpy()
+    return df if mask.all() else df[mask].reset_index(drop=True)
+
+
+def _collect_frame(directories, family, window, tier):
+    """Кадр семейства из каталогов сегментов, отфильтрованный по окну"""
+    frames = []
+    for directory in directories:
+        df = _load_directory(directory, family)
+        if df is not None:
+            frames.append(df)
+    if not frames:
+        return None
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return _in_window(df, window, tier).copy(deep=False)
+
+
+def _resolve(data_dir, family, window, tier):
+    """Семейство с уровнем свёртки и каталоги, которые надо прочитать для окна"""
+    if tier == 'auto':
+        tier = pick_tier(data_dir, family, window)
+    if tier is not None:
+        family = rollup_family(family, tier)
+
+    # Строка корзины пишется первым сэмплом следующей корзины, возможно уже в следующем сегменте
+    segments_window = window
+    if tier is not None and window is not None and window[1] is not None:
+        segments_window = (window[0], window[1] + ROLLUP_TIERS[tier])
+    return family, tier, segment_dirs(data_dir, segments_window)
+
+
+def iter_frames(data_dir, family, window=None, tier=None, chunk_rows=CHUNK_ROWS):
+    """Метрики семейства кусками не больше chunk_rows строк, без загрузки файлов целиком
+
+    Окно и уровень свёртки -- как у load_frame. Двоичные записи читаются
+    из файла по куску (не через memmap, чтобы прочитанные страницы не
+    оставались в памяти процесса), CSV -- через read_csv(chunksize).
+    Скорости счётчиков не добавляются: их считает тот, кто помнит
+    последнюю строку предыдущего куска.
+    """
+    family, tier, directories = _resolve(data_dir, family, window, tier)
+    for directory in directories:
+        path = _family_path(directory, family)
+        if path is None or not path.exists():
+            continue
+        if path.suffix == '.csv':
+            parts = (_typed(part) for part in pd.read_csv(path, usecols=lambda column: column in COLUMNS[family],
+                                                          chunksize=chunk_rows))
+        else:
+            parts = _binary_chunks(directory, family, chunk_rows)
+        for part in parts:
+            part = _in_window(part, window, tier)
+            if len(part):
+                part.attrs['tier'] = tier or 'raw'
+                yield part
+
+
+def _binary_chunks(directory, family, chunk_rows):
+    """Записи двоичного файла семейства кусками по chunk_rows"""
+    entry = read_schema(directory)['families'][family]
+    dtype = np.dtype([tuple(field) for field in entry['fields']])
+    path = directory / entry['file']
+    count = path.stat().st_size // dtype.itemsize
+    with open(path, 'rb') as f:
+        for _ in range(0, count, chunk_rows):
+            records = np.fromfile(f, dtype=dtype, count=chunk_rows)
+            if len(records) == 0:
+                break
+            yield records_frame(records)
+
+
+def _head_digest(path, length):
+    """Отпечаток первых length байт файла: отличает дописанный файл от записанного заново"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def _csv_tail(path, family, position, chunk_rows):
+    """Целые строки CSV после position['offset'] кусками по chunk_rows
+
+    Файл читается блоками по TAIL_BLOCK_BYTES до последнего перевода строки
+    в блоке: недописанная монитором строка остаётся на следующий раз.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        if not header.endswith(b'\n'):
+            return
+        names = header.decode().strip().split(',')
+        f.seek(max(position['offset'], len(header)))
+        while True:
+            block = f.read(TAIL_BLOCK_BYTES)
+            end = block.rfind(b'\n') + 1
+            if end == 0:
+                return
+            f.seek(end - len(block), os.SEEK_CUR)
+            for part in pd.read_csv(io.BytesIO(block[:end]), header=None, names=names, chunksize=chunk_rows):
+                part = _typed(part[[column for column in names if column in COLUMNS[family]]])
+                position['rows'] += len(part)
+                yield part
+            position['offset'] = f.tell()
+
+
+def _binary_tail(directory, family, position, chunk_rows):
+    """Целые записи двоичного файла после position['offset'] кусками по chunk_rows"""
+    entry = read_schema(directory)['families'][family]
+    dtype = np.dtype([tuple(field) for field in entry['fields']])
+    path = directory / entry['file']
+    with open(path, 'rb') as f:
+        f.seek(position['offset'])
+        remaining = (path.stat().st_size - position['offset']) // dtype.itemsize
+        while remaining > 0:
+            records = np.fromfile(f, dtype=dtype, count=min(chunk_rows, remaining))
+            if len(records) == 0:
+                return
+            remaining -= len(records)
+            position['offset'] += len(records) * dtype.itemsize
+            position['rows'] += len(records)
+            yield records_frame(records)
+
+
+def iter_appended(data_dir, family, positions, chunk_rows=CHUNK_ROWS):
+    """Сырые строки семейства, дописанные после сохранённых позиций, кусками по chunk_rows
+
+    positions -- {путь файла: позиция} из прошлого вызова, где позиция --
+    смещение в байтах, число прочитанных строк и отпечаток начала файла;
+    обновляется на месте по мере чтения. Новые файлы (например, новые
+    сегменты) читаются с начала. Если файл стал короче сохранённой позиции
+    или его начало изменилось (запись начата заново), бросается ValueError:
+    дочитать такой файл нельзя, его нужно разобрать с начала.
+    """
+    for directory in segment_dirs(data_dir):
+        path = _family_path(directory, family)
+        if path is None or not path.exists():
+            continue
+        position = positions.get(str(path))
+        if position is None:
+            position = positions[str(path)] = {'offset': 0, 'rows': 0, 'head_bytes': 0, 'head': None}
+        elif (path.stat().st_size < position['offset']
+              or _head_digest(path, position['head_bytes']) != position['head']):
+            raise ValueError(f"{path} was rewritten since it was last read")
+
+        parts = (_csv_tail(path, family, position, chunk_rows) if path.suffix == '.csv'
+                 else _binary_tail(directory, family, position, chunk_rows))
+        for part in parts:
+            part.attrs['tier'] = 'raw'
+            yield part
+        if position['head_bytes'] < HEAD_BYTES:
+            position['head_bytes'] = min(position['offset'], HEAD_BYTES)
+            position['head'] = _head_digest(path, position['head_bytes'])
+
+
+def load_frame(data_dir, family, window=None, tier=None, rates=False, cache=False):
+    """Метрики семейства, при заданном окне (start, end) -- только строки из него
+
+    Из сегментированного каталога читаются только сегменты, пересекающие
+    окно; у несегментированного каталога загружается весь файл. tier
+    выбирает уровень свёртки ('10s', '1m'), 'auto' -- самый грубый из
+    разрешающих окно (см. pick_tier), None -- сырые данные. Выбранный
+    уровень записывается в df.attrs['tier']. При rates к кадру добавляются
+    скорости счётчиков (см. add_rates).
+
+    Готовый кадр кэшируется в процессе, а при cache -- и на диске в
+    <data_dir>/.cache, пока не изменились файлы, из которых он собран.
+    Кадр из кэша общий: колонки можно добавлять, менять значения нельзя.
+    """
+    family, tier, directories = _resolve(data_dir, family, window, tier)
+    paths = [_family_path(directory, family) for directory in directories]
+    signature = tuple((str(path), _signature(path)) for path in paths if path is not None)
+    key = (str(data_dir.resolve()), family, window, rates)
+    cached = _frames.get(key)
+    if cached is None and cache:
+        df = _read_cache(_cache_path(data_dir, family, window, rates), signature)
+        if df is not None:
+            cached = _frames[key] = (signature, df)
+
+    if cached is None or cached[0] != signature:
+        df = _collect_frame(directories, family, window, tier)
+        if df is not None:
+            if rates:
+                df = add_rates(df, family)
+            df.attrs['tier'] = tier or 'raw'
+        cached = _frames[key] = (signature, df)
+        if cache:
+            _write_cache(_cache_path(data_dir, family, window, rates), signature, df)
+
+    df = cached[1]
+    return None if df is None else df.copy(deep=False)
+
+
+def clear_cache():
+    """Забыть кадры, закэшированные в процессе (например, после обработки очередного прогона)"""
+    _files.clear()
+    _frames.clear()
+
+
+def has_family(data_dir, family):
+    """Есть ли данные семейства в каталоге в любом формате"""
+    return any(_family_path(directory, family) is not None for directory in segment_dirs(data_dir))
+
+
+def family_names(data_dir):
+    """Семейства, записанные в каталоге или его сегментах, в порядке схемы"""
+    names = {}
+    for directory in segment_dirs(data_dir):
+        schema = read_schema(directory)
+        if schema is not None:
+            names.update(dict.fromkeys(schema['families']))
+        else:
+            names.update(dict.fromkeys(f for f, name in FILENAMES.items() if (directory / name).exists()))
+    return list(names)
+
+
+def export_csv(data_dir, output_dir=None):
+    """Выгрузить метрики (в том числе все сегменты) в CSV с прежними именами файлов и колонками"""
+    output_dir = output_dir or data_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    exported = []
+    for family in family_names(data_dir):
+        df = load_frame(data_dir, family)
+        if family == TICKS:
+            path = output_dir / 'ticks.csv'
+        else:
+            path = output_dir / FILENAMES[family]
+            df = df[COLUMNS[family]]
+        df.to_csv(path, index=False)
+        exported.append(path)
+        print(f"Exported: {path} ({len(df)} rows)")
+    return exported
@@ -0,0 +1,190 @@
+import json
+import math
+import time
+from collections import deque
+
+from .records import _to_float
+from .rules import COMPARATORS, RULES, TREND_TRANSFORMS, format_details
+from .schema import ANOMALIES_FILENAME
+from .store import StoreWrapper
+
+
+class RuleState:
+    """Состояние одного правила при потоковой проверке
+
+    Памяти нужно O(1) на правило независимо от длины записи: предыдущая
+    строка для diff и rate, первые window строк для правил тренда, окно
+    последних window строк для правил тренда и rolling, счётчики
+    сработавших сэмплов.
+    """
+
+    def __init__(self, rule, columns):
+        self.rule = rule
+        self.indexes = [columns.index(metric) for metric in rule['metrics']]
+        self.compare = COMPARATORS[rule['op']]
+        self.transform = rule['transform']
+
+        # Предыдущая строка (timestamp, значение), в том числе маркер пропуска
+        self.previous = None
+
+        # Начало и скользящий конец записи для правил тренда и rolling
+        self.window = rule.get('window')
+        self.rows = 0
+        self.head = []
+        self.tail = deque(maxlen=self.window)
+        self.start = self.end = math.nan
+
+        # Открытый эпизод и итог по всей записи
+        self.episode = None
+        self.samples = 0
+        self.total = 0.0
+        self.last = math.nan
+
+    def _trend(self):
+        """Значение правила тренда по первым и последним window строкам"""
+        if self.rows <= self.window:
+            return math.nan
+        head = [value for _, value in self.head if not math.isnan(value)]
+        tail = [value for _, value in self.tail if not math.isnan(value)]
+        start = self.start = sum(head) / len(head) if head else math.nan
+        end = self.end = sum(tail) / len(tail) if tail else math.nan
+
+        if self.transform == 'ratio':
+            if start:
+                return end / start
+            return math.inf if end > 0 else math.nan
+
+        elapsed = (sum(t for t, _ in self.tail) - sum(t for t, _ in self.head)) / self.window
+        return (end - start) / elapsed if elapsed > 0 else 0
+
+    def value(self, timestamp, row):
+        """Значение правила для очередной строки; NaN -- не определено"""
+        value = sum(_to_float(row[i]) for i in self.indexes)
+        previous, self.previous = self.previous, (timestamp, value)
+
+        if self.transform == 'raw':
+            return value
+        if self.transform == 'rolling':
+            self.tail.append((timestamp, value))
+            if len(self.tail) < self.window:
+                return math.nan
+            return sum(v for _, v in self.tail) / self.window
+        if self.transform in TREND_TRANSFORMS:
+            self.rows += 1
+            if len(self.head) < self.window:
+                self.head.append((timestamp, value))
+            self.tail.append((timestamp, value))
+            return self._trend()
+
+        if previous is None:
+            return math.nan
+        delta = value - previous[1]
+        if self.transform == 'diff':
+            return delta
+        elapsed = timestamp - previous[0]
+        return delta / elapsed if elapsed > 0 else math.nan
+
+
+class OnlineDetector(StoreWrapper):
+    """Хранилище, которое проверяет правила RULES на каждой строке во время сбора
+
+    Сработавшее правило открывает эпизод: в anomalies.jsonl сразу пишется
+    событие start, когда значение возвращается в норму -- end со
+    статистикой эпизода. При закрытии пишутся события summary по всей
+    записи с тем же смыслом, что у AnomalyDetector на сырых данных:
+    число сработавших сэмплов, их среднее и сумма, а для правил тренда --
+    значение на конце записи.
+    """
+
+    def __init__(self, store, output_dir, families, columns, rules=RULES):
+        super().__init__(store)
+        self.path = output_dir / ANOMALIES_FILENAME
+        self.file = open(self.path, 'a')
+        self.states = {}
+        for rule in rules:
+            if rule['family'] in families and all(m in columns[rule['family']] for m in rule['metrics']):
+                self.states.setdefault(rule['family'], []).append(RuleState(rule, columns[rule['family']]))
+        self.tick = 0
+        self.anomalies = 0
+
+    def _emit(self, event, state, timestamp, **fields):
+        rule = state.rule
+        record = {
+            'event': event,
+            'timestamp': timestamp,
+            'wall_time': time.time(),
+            'tick': self.tick,
+            'category': rule['category'],
+            'severity': rule['severity'],
+            'issue': rule['issue'],
+            'metric': '+'.join(rule['metrics']),
+            'transform': rule['transform'],
+            'threshold': rule['threshold'],
+            **fields,
+        }
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def _check(self, state, timestamp, row):
+        value = state.value(timestamp, row)
+        if state.transform in TREND_TRANSFORMS:
+            state.last = value
+
+        if state.compare(value, state.rule['threshold']):
+            state.samples += 1
+            state.total += value
+            if state.episode is None:
+                state.episode = {'start': timestamp, 'samples': 0, 'total': 0.0, 'peak': value}
+                self.anomalies += 1
+                self._emit('start', state, timestamp, value=value)
+                print(f"ANOMALY [{state.rule['category']}] {state.rule['issue']}: "
+                      f"{value:.2f} {state.rule['op']} {state.rule['threshold']} at {timestamp:.1f}s")
+            episode = state.episode
+            episode['samples'] += 1
+            episode['total'] += value
+            episode['peak'] = max(episode['peak'], value)
+        elif state.episode is not None:
+            self._end(state, timestamp)
+
+    def _end(self, state, timestamp):
+        episode, state.episode = state.episode, None
+        self._emit('end', state, timestamp, started=episode['start'], duration=timestamp - episode['start'],
+                   samples=episode['samples'], mean=episode['total'] / episode['samples'], peak=episode['peak'])
+
+    def write(self, family, tick, row):
+        """Записать строку семейства и проверить на ней правила"""
+        self.store.write(family, tick, row)
+        timestamp = _to_float(row[0])
+        for state in self.states.get(family, ()):
+            try:
+                self._check(state, timestamp, row)
+            except (IndexError, TypeError) as e:
+                print(f"Error checking {state.rule['issue']}: {e}")
+
+    def write_tick(self, tick, timestamp, wall_time):
+        self.tick = tick
+        self.store.write_tick(tick, timestamp, wall_time)
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        """Закрыть открытые эпизоды, записать итоги по всей записи и закрыть хранилище"""
+        self.store.close()
+        for states in self.states.values():
+            for state in states:
+                timestamp = state.previous[0] if state.previous else 0.0
+                if state.episode is not None:
+                    self._end(state, timestamp)
+                if state.transform in TREND_TRANSFORMS:
+                    if state.compare(state.last, state.rule['threshold']):
+                        stats = dict(start=state.start, end=state.end, change=state.end - state.start,
+                                     value=state.last)
+                        self._emit('summary', state, timestamp, details=format_details(state.rule, **stats),
+                                   **stats)
+                elif state.samples:
+                    stats = dict(samples=state.samples, mean=state.total / state.samples, total=state.total)
+                    self._emit('summary', state, timestamp, details=format_details(state.rule, **stats),
+                               **stats)
+        self.file.close()
+        print(f"Online detection: {self.anomalies} anomaly episodes written to {self.path}")
@@ -1,63 +1,92 @@
+import signal
 import subprocess
 import time
-import csv
 import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from pathlib import Path
 
+from .scheduler import Scheduler
+from .schema import COLUMNS
+from .store import make_store
+from .writer import FLUSH_INTERVAL, FLUSH_ROWS, BatchWriter
+
 class PerformanceMonitor:
-    def __init__(self, pid, output_dir="monitoring_data"):
+    def __init__(self, pid, output_dir="monitoring_data", store='binary',
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 segment_seconds=None, max_bytes=None, max_age=None, raw_max_age=None, rollup=True,
+                 ring=0, detect=False):
         self.pid = pid
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         self.monitoring = True
         self.start_time = time.time()
-
-        
-        # Файлы для записи данных
-        self.files = {
-            'cpu': open(self.output_dir / 'cpu_metrics.csv', 'w', newline=''),
-            'memory': open(self.output_dir / 'memory_metrics.csv', 'w', newline=''),
-            'disk': open(self.output_dir / 'disk_metrics.csv', 'w', newline=''),
-            'network': open(self.output_dir / 'network_metrics.csv', 'w', newline=''),
-            'threads': open(self.output_dir / 'thread_metrics.csv', 'w', newline=''),
-            'tcp': open(self.output_dir / 'tcp_metrics.csv', 'w', newline=''),
-            'interrupts': open(self.output_dir / 'interrupt_metrics.csv', 'w', newline=''),
+        self.start_monotonic = time.monotonic()
+        self.tick = 0
+        self.columns = COLUMNS
+
+        # Сборщики, не уложившиеся в дедлайн и ещё работающие
+        self._pending = {}
+
+        # Семейства, сборщик которых возвращает список строк, а не одну строку
+        self.multi_row = set()
+
+        # Интервалы сборщиков, для которых общий интервал не подходит
+        self.default_intervals = {}
+
+        # Хранилище данных (двоичные файлы или CSV), запись идёт в фоновом потоке пачками
+        self.families = [family for family in [*self.collectors(), 'timing'] if family in self.columns]
+        store = make_store(store, self.output_dir, self.families, self.columns, self.start_time,
+                           segment_seconds, max_bytes, max_age, raw_max_age, rollup, ring, detect)
+
+        # Продолжение сегментированной записи: время и тики идут дальше от начала первого запуска
+        if getattr(store, 'resumed', False):
+            self.start_monotonic -= self.start_time - store.start_time
+            self.start_time = store.start_time
+            self.tick = store.last_tick
+
+        self.store = BatchWriter(store, flush_rows, flush_interval)
+
+    def collectors(self):
+        """Сборщики метрик по семействам в порядке записи"""
+        return {
+            'cpu': self.collect_cpu_metrics,
+            'memory': self.collect_memory_metrics,
+            'disk': self.collect_disk_metrics,
+            'network': self.collect_network_metrics,
+            'threads': self.collect_thread_metrics,
+            'tcp': self.collect_tcp_metrics,
+            'interrupts': self.collect_interrupt_metrics,
         }
 
-        self.writers = {k: csv.writer(v) for k, v in self.files.items()}
-        self._write_headers()
-
-        
-    def _write_headers(self):
-        """Записать заголовки CSV файлов"""
-        self.writers['cpu'].writerow(['timestamp', 'user', 'system', 'iowait', 'idle', 
-                                      'proc_user', 'proc_system', 'proc_total', 
-                                      'load_1m', 'load_5m', 'load_15m', 'runqueue'])
-        
-
-        self.writers['memory'].writerow(['timestamp', 'rss_mb', 'vsz_mb', 'mem_percent',
-                                        'total_mem_mb', 'used_mem_mb', 'free_mem_mb',
-                                        'cached_mb', 'page_faults_minor', 'page_faults_major'])
-        
-
-        self.writers['disk'].writerow(['timestamp', 'reads', 'writes', 'read_kb', 'write_kb',
-                                      'io_wait_time', 'proc_read_bytes', 'proc_write_bytes'])
-        
-
-        self.writers['network'].writerow(['timestamp', 'rx_packets', 'tx_packets', 'rx_bytes', 
-                                         'tx_bytes', 'rx_errors', 'tx_errors', 'rx_dropped', 'tx_dropped'])
-        
-
-        self.writers['threads'].writerow(['timestamp', 'num_threads', 'voluntary_switches', 
-                                         'involuntary_switches', 'running', 'sleeping', 'disk_sleep'])
-        
-
-        self.writers['tcp'].writerow(['timestamp', 'established', 'syn_sent', 'syn_recv', 
-                                     'time_wait', 'close_wait', 'recv_q_total', 'send_q_total'])
-
-        
-        self.writers['interrupts'].writerow(['timestamp', 'total_irqs', 'net_rx_softirq', 
-                                            'net_tx_softirq', 'timer_softirq'])
+    def write_sample(self, family, row):
+        """Записать строку метрик семейства"""
+        self.store.write(family, self.tick, row)
+
+    def write_gap(self, family, timestamp):
+        """Маркер пропуска: время тика и пустые значения остальных колонок"""
+        if family not in self.families:
+            return
+        self.write_sample(family, [timestamp] + [''] * (len(self.columns[family]) - 1))
+
+    def elapsed(self):
+        """Секунды с начала мониторинга по монотонным часам"""
+        return time.monotonic() - self.start_monotonic
+
+    def write_scheduled(self, family, row, scheduled):
+        """Записать строку сборщика вместе с запланированным временем и джиттером"""
+        row.append(scheduled)
+        row.append((row[0] - scheduled) * 1000)
+        self.write_sample(family, row)
+
+    def write_collected(self, family, result, scheduled):
+        """Записать результат сборщика: строку, список строк или ничего"""
+        if result is None or family not in self.families:
+            return
+        if family in self.multi_row:
+            for row in result:
+                self.write_scheduled(family, row, scheduled)
+        else:
+            self.write_scheduled(family, result, scheduled)
 
     def run_cmd(self, cmd):
         """Выполнить команду и вернуть вывод"""
@@ -70,7 +99,7 @@ class PerformanceMonitor:
 
     def collect_cpu_metrics(self):
         """Сбор метрик CPU"""
-        timestamp = time.time() - self.start_time
+        timestamp = self.elapsed()
         
 
         # Общая статистика CPU
@@ -107,15 +136,15 @@ class PerformanceMonitor:
             load_1m, load_5m, load_15m = load[0], load[1], load[2]
             runqueue = load[3].split('/')[0]
 
-        self.writers['cpu'].writerow([
+        return [
             timestamp, user, system, iowait, idle,
             proc_user, proc_system, proc_cpu,
             load_1m, load_5m, load_15m, runqueue
-        ])
+        ]
         
     def collect_memory_metrics(self):
         """Сбор метрик памяти"""
-        timestamp = time.time() - self.start_time
+        timestamp = self.elapsed()
 
         # Память процесса
         proc_mem = self.run_cmd(f"ps -p {self.pid} -o rss,vsz,%mem 2>/dev/null | tail -1")
@@ -145,15 +174,15 @@ class PerformanceMonitor:
         except:
             minor_faults = major_faults = 0
 
-        self.writers['memory'].writerow([
+        return [
             timestamp, rss_mb, vsz_mb, mem_percent,
             total_mem, used_mem, free_mem, cached,
             minor_faults, major_faults
-        ])
+        ]
 
     def collect_disk_metrics(self):
         """Сбор метрик диска"""
-        timestamp = time.time() - self.start_time
+        timestamp = self.elapsed()
 
         # Общая статистика I/O
         iostat = self.run_cmd("iostat -x 1 2 | tail -n +4 | tail -1")
@@ -182,14 +211,14 @@ class PerformanceMonitor:
             proc_read = proc_write = 0
 
         
-        self.writers['disk'].writerow([
+        return [
             timestamp, reads, writes, read_kb, write_kb,
             await_time, proc_read, proc_write
-        ])
+        ]
 
     def collect_network_metrics(self):
         """Сбор сетевых метрик"""
-        timestamp = time.time() - self.start_time
+        timestamp = self.elapsed()
 
         # Статистика сетевых интерфейсов
         netstat = self.run_cmd("cat /proc/net/dev | grep -E 'eth0|ens|enp' | head -1")
@@ -208,14 +237,14 @@ class PerformanceMonitor:
             rx_bytes = rx_packets = rx_errors = rx_dropped = 0
             tx_bytes = tx_packets = tx_errors = tx_dropped = 0
 
-        self.writers['network'].writerow([
+        return [
             timestamp, rx_packets, tx_packets, rx_bytes, tx_bytes,
             rx_errors, tx_errors, rx_dropped, tx_dropped
-        ])
+        ]
         
     def collect_thread_metrics(self):
         """Сбор метрик потоков"""
-        timestamp = time.time() - self.start_time
+        timestamp = self.elapsed()
 
         # Количество потоков
         threads = self.run_cmd(f"ps -p {self.pid} -o nlwp 2>/dev/null | tail -1")
@@ -239,14 +268,14 @@ class PerformanceMonitor:
         sleeping = thread_states.count('S')
         disk_sleep = thread_states.count('D')
 
-        self.writers['threads'].writerow([
+        return [
             timestamp, num_threads, vol_switches, inv_switches,
             running, sleeping, disk_sleep
-        ])
+        ]
 
     def collect_tcp_metrics(self):
         """Сбор TCP метрик"""
-        timestamp = time.time() - self.start_time
+        timestamp = self.elapsed()
 
         # Состояния TCP соединений
         ss_output = self.run_cmd(f"ss -tan | grep -E 'ESTAB|SYN-SENT|SYN-RECV|TIME-WAIT|CLOSE-WAIT'")
@@ -268,14 +297,14 @@ class PerformanceMonitor:
                 except:
                     pass
 
-        self.writers['tcp'].writerow([
+        return [
             timestamp, established, syn_sent, syn_recv,
             time_wait, close_wait, recv_q_total, send_q_total
-        ])
+        ]
 
     def collect_interrupt_metrics(self):
         """Сбор метрик прерываний"""
-        timestamp = time.time() - self.start_time
+        timestamp = self.elapsed()
 
         # IRQ
         irq_count = self.run_cmd("cat /proc/interrupts | wc -l")
@@ -296,40 +325,136 @@ class PerformanceMonitor:
                 nums = [int(x) for x in line.split()[1:] if x.isdigit()]
                 timer = sum(nums)
 
-        self.writers['interrupts'].writerow([
+        return [
             timestamp, total_irqs, net_rx, net_tx, timer
-        ])
+        ]
+
+    def _timed(self, collect):
+        """Вызвать сборщик и измерить время его работы"""
+        started = self.elapsed()
+        start = time.perf_counter()
+        result = collect()
+        return result, time.perf_counter() - start, started
+
+    def _collect_serial(self, due):
+        """Вызвать сборщики по очереди"""
+        collectors = self.collectors()
+        for name, scheduled in due.items():
+            result, duration, started = self._timed(collectors[name])
+            self.write_collected(name, result, scheduled)
+            self.write_sample('timing', [started, name, duration * 1000, 'ok'])
+
+    def _collect_concurrent(self, pool, due, deadlines):
+        """Запустить сборщики в пуле и ждать каждый не дольше его дедлайна
+
+        Дедлайн отсчитывается от запланированного времени сбора. Сборщик,
+        не уложившийся в дедлайн, оставляет в своём файле маркер пропуска с
+        запланированным временем и не перезапускается, пока не закончится
+        предыдущий вызов. Его результат отбрасывается, записывается только время.
+        """
+        timestamp = self.elapsed()
+
+        # Опоздавшие сборщики с прошлых тиков
+        for name, future in list(self._pending.items()):
+            if future.done():
+                del self._pending[name]
+                try:
+                    _, duration, _ = future.result()
+                    self.write_sample('timing', [timestamp, name, duration * 1000, 'late'])
+                except Exception as e:
+                    print(f"Error in {name} collector: {e}")
+
+        collectors = self.collectors()
+        futures = {}
+        for name, scheduled in due.items():
+            if name in self._pending:
+                self.write_gap(name, scheduled)
+                self.write_sample('timing', [timestamp, name, '', 'busy'])
+            else:
+                futures[name] = pool.submit(self._timed, collectors[name])
+
+        for name in sorted(futures, key=lambda name: due[name] + deadlines[name]):
+            scheduled = due[name]
+            remaining = scheduled + deadlines[name] - self.elapsed()
+            try:
+                result, duration, started = futures[name].result(timeout=max(0, remaining))
+            except FutureTimeout:
+                self._pending[name] = futures[name]
+                self.write_gap(name, scheduled)
+                self.write_sample('timing', [timestamp, name, deadlines[name] * 1000, 'timeout'])
+                continue
+            except Exception as e:
+                print(f"Error in {name} collector: {e}")
+                self.write_gap(name, scheduled)
+                self.write_sample('timing', [timestamp, name, '', 'error'])
+                continue
+
+            self.write_collected(name, result, scheduled)
+            self.write_sample('timing', [started, name, duration * 1000, 'ok'])
+
+    def _stop_on_signal(self, signum, frame):
+        """Обработчик SIGTERM: выйти из цикла мониторинга через обычную остановку"""
+        raise KeyboardInterrupt
+
+    def monitor(self, interval=1, workers=0, deadline=None, deadlines=None, intervals=None):
+        """Основной цикл мониторинга
+
+        Каждый сборщик запускается со своим интервалом (intervals, по
+        умолчанию interval) по абсолютным дедлайнам монотонных часов, без
+        дрейфа от времени сбора. При workers > 0 сборщики работают
+        параллельно в пуле потоков, каждый со своим дедлайном (по умолчанию
+        deadline, а он по умолчанию равен интервалу сборщика); deadlines
+        переопределяет дедлайн для отдельных сборщиков.
+
+        SIGTERM останавливает мониторинг так же, как Ctrl+C, с дописыванием
+        очереди записи; SIGUSR1 сбрасывает накопленные строки на диск.
+        """
+        signal.signal(signal.SIGTERM, self._stop_on_signal)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.store.flush())
 
-    def monitor(self, interval=1):
-        """Основной цикл мониторинга"""
         print(f"Starting monitoring for PID {self.pid}")
         print(f"Data will be saved to {self.output_dir}")
         print("Press Ctrl+C to stop")
 
+        intervals = {
+            name: (intervals or {}).get(name, self.default_intervals.get(name, interval))
+            for name in self.collectors()
+        }
+        scheduler = Scheduler(intervals)
+
+        pool = None
+        if workers > 0:
+            deadlines = {
+                name: (deadlines or {}).get(name, deadline if deadline is not None else intervals[name])
+                for name in intervals
+            }
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='collector')
+
         try:
             while self.monitoring:
-                self.collect_cpu_metrics()
-                self.collect_memory_metrics()
-                self.collect_disk_metrics()
-                self.collect_network_metrics()
-                self.collect_thread_metrics()
-                self.collect_tcp_metrics()
-                self.collect_interrupt_metrics()
-
-                # Flush данных
-                for f in self.files.values():
-                    f.flush()
+                due = scheduler.wait()
+                due = {name: scheduled - self.start_monotonic for name, scheduled in due.items()}
+                self.tick += 1
+                timestamp = self.elapsed()
+                self.store.write_tick(self.tick, timestamp, self.start_time + timestamp)
 
-                time.sleep(interval)
+                if pool is None:
+                    self._collect_serial(due)
+                else:
+                    self._collect_concurrent(pool, due, deadlines)
 
         except KeyboardInterrupt:
             print("\nStopping monitoring...")
         finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            skipped = {name: count for name, count in scheduler.skipped.items() if count}
+            if skipped:
+                print(f"Skipped samples (collector overran its interval): {skipped}")
             self.cleanup()
 
     def cleanup(self):
         """Закрыть все файлы"""
-        for f in self.files.values():
-            f.close()
+        self.store.close()
 
         print(f"Monitoring data saved to {self.output_dir}")
\ No newline at end of file
@@ -0,0 +1,210 @@
+import os
+import re
+import threading
+import time
+
+# Одно поле: пропустить пробелы и взять всё до следующего разделителя
+_TOKEN = re.compile(rb'[ \t]*([^\s]+)')
+_INT = re.compile(rb'[ \t]*(-?\d+)')
+_FLOAT = re.compile(rb'[ \t]*(-?\d+(?:\.\d+)?)')
+
+# PID и TID в пути заменяются на '*', чтобы статистика не росла с числом потоков
+_PID_IN_PATH = re.compile(r'/\d+(?=/)')
+
+
+def stats_key(path):
+    """Ключ статистики для пути: /proc/123/task/456/stat -> /proc/*/task/*/stat"""
+    return _PID_IN_PATH.sub('/*', path)
+
+
+class ProcFile:
+    """Постоянно открытый файл /proc, перечитываемый через os.preadv в общий буфер
+
+    Файл открывается один раз и на каждом тике читается заново с нулевого
+    смещения в заранее выделенный bytearray. Поля достаются прямо из буфера
+    по номеру поля или по ключу, без split() всего файла в списки и словари.
+    Смещения ключей запоминаются и проверяются при следующем чтении.
+    """
+
+    def __init__(self, path, size=4096):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        self.buf = bytearray(size)
+        self.length = 0
+        self.tick = None
+        self._offsets = {}
+        self._lock = threading.Lock()
+
+        # Статистика для отчёта о стоимости чтения и разбора
+        self.reads = 0
+        self.read_ns = 0
+        self.parse_ns = 0
+
+    def refresh(self, tick=None):
+        """Перечитать файл; в пределах одного тика повторное чтение не делается
+
+        Безопасно при параллельных сборщиках: файл, нужный нескольким из них
+        в одном тике, читает только первый.
+        """
+        with self._lock:
+            if tick is not None and tick == self.tick:
+                return self.length
+
+            start = time.perf_counter_ns()
+            # seq_file файлы (/proc/net/tcp, /proc/diskstats) отдают примерно страницу за
+            # чтение: короткое чтение -- ещё не конец файла, конец -- только чтение нуля байт
+            n = 0
+            while True:
+                if n == len(self.buf):
+                    # Буфер заполнен: увеличить его и дочитать с того же смещения
+                    self.buf.extend(bytes(len(self.buf)))
+                with memoryview(self.buf) as view:
+                    count = os.preadv(self.fd, [view[n:]], n)
+                if count == 0:
+                    break
+                n += count
+
+            self.length = n
+            self.tick = tick
+            self.reads += 1
+            self.read_ns += time.perf_counter_ns() - start
+            return n
+
+    def find(self, key):
+        """Смещение сразу после ключа в начале строки или -1"""
+        buf = self.buf
+        pos = self._offsets.get(key)
+        if pos is not None and (pos == 0 or buf[pos - 1] == 10) and buf.startswith(key, pos):
+            return pos + len(key)
+
+        if buf.startswith(key):
+            pos = 0
+        else:
+            pos = buf.find(b'\n' + key, 0, self.length)
+            if pos < 0:
+                return -1
+            pos += 1
+        self._offsets[key] = pos
+        return pos + len(key)
+
+    def value(self, key, default=0):
+        """Первое целое число после ключа (формат 'Key:   123 kB')"""
+        start = time.perf_counter_ns()
+        pos = self.find(key)
+        m = _INT.match(self.buf, pos, self.length) if pos >= 0 else None
+        self.parse_ns += time.perf_counter_ns() - start
+        return int(m.group(1)) if m else default
+
+    def fields(self, pos, indexes, number=_INT, convert=int):
+        """Целые значения полей с заданными номерами (по возрастанию), считая от pos
+
+        У поля берётся число в его начале: для '2/345' это 2.
+        """
+        start = time.perf_counter_ns()
+        buf, end = self.buf, self.length
+        result = []
+        field = 0
+        for index in indexes:
+            while field < index:
+                m = _TOKEN.match(buf, pos, end)
+                if m is None:
+                    break
+                pos = m.end()
+                field += 1
+            m = number.match(buf, pos, end)
+            result.append(convert(m.group(1)) if m else convert(0))
+        self.parse_ns += time.perf_counter_ns() - start
+        return result
+
+    def float_fields(self, pos, indexes):
+        """Дробные значения полей с заданными номерами (формат '0.52'), считая от pos"""
+        return self.fields(pos, indexes, _FLOAT, float)
+
+    def matches(self, pattern):
+        """Совпадения регулярного выражения по буферу (для многострочных файлов)"""
+        start = time.perf_counter_ns()
+        try:
+            yield from pattern.finditer(self.buf, 0, self.length)
+        finally:
+            self.parse_ns += time.perf_counter_ns() - start
+
+    def stat_start(self):
+        """Смещение поля state в /proc/[pid]/stat (после последней ')' в comm)"""
+        return self.buf.rindex(b')', 0, self.length) + 2
+
+    def close(self):
+        """Закрыть дескриптор"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class ProcfsReader:
+    """Набор постоянно открытых файлов /proc с общей статистикой разбора"""
+
+    def __init__(self):
+        self.files = {}
+        self.retired = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, size=4096):
+        """Открытый ProcFile для пути (открывается при первом обращении)"""
+        pf = self.files.get(path)
+        if pf is None:
+            with self._lock:
+                pf = self.files.get(path)
+                if pf is None:
+                    pf = self.files[path] = ProcFile(path, size)
+        return pf
+
+    def read(self, path, tick=None, size=4096):
+        """Открыть при необходимости и перечитать файл, вернуть ProcFile"""
+        pf = self.get(path, size)
+        try:
+            pf.refresh(tick)
+        except OSError:
+            # Процесс или поток завершился: дескриптор больше не пригоден
+            self.forget(path)
+            raise
+        return pf
+
+    def forget(self, path):
+        """Закрыть файл, сохранив его статистику для итогового отчёта"""
+        with self._lock:
+            pf = self.files.pop(path, None)
+        if pf is not None:
+            pf.close()
+            totals = self.retired.setdefault(stats_key(path), [0, 0, 0])
+            totals[0] += pf.reads
+            totals[1] += pf.read_ns
+            totals[2] += pf.parse_ns
+
+    def forget_prefix(self, prefix, keep=()):
+        """Закрыть все файлы под prefix, кроме перечисленных в keep"""
+        for path in list(self.files):
+            if path.startswith(prefix) and path not in keep:
+                self.forget(path)
+
+    def stats(self):
+        """Число чтений и среднее время чтения/разбора по каждому виду файла"""
+        totals = {path: list(values) for path, values in self.retired.items()}
+        for path, pf in self.files.items():
+            values = totals.setdefault(stats_key(path), [0, 0, 0])
+            values[0] += pf.reads
+            values[1] += pf.read_ns
+            values[2] += pf.parse_ns
+
+        report = {}
+        for path, (reads, read_ns, parse_ns) in sorted(totals.items()):
+            if reads:
+                report[path] = {
+                    'reads': reads,
+                    'read_us': read_ns / reads / 1000,
+                    'parse_us': parse_ns / reads / 1000,
+                }
+        return report
+
+    def close(self):
+        """Закрыть все файлы"""
+        for path in list(self.files):
+            self.forget(path)
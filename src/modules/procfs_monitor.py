@@ -0,0 +1,632 @@
+import json
+import os
+import re
+import socket
+import threading
+import time
+
+from .perf_monitor import PerformanceMonitor
+from .procfs import ProcfsReader
+from .sockdiag import SockDiag, socket_inodes, states_mask
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+SECTOR_SIZE = 512
+
+# Номера полей /proc/[pid]/stat, считая от поля state (man 5 proc, поле 3)
+STAT_MINFLT = 7
+STAT_MAJFLT = 9
+STAT_UTIME = 11
+STAT_STIME = 12
+STAT_NUM_THREADS = 17
+STAT_VSIZE = 20
+STAT_RSS = 21
+STAT_PROCESSOR = 36
+
+# Коды состояний TCP в /proc/net/tcp (include/net/tcp_states.h)
+TCP_STATES = {
+    b'01': 'established',
+    b'02': 'syn_sent',
+    b'03': 'syn_recv',
+    b'06': 'time_wait',
+    b'08': 'close_wait',
+}
+
+# Те же состояния по номерам для netlink; NEW_SYN_RECV (12) ss тоже показывает как SYN-RECV
+TCP_STATE_NUMBERS = {
+    1: 'established',
+    2: 'syn_sent',
+    3: 'syn_recv',
+    6: 'time_wait',
+    8: 'close_wait',
+    12: 'syn_recv',
+}
+TCP_LISTEN = 10
+
+# Состояния, которые запрашиваются у ядра: учитываемые в строках и, для поиска
+# слушающих портов процесса, LISTEN
+TCP_REPORTED_STATES = states_mask(TCP_STATE_NUMBERS)
+TCP_PROCESS_STATES = TCP_REPORTED_STATES | states_mask([TCP_LISTEN])
+
+# Как часто перечитывать /proc/[pid]/fd для поиска сокетов процесса, секунды
+SOCKET_INODES_REFRESH = 5.0
+
+# Строка /proc/net/tcp: "sl: local rem st tx_queue:rx_queue ..."
+TCP_LINE = re.compile(rb'^\s*\d+: \S+ \S+ ([0-9A-F]{2}) ([0-9A-F]+):([0-9A-F]+)', re.M)
+
+# Строка /proc/diskstats: имя, reads, sectors_read, ms_reading, writes, sectors_written, ms_writing
+DISKSTATS_LINE = re.compile(
+    rb'^\s*\d+\s+\d+ (\S+) (\d+) \d+ (\d+) (\d+) (\d+) \d+ (\d+) (\d+)', re.M)
+
+# Интерфейсы, которые раньше выбирались через grep -E 'eth0|ens|enp'
+NET_IFACE_PATTERN = re.compile(rb'^[ \t]*\S*(?:eth0|ens|enp)\S*:', re.M)
+
+# Виртуальные блочные устройства, которые iostat не показывает как диски
+VIRTUAL_DISK_PREFIXES = (b'loop', b'ram', b'zram', b'dm-', b'md')
+
+STATE_RUNNING = ord('R')
+STATE_SLEEPING = ord('S')
+STATE_DISK_SLEEP = ord('D')
+
+# Как часто перестраивать набор целей в режиме нескольких процессов, секунды
+DISCOVERY_INTERVAL = 2.0
+
+
+class ProcfsMonitor(PerformanceMonitor):
+    """Мониторинг через прямое чтение /proc без запуска внешних утилит
+
+    Пишет те же CSV колонки, что и PerformanceMonitor. Проценты и скорости
+    считаются по разнице счётчиков между соседними тиками, поэтому сбор не
+    блокируется на секунду, как mpstat 1 1 и iostat -x 1 2.
+
+    Файлы /proc держатся открытыми между тиками (см. ProcfsReader) и
+    читаются не более одного раза за тик, даже если нужны нескольким
+    collect_* методам.
+    """
+
+    def __init__(self, pid, output_dir="monitoring_data", targets=None, thread_detail=False,
+                 tcp_source='procfs', tcp_port=None, **storage):
+        # Режим нескольких целей: общесистемные файлы читаются один раз за тик,
+        # а по каждому процессу пишется отдельная строка в process_metrics.csv
+        self.targets = targets
+        self.thread_detail = thread_detail
+        self.tcp_port = tcp_port
+        self.sockdiag = SockDiag() if tcp_source == 'netlink' else None
+        if targets is not None:
+            targets.discover()
+            if pid is None:
+                pid = targets.primary()
+
+        super().__init__(pid, output_dir, **storage)
+        self.proc = ProcfsReader()
+        if thread_detail:
+            self.multi_row.add('thread_detail')
+        if targets is not None:
+            self.multi_row.add('processes')
+            self.default_intervals['discovery'] = DISCOVERY_INTERVAL
+        self._prev = {}
+        self._whole_disks = {}
+        self._net_key = None
+        self._tids = []
+        self._tids_tick = None
+
+        # Снимок TCP сокетов через netlink, общий для tcp и tcp_info за тик
+        self._tcp_lock = threading.Lock()
+        self._tcp_tick = None
+        self._tcp = None
+        self._socket_inodes = set()
+        self._socket_inodes_time = None
+        self._listen_ports = set()
+
+        # Слушающие порты процесса нужны уже первому снимку TCP
+        if self.sockdiag is not None:
+            self._tcp_snapshot()
+
+    def collectors(self):
+        """Сборщики метрик, в режиме нескольких целей ещё и по процессам"""
+        collectors = super().collectors()
+        if self.thread_detail:
+            collectors['thread_detail'] = self.collect_thread_detail_metrics
+        if self.sockdiag is not None:
+            collectors['tcp'] = self.collect_tcp_netlink_metrics
+            collectors['tcp_info'] = self.collect_tcp_info_metrics
+        if self.targets is not None:
+            collectors['processes'] = self.collect_process_metrics
+            collectors['discovery'] = self.collect_discovery
+        return collectors
+
+    def _read(self, path, size=4096):
+        """Перечитать файл /proc не чаще раза за тик"""
+        return self.proc.read(path, self.tick, size)
+
+    def _delta(self, key, values):
+        """Разница счётчиков с предыдущим вызовом и прошедшее время в секундах
+
+        При первом вызове для ключа разницы ещё нет: возвращается (None, 0),
+        и сборщик пишет вместо скоростей пропуск, а не значения за интервал
+        в несколько миллисекунд.
+        """
+        now = time.monotonic()
+        prev = self._prev.get(key)
+        self._prev[key] = (now, values)
+        if prev is None:
+            return None, 0
+        prev_time, prev_values = prev
+        deltas = [cur - old for cur, old in zip(values, prev_values)]
+        return deltas, now - prev_time
+
+    def _task_ids(self):
+        """TID потоков процесса; ресурсы завершившихся потоков освобождаются
+
+        Каталог task читается один раз за тик и общий для сборщиков потоков.
+        """
+        if self._tids_tick == self.tick:
+            return self._tids
+
+        task_dir = f"/proc/{self.pid}/task/"
+        try:
+            tids = os.listdir(task_dir)
+        except OSError:
+            tids = []
+
+        alive = set(tids)
+        for path in list(self.proc.files):
+            if path.startswith(task_dir) and path[len(task_dir):].partition('/')[0] not in alive:
+                self.proc.forget(path)
+        for key in list(self._prev):
+            if key[0] == 'thread' and key[1] not in alive:
+                self._prev.pop(key, None)
+
+        self._tids, self._tids_tick = tids, self.tick
+        return tids
+
+    def _read_pid_stat(self, *indexes):
+        """Поля /proc/[pid]/stat по номерам; нули, если процесс завершился"""
+        try:
+            pf = self._read(f"/proc/{self.pid}/stat", 512)
+            return pf.fields(pf.stat_start(), indexes)
+        except (OSError, ValueError):
+            return [0] * len(indexes)
+
+    def _read_pid_keyed(self, name, *keys):
+        """Значения по ключам из /proc/[pid]/<name>; нули, если процесс завершился"""
+        try:
+            pf = self._read(f"/proc/{self.pid}/{name}")
+        except OSError:
+            return [0] * len(keys)
+        return [pf.value(key) for key in keys]
+
+    def _read_cpu_times(self):
+        """user, nice, system, idle, iowait, irq, softirq, steal, guest из /proc/stat"""
+        pf = self._read('/proc/stat')
+        return pf.fields(pf.find(b'cpu '), range(9))
+
+    def _is_whole_disk(self, name):
+        """Физический диск, а не раздел или виртуальное устройство"""
+        whole = self._whole_disks.get(name)
+        if whole is None:
+            whole = self._whole_disks[bytes(name)] = (
+                not name.startswith(VIRTUAL_DISK_PREFIXES)
+                and os.path.exists(b"/sys/block/" + name)
+            )
+        return whole
+
+    def _read_disk_counters(self):
+        """Суммарные reads, sectors_read, ms_reading, writes, sectors_written, ms_writing"""
+        totals = [0] * 6
+        for m in self._read('/proc/diskstats').matches(DISKSTATS_LINE):
+            if not self._is_whole_disk(m.group(1)):
+                continue
+            for i in range(6):
+                totals[i] += int(m.group(i + 2))
+        return totals
+
+    def collect_cpu_metrics(self):
+        """Сбор метрик CPU"""
+        timestamp = self.elapsed()
+
+        # Общая статистика CPU по дельтам /proc/stat (как %usr/%sys у mpstat)
+        counters, _ = self._delta('cpu', self._read_cpu_times())
+        if counters is None:
+            # Первый сбор: интервала для дельт ещё нет
+            cpu_user = cpu_system = cpu_iowait = cpu_idle = ''
+        else:
+            user, nice, system, idle, iowait, irq, softirq, steal, guest = counters
+            total = user + nice + system + idle + iowait + irq + softirq + steal
+            if total > 0:
+                cpu_user = (user - guest) * 100 / total
+                cpu_system = system * 100 / total
+                cpu_iowait = iowait * 100 / total
+                cpu_idle = idle * 100 / total
+            else:
+                cpu_user = cpu_system = cpu_iowait = cpu_idle = 0
+
+        # User и System time процесса из /proc/[pid]/stat
+        utime, stime = self._read_pid_stat(STAT_UTIME, STAT_STIME)
+        proc_user = utime / CLOCK_TICKS
+        proc_system = stime / CLOCK_TICKS
+
+        # Загрузка CPU процессом за интервал, % одного ядра как у top
+        proc_ticks, elapsed = self._delta('proc_cpu', [utime + stime])
+        if proc_ticks is None:
+            proc_cpu = ''
+        else:
+            proc_cpu = proc_ticks[0] / CLOCK_TICKS / elapsed * 100 if elapsed > 0 else 0
+
+        # Load average и runqueue
+        # Строка '0.52 0.58 0.59 2/345 6789': у поля 2/345 число в начале -- runqueue
+        pf = self._read('/proc/loadavg', 128)
+        load_1m, load_5m, load_15m = pf.float_fields(0, (0, 1, 2))
+        runqueue, = pf.fields(0, (3,))
+
+        return [
+            timestamp, cpu_user, cpu_system, cpu_iowait, cpu_idle,
+            proc_user, proc_system, proc_cpu,
+            load_1m, load_5m, load_15m, runqueue
+        ]
+
+    def collect_memory_metrics(self):
+        """Сбор метрик памяти"""
+        timestamp = self.elapsed()
+
+        # Общая память системы
+        pf = self._read('/proc/meminfo')
+        total_kb = pf.value(b'MemTotal:')
+        total_mem = total_kb / 1024
+        free_mem = pf.value(b'MemFree:') / 1024
+        cached = pf.value(b'Cached:') / 1024
+        used_mem = total_mem - free_mem - cached
+
+        # Память процесса и page faults
+        minor_faults, major_faults, vsize, rss_pages = self._read_pid_stat(
+            STAT_MINFLT, STAT_MAJFLT, STAT_VSIZE, STAT_RSS)
+        vsz_mb = vsize / 1024 / 1024
+        rss_kb = rss_pages * PAGE_SIZE / 1024
+        rss_mb = rss_kb / 1024
+        mem_percent = rss_kb * 100 / total_kb if total_kb else 0
+
+        return [
+            timestamp, rss_mb, vsz_mb, mem_percent,
+            total_mem, used_mem, free_mem, cached,
+            minor_faults, major_faults
+        ]
+
+    def collect_disk_metrics(self):
+        """Сбор метрик диска"""
+        timestamp = self.elapsed()
+
+        # Общая статистика I/O по дельтам /proc/diskstats
+        counters, elapsed = self._delta('disk', self._read_disk_counters())
+        if counters is None:
+            # Первый сбор: интервала для дельт ещё нет
+            reads_per_s = writes_per_s = read_kb = write_kb = await_time = ''
+        else:
+            reads, sectors_read, ms_reading, writes, sectors_written, ms_writing = counters
+            if elapsed > 0:
+                reads_per_s = reads / elapsed
+                writes_per_s = writes / elapsed
+                read_kb = sectors_read * SECTOR_SIZE / 1024 / elapsed
+                write_kb = sectors_written * SECTOR_SIZE / 1024 / elapsed
+            else:
+                reads_per_s = writes_per_s = read_kb = write_kb = 0
+
+            # Среднее время обслуживания запроса, аналог await у iostat
+            ios = reads + writes
+            await_time = (ms_reading + ms_writing) / ios if ios else 0
+
+        # I/O процесса
+        read_bytes, write_bytes = self._read_pid_keyed('io', b'read_bytes:', b'write_bytes:')
+        proc_read = read_bytes / 1024
+        proc_write = write_bytes / 1024
+
+        return [
+            timestamp, reads_per_s, writes_per_s, read_kb, write_kb,
+            await_time, proc_read, proc_write
+        ]
+
+    def collect_network_metrics(self):
+        """Сбор сетевых метрик"""
+        timestamp = self.elapsed()
+
+        pf = self._read('/proc/net/dev')
+
+        # Первый подходящий интерфейс ищется один раз, дальше только по ключу
+        if self._net_key is None:
+            m = NET_IFACE_PATTERN.search(pf.buf, 0, pf.length)
+            if m:
+                self._net_key = m.group(0)
+
+        pos = pf.find(self._net_key) if self._net_key else -1
+        if pos >= 0:
+            (rx_bytes, rx_packets, rx_errors, rx_dropped,
+             tx_bytes, tx_packets, tx_errors, tx_dropped) = pf.fields(
+                pos, (0, 1, 2, 3, 8, 9, 10, 11))
+        else:
+            rx_bytes = rx_packets = rx_errors = rx_dropped = 0
+            tx_bytes = tx_packets = tx_errors = tx_dropped = 0
+
+        return [
+            timestamp, rx_packets, tx_packets, rx_bytes, tx_bytes,
+            rx_errors, tx_errors, rx_dropped, tx_dropped
+        ]
+
+    def collect_thread_metrics(self):
+        """Сбор метрик потоков"""
+        timestamp = self.elapsed()
+
+        # Количество потоков и переключения контекста
+        num_threads, vol_switches, inv_switches = self._read_pid_keyed(
+            'status', b'Threads:', b'voluntary_ctxt_switches:', b'nonvoluntary_ctxt_switches:')
+
+        # Состояния потоков из /proc/[pid]/task/*/stat
+        running = sleeping = disk_sleep = 0
+        task_dir = f"/proc/{self.pid}/task/"
+
+        for tid in self._task_ids():
+            try:
+                pf = self._read(f"{task_dir}{tid}/stat", 512)
+                state = pf.buf[pf.stat_start()]
+            except (OSError, ValueError):
+                continue
+            if state == STATE_RUNNING:
+                running += 1
+            elif state == STATE_SLEEPING:
+                sleeping += 1
+            elif state == STATE_DISK_SLEEP:
+                disk_sleep += 1
+
+        return [
+            timestamp, num_threads, vol_switches, inv_switches,
+            running, sleeping, disk_sleep
+        ]
+
+    def collect_thread_detail_metrics(self):
+        """Сбор метрик каждого потока процесса, по строке на поток
+
+        CPU время потока пишется как прирост с прошлого сэмпла, переключения
+        контекста -- накопленными счётчиками, как в thread_metrics.csv.
+        """
+        task_dir = f"/proc/{self.pid}/task/"
+        rows = []
+
+        for tid in self._task_ids():
+            timestamp = self.elapsed()
+            try:
+                pf = self._read(f"{task_dir}{tid}/stat", 512)
+                start = pf.stat_start()
+                name = pf.buf[pf.buf.index(b'(') + 1:start - 2].decode(errors='replace')
+                state = chr(pf.buf[start])
+                utime, stime, last_cpu = pf.fields(start, (STAT_UTIME, STAT_STIME, STAT_PROCESSOR))
+
+                pf = self._read(f"{task_dir}{tid}/status", 2048)
+                vol_switches = pf.value(b'voluntary_ctxt_switches:')
+                inv_switches = pf.value(b'nonvoluntary_ctxt_switches:')
+            except (OSError, ValueError):
+                # Поток завершился между чтением каталога и его файлов
+                continue
+
+            ticks, elapsed = self._delta(('thread', tid), [utime, stime])
+            if ticks is None:
+                # Поток только что появился: загрузку считать не за что
+                cpu_percent = user_ms = system_ms = ''
+            else:
+                user_ticks, system_ticks = ticks
+                cpu_percent = (user_ticks + system_ticks) / CLOCK_TICKS / elapsed * 100 if elapsed > 0 else 0
+                user_ms = user_ticks * 1000 / CLOCK_TICKS
+                system_ms = system_ticks * 1000 / CLOCK_TICKS
+
+            rows.append([
+                timestamp, int(tid), name, state, last_cpu, cpu_percent, user_ms, system_ms,
+                vol_switches, inv_switches
+            ])
+
+        return rows
+
+    def collect_tcp_metrics(self):
+        """Сбор TCP метрик"""
+        timestamp = self.elapsed()
+
+        counts = dict.fromkeys(TCP_STATES.values(), 0)
+        recv_q_total = send_q_total = 0
+
+        # Состояния соединений и очереди из /proc/net/tcp и /proc/net/tcp6
+        for path in ('/proc/net/tcp', '/proc/net/tcp6'):
+            try:
+                pf = self._read(path, 65536)
+            except OSError:
+                continue
+            for m in pf.matches(TCP_LINE):
+                state = TCP_STATES.get(m.group(1))
+                if state is None:
+                    continue
+                counts[state] += 1
+                send_q_total += int(m.group(2), 16)
+                recv_q_total += int(m.group(3), 16)
+
+        return [
+            timestamp, counts['established'], counts['syn_sent'], counts['syn_recv'],
+            counts['time_wait'], counts['close_wait'], recv_q_total, send_q_total
+        ]
+
+    def _tcp_snapshot(self):
+        """Агрегаты по TCP сокетам процесса (или порта tcp_port) за текущий тик
+
+        Сокеты процесса определяются по inode из /proc/[pid]/fd. У TIME-WAIT и
+        SYN-RECV сокетов inode нет, они относятся к процессу по его
+        слушающим портам.
+        """
+        with self._tcp_lock:
+            if self._tcp_tick == self.tick:
+                return self._tcp
+
+            by_port = self.tcp_port is not None
+            now = time.monotonic()
+            if not by_port and (self._socket_inodes_time is None
+                                or now - self._socket_inodes_time >= SOCKET_INODES_REFRESH):
+                self._socket_inodes = socket_inodes(self.pid)
+                self._socket_inodes_time = now
+            inodes = self._socket_inodes
+            listen_ports = set()
+
+            snapshot = dict.fromkeys(TCP_STATES.values(), 0)
+            snapshot.update(recv_q=0, send_q=0, sockets=0, with_info=0, rtt_sum=0,
+                            rtt_max=0, cwnd_sum=0, retrans_total=0, retransmitting=0)
+
+            # По порту сокеты отбирает фильтр ядра; для процесса -- только нужные состояния
+            if by_port:
+                dump = lambda family: self.sockdiag.dump(family, TCP_REPORTED_STATES, port=self.tcp_port)
+            else:
+                dump = lambda family: self.sockdiag.dump(family, TCP_PROCESS_STATES)
+            for family in (socket.AF_INET, socket.AF_INET6):
+                for (state, retransmitting, sport, dport, rqueue, wqueue,
+                     inode, rtt, cwnd, total_retrans) in dump(family):
+                    if by_port:
+                        # Сокеты чужих портов уже отброшены фильтром ядра
+                        pass
+                    elif inode:
+                        if inode not in inodes:
+                            continue
+                        if state == TCP_LISTEN:
+                            listen_ports.add(sport)
+                    elif sport not in self._listen_ports:
+                        continue
+
+                    if state == TCP_LISTEN:
+                        continue
+                    snapshot['sockets'] += 1
+                    if retransmitting:
+                        snapshot['retransmitting'] += 1
+
+                    name = TCP_STATE_NUMBERS.get(state)
+                    if name is not None:
+                        snapshot[name] += 1
+                        snapshot['recv_q'] += rqueue
+                        snapshot['send_q'] += wqueue
+
+                    if rtt is not None:
+                        snapshot['with_info'] += 1
+                        snapshot['rtt_sum'] += rtt
+                        snapshot['rtt_max'] = max(snapshot['rtt_max'], rtt)
+                        snapshot['cwnd_sum'] += cwnd
+                        snapshot['retrans_total'] += total_retrans
+
+            if not by_port:
+                self._listen_ports = listen_ports
+            self._tcp, self._tcp_tick = snapshot, self.tick
+            return snapshot
+
+    def collect_tcp_netlink_metrics(self):
+        """Сбор TCP метрик процесса через NETLINK_SOCK_DIAG"""
+        timestamp = self.elapsed()
+        tcp = self._tcp_snapshot()
+
+        return [
+            timestamp, tcp['established'], tcp['syn_sent'], tcp['syn_recv'],
+            tcp['time_wait'], tcp['close_wait'], tcp['recv_q'], tcp['send_q']
+        ]
+
+    def collect_tcp_info_metrics(self):
+        """Сбор RTT, cwnd и ретрансмиссий из tcp_info сокетов процесса"""
+        timestamp = self.elapsed()
+        tcp = self._tcp_snapshot()
+
+        with_info = tcp['with_info']
+        rtt_avg = tcp['rtt_sum'] / with_info / 1000 if with_info else 0
+        cwnd_avg = tcp['cwnd_sum'] / with_info if with_info else 0
+
+        return [
+            timestamp, tcp['sockets'], rtt_avg, tcp['rtt_max'] / 1000,
+            cwnd_avg, tcp['retrans_total'], tcp['retransmitting']
+        ]
+
+    def collect_interrupt_metrics(self):
+        """Сбор метрик прерываний"""
+        timestamp = self.elapsed()
+
+        # Суммарные IRQ и SoftIRQ из /proc/stat (те же суммы, что в /proc/softirqs)
+        pf = self._read('/proc/stat')
+        total_irqs, = pf.fields(pf.find(b'intr '), (0,))
+        # softirq total HI TIMER NET_TX NET_RX ...
+        timer, net_tx, net_rx = pf.fields(pf.find(b'softirq '), (2, 3, 4))
+
+        return [
+            timestamp, total_irqs, net_rx, net_tx, timer
+        ]
+
+    def collect_process_metrics(self):
+        """Сбор метрик каждого отслеживаемого процесса, по строке на процесс"""
+        total_kb = self._read('/proc/meminfo').value(b'MemTotal:')
+        rows = []
+
+        for pid, comm in self.targets.current.items():
+            timestamp = self.elapsed()
+            try:
+                pf = self._read(f"/proc/{pid}/stat", 512)
+                minor_faults, major_faults, utime, stime, num_threads, vsize, rss_pages = pf.fields(
+                    pf.stat_start(),
+                    (STAT_MINFLT, STAT_MAJFLT, STAT_UTIME, STAT_STIME,
+                     STAT_NUM_THREADS, STAT_VSIZE, STAT_RSS))
+                pf = self._read(f"/proc/{pid}/status")
+                vol_switches = pf.value(b'voluntary_ctxt_switches:')
+                inv_switches = pf.value(b'nonvoluntary_ctxt_switches:')
+            except (OSError, ValueError):
+                # Процесс завершился, discovery уберёт его из набора
+                continue
+
+            # /proc/[pid]/io чужих процессов без root недоступен
+            try:
+                pf = self._read(f"/proc/{pid}/io")
+                proc_read = pf.value(b'read_bytes:') / 1024
+                proc_write = pf.value(b'write_bytes:') / 1024
+            except OSError:
+                proc_read = proc_write = 0
+
+            proc_ticks, elapsed = self._delta(('proc_cpu', pid), [utime + stime])
+            if proc_ticks is None:
+                cpu_percent = ''
+            else:
+                cpu_percent = proc_ticks[0] / CLOCK_TICKS / elapsed * 100 if elapsed > 0 else 0
+            rss_kb = rss_pages * PAGE_SIZE / 1024
+
+            rows.append([
+                timestamp, pid, comm, cpu_percent,
+                utime / CLOCK_TICKS, stime / CLOCK_TICKS,
+                rss_kb / 1024, vsize / 1024 / 1024,
+                rss_kb * 100 / total_kb if total_kb else 0,
+                minor_faults, major_faults, num_threads,
+                vol_switches, inv_switches, proc_read, proc_write
+            ])
+
+        return rows
+
+    def collect_discovery(self):
+        """Перестроить набор целей и освободить ресурсы завершившихся процессов"""
+        before = self.targets.current
+        current = self.targets.discover()
+
+        started = [pid for pid in current if pid not in before]
+        exited = [pid for pid in before if pid not in current]
+        for pid in exited:
+            self._prev.pop(('proc_cpu', pid), None)
+            if pid != self.pid:
+                self.proc.forget_prefix(f"/proc/{pid}/")
+
+        if started or exited:
+            print(f"Targets changed: +{started} -{exited} ({len(current)} total)")
+
+    def cleanup(self):
+        """Закрыть файлы /proc и сохранить статистику их разбора"""
+        stats = self.proc.stats()
+        self.proc.close()
+        if self.sockdiag is not None:
+            self.sockdiag.close()
+
+        with open(self.output_dir / 'procfs_stats.json', 'w') as f:
+            json.dump(stats, f, indent=2)
+
+        print("\n/proc read/parse time per read:")
+        for path, item in stats.items():
+            print(f"   {path}: {item['reads']} reads, "
+                  f"read {item['read_us']:.1f}us, parse {item['parse_us']:.1f}us")
+
+        super().cleanup()
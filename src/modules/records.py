@@ -0,0 +1,81 @@
+import math
+import struct
+
+from .schema import MISSING_INT, record_layout, record_struct
+
+
+def _to_float(value):
+    """Число с плавающей точкой из значения сборщика; пропуск и мусор -- NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        # mpstat и iostat в некоторых локалях печатают запятую
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        return math.nan
+
+
+def _to_int(value):
+    """Целое из значения сборщика; пропуск -- MISSING_INT"""
+    number = _to_float(value)
+    return MISSING_INT if math.isnan(number) else int(number)
+
+
+def _to_bytes(value):
+    """Текстовая колонка в байтах; struct сам обрежет и дополнит до ширины поля"""
+    if isinstance(value, bytes):
+        return value
+    return b'' if value is None else str(value).encode(errors='replace')
+
+
+def _converter(kind):
+    if kind.startswith('S'):
+        return _to_bytes
+    if kind[1] == 'f':
+        return _to_float
+    return _to_int
+
+
+class RecordPacker:
+    """Упаковка строк семейств в записи фиксированного размера по их схеме"""
+
+    def __init__(self, families):
+        self.layouts = {family: record_layout(family) for family in families}
+        self.structs = {family: record_struct(layout) for family, layout in self.layouts.items()}
+
+        # Числовые семейства пакуются как есть, а приведение типов нужно только
+        # для текстовых колонок или если сборщик вернул строку вместо числа
+        self.converters = {
+            family: [_converter(kind) for _, kind in layout[1:]]
+            for family, layout in self.layouts.items()
+        }
+        self.textual = {
+            family for family, layout in self.layouts.items()
+            if any(kind.startswith('S') for _, kind in layout)
+        }
+
+    def _convert(self, family, row):
+        return [convert(value) for convert, value in zip(self.converters[family], row)]
+
+    def pack(self, family, tick, row):
+        """Запись семейства в байтах"""
+        record = self.structs[family]
+        if family in self.textual:
+            return record.pack(tick, *self._convert(family, row))
+        try:
+            return record.pack(tick, *row)
+        except struct.error:
+            return record.pack(tick, *self._convert(family, row))
+
+    def pack_into(self, family, buffer, offset, tick, row):
+        """Упаковать запись семейства прямо в буфер"""
+        record = self.structs[family]
+        if family in self.textual:
+            record.pack_into(buffer, offset, tick, *self._convert(family, row))
+            return
+        try:
+            record.pack_into(buffer, offset, tick, *row)
+        except struct.error:
+            record.pack_into(buffer, offset, tick, *self._convert(family, row))
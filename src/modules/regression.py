@@ -0,0 +1,181 @@
+from pathlib import Path
+
+import numpy as np
+
+from .loader import load_frame
+from .schema import column_unit, rate_column
+
+# Сравниваемые ряды: колонка семейства как есть (raw) или её скорость в секунду (rate),
+# статистики, допуск на рост относительно базового прогона (tolerance) и минимальный
+# рост в единицах ряда, который считается регрессией (min_change). Для всех рядов рост -- хуже.
+REGRESSION_METRICS = [
+    {'name': 'cpu', 'family': 'cpu', 'column': 'proc_total', 'transform': 'raw',
+     'stats': ['mean', 'p95'], 'tolerance': 0.05, 'min_change': 1.0},
+    {'name': 'rss_growth', 'family': 'memory', 'column': 'rss_mb', 'transform': 'rate',
+     'stats': ['mean'], 'tolerance': 0.05, 'min_change': 0.01},
+    {'name': 'involuntary_switches', 'family': 'threads', 'column': 'involuntary_switches', 'transform': 'rate',
+     'stats': ['mean', 'p95'], 'tolerance': 0.10, 'min_change': 50},
+    {'name': 'voluntary_switches', 'family': 'threads', 'column': 'voluntary_switches', 'transform': 'rate',
+     'stats': ['mean', 'p95'], 'tolerance': 0.10, 'min_change': 50},
+    {'name': 'write_rate', 'family': 'disk', 'column': 'proc_write_bytes', 'transform': 'rate',
+     'stats': ['mean', 'p95'], 'tolerance': 0.10, 'min_change': 100},
+    {'name': 'recv_q', 'family': 'tcp', 'column': 'recv_q_total', 'transform': 'raw',
+     'stats': ['mean', 'p95'], 'tolerance': 0.10, 'min_change': 100},
+]
+
+# Статистики сравнения: среднее и перцентили (процент для каждого)
+QUANTILES = {'p50': 50, 'p95': 95, 'p99': 99}
+STATS = ('mean', *QUANTILES)
+
+WARMUP = 10.0
+RESAMPLES = 10_000
+CONFIDENCE = 0.95
+
+# Меньше стольких сэмплов после прогрева ряд не сравнивается
+MIN_SAMPLES = 10
+
+# Бутстреп выборки строятся пачками не больше стольких элементов, чтобы память не росла с числом выборок
+BOOTSTRAP_ELEMENTS = 1 << 23
+
+
+def metric_series(data_dir, metric):
+    """Время от начала записи и значения ряда сравнения; None, если колонки нет"""
+    df = load_frame(Path(data_dir), metric['family'])
+    if df is None or metric['column'] not in df.columns or not len(df):
+        return None
+    timestamps = df['timestamp'].to_numpy(dtype=float)
+    values = df[metric['column']].to_numpy(dtype=float)
+    if metric['transform'] == 'rate':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.diff(values, prepend=np.nan) / np.diff(timestamps, prepend=np.nan)
+    return timestamps - timestamps[0], values
+
+
+def aligned(baseline, candidate, warmup):
+    """Значения двух рядов на общем интервале после прогрева: [warmup, конец более короткой записи]"""
+    end = min(baseline[0][-1], candidate[0][-1])
+    parts = []
+    for elapsed, values in (baseline, candidate):
+        values = values[(elapsed >= warmup) & (elapsed <= end)]
+        parts.append(values[np.isfinite(values)])
+    return parts
+
+
+def statistic(values, stat):
+    """Статистика ряда: mean или перцентиль из QUANTILES"""
+    return float(values.mean() if stat == 'mean' else np.percentile(values, QUANTILES[stat]))
+
+
+def row_percentiles(samples, percent):
+    """Перцентиль каждой строки матрицы (линейная интерполяция, как у np.percentile)
+
+    Строки частично упорядочиваются на месте по одной позиции k, а
+    следующая за ней порядковая статистика -- минимум правее k: это заметно
+    быстрее, чем np.percentile, который упорядочивает по двум позициям.
+    """
+    position = (samples.shape[1] - 1) * percent / 100
+    k = int(position)
+    samples.partition(k, axis=1)
+    low = samples[:, k]
+    if k + 1 >= samples.shape[1]:
+        return low.astype(float)
+    high = samples[:, k + 1:].min(axis=1)
+    return low + (position - k) * (high.astype(float) - low)
+
+
+def block_bootstrap(values, stats, resamples, rng, block=None):
+    """Статистики stats на resamples выборках блочного бутстрепа: {статистика: массив}
+
+    Соседние сэмплы метрик коррелированы, поэтому выборка собирается из
+    ceil(n / block) случайных отрезков длины block (по умолчанию n^(1/3))
+    исходного ряда. Среднее выборки считается по заранее посчитанным суммам
+    отрезков, без самой выборки. Для перцентилей выборки собираются матрицей
+    (выборка x сэмпл) из окон ряда в float32 пачками по BOOTSTRAP_ELEMENTS
+    элементов, перцентили строк -- через row_percentiles.
+    """
+    n = len(values)
+    block = block or max(1, round(n ** (1 / 3)))
+    blocks = -(-n // block)
+    length = blocks * block
+    quantiles = [stat for stat in stats if stat != 'mean']
+
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    block_sums = cumulative[block:] - cumulative[:-block]
+    windows = np.lib.stride_tricks.sliding_window_view(values.astype(np.float32), block)
+
+    result = {stat: np.empty(resamples) for stat in stats}
+    batch = max(1, BOOTSTRAP_ELEMENTS // length) if quantiles else resamples
+    for begin in range(0, resamples, batch):
+        count = min(batch, resamples - begin)
+        starts = rng.integers(0, n - block + 1, size=(count, blocks))
+        if 'mean' in stats:
+            result['mean'][begin:begin + count] = block_sums[starts].sum(axis=1) / length
+        if quantiles:
+            samples = windows[starts].reshape(count, length)
+            for stat in quantiles:
+                result[stat][begin:begin + count] = row_percentiles(samples, QUANTILES[stat])
+    return result
+
+
+def compare_runs(baseline_dir, candidate_dir, metrics=REGRESSION_METRICS, warmup=WARMUP, resamples=RESAMPLES,
+                 confidence=CONFIDENCE, seed=0):
+    """Сравнить кандидата с базовым прогоном: доверительные интервалы разностей и вердикт
+
+    Для каждого ряда и статистики считается разность кандидат - база и её
+    доверительный интервал по независимым бутстреп выборкам обоих прогонов.
+    Допустимый рост -- max(tolerance * |база|, min_change). Проверка
+    проваливается (fail), если весь интервал выше допустимого роста, и
+    отмечается как улучшение (improved), если весь интервал ниже его со
+    знаком минус. Вердикт -- fail, если провалилась хотя бы одна проверка.
+    """
+    rng = np.random.default_rng(seed)
+    alpha = (1 - confidence) / 2
+    checks = []
+    for metric in metrics:
+        name = rate_column(metric['column']) if metric['transform'] == 'rate' else metric['column']
+        check = {'metric': metric['name'], 'series': f"{metric['family']}.{name}", 'unit': column_unit(name)}
+        series = metric_series(baseline_dir, metric), metric_series(candidate_dir, metric)
+        if None in series:
+            checks.extend({**check, 'stat': stat, 'status': 'skipped', 'reason': 'no data'}
+                          for stat in metric['stats'])
+            continue
+        base, cand = aligned(*series, warmup)
+        if min(len(base), len(cand)) < MIN_SAMPLES:
+            checks.extend({**check, 'stat': stat, 'status': 'skipped', 'reason': 'too few samples after warm-up'}
+                          for stat in metric['stats'])
+            continue
+
+        base_boot = block_bootstrap(base, metric['stats'], resamples, rng)
+        cand_boot = block_bootstrap(cand, metric['stats'], resamples, rng)
+        for stat in metric['stats']:
+            base_value = statistic(base, stat)
+            cand_value = statistic(cand, stat)
+            low, high = np.quantile(cand_boot[stat] - base_boot[stat], [alpha, 1 - alpha])
+            allowed = max(metric['tolerance'] * abs(base_value), metric['min_change'])
+            if low > allowed:
+                status = 'fail'
+            elif high < -allowed:
+                status = 'improved'
+            else:
+                status = 'pass'
+            checks.append({
+                **check,
+                'stat': stat,
+                'status': status,
+                'baseline': base_value,
+                'candidate': cand_value,
+                'diff': cand_value - base_value,
+                'ci': [float(low), float(high)],
+                'allowed': allowed,
+                'samples': [len(base), len(cand)],
+            })
+
+    return {
+        'verdict': 'fail' if any(check['status'] == 'fail' for check in checks) else 'pass',
+        'baseline': str(baseline_dir),
+        'candidate': str(candidate_dir),
+        'warmup': warmup,
+        'resamples': resamples,
+        'confidence': confidence,
+        'checks': checks,
+    }
@@ -0,0 +1,179 @@
+import json
+import mmap
+import os
+import struct
+
+from .records import RecordPacker
+from .schema import RING_FILENAME, TICKS
+from .store import StoreWrapper
+
+# Каталог разделяемой памяти; файлы в нём живут в RAM и не трогают диск
+SHM_DIR = '/dev/shm'
+
+# Заголовок кольца: метка, версия, размер записи, ёмкость, число опубликованных записей
+RING_MAGIC = b'PERFRING'
+RING_VERSION = 2
+RING_HEADER = struct.Struct('<8sIIQQ')
+RING_WRITTEN = struct.Struct('<Q')
+RING_WRITTEN_OFFSET = 24
+RING_HEADER_SIZE = 64
+
+# Слот: номер версии записи, затем сама запись, дополненная до 8 байт
+RING_SEQUENCE = struct.Struct('<Q')
+
+# Последних записей на семейство по умолчанию
+RING_CAPACITY = 4096
+
+
+def slot_size(record_size):
+    """Размер слота кольца: слово версии и запись, выровненные на 8 байт"""
+    return RING_SEQUENCE.size + (record_size + 7) // 8 * 8
+
+
+def sequence(number):
+    """Версия слота с опубликованной записью number (чётная)"""
+    return 2 * (number + 1)
+
+
+class Ring:
+    """Кольцо последних записей одного семейства в файле из /dev/shm
+
+    Писатель один: запись k кладётся в слот k % capacity, после чего
+    счётчик written в заголовке увеличивается. Блокировок нет, и порядок, в
+    котором другие ядра видят записи в память, не гарантирован (на aarch64
+    они могут стать видны не в порядке программы), поэтому у каждого слота
+    есть слово версии: перед записью оно нечётное (2k + 1), после --
+    чётное (2k + 2). Читатель копирует слоты и сверяет их версии до и после
+    копирования, отбрасывая недописанные и перезаписанные (см. RingReader).
+    """
+
+    def __init__(self, path, record_size, capacity):
+        self.path = path
+        self.record_size = record_size
+        self.slot_size = slot_size(record_size)
+        self.capacity = capacity
+        self.written = 0
+
+        size = RING_HEADER_SIZE + self.slot_size * capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        RING_HEADER.pack_into(self.map, 0, RING_MAGIC, RING_VERSION, record_size, capacity, 0)
+
+    def _slot(self):
+        return RING_HEADER_SIZE + (self.written % self.capacity) * self.slot_size
+
+    def begin(self):
+        """Пометить слот следующей записи как изменяемый и вернуть смещение записи в нём"""
+        offset = self._slot()
+        RING_SEQUENCE.pack_into(self.map, offset, sequence(self.written) - 1)
+        return offset + RING_SEQUENCE.size
+
+    def publish(self):
+        """Пометить слот записанным и сделать его видимым читателям"""
+        RING_SEQUENCE.pack_into(self.map, self._slot(), sequence(self.written))
+        self.written += 1
+        RING_WRITTEN.pack_into(self.map, RING_WRITTEN_OFFSET, self.written)
+
+    def close(self):
+        """Закрыть и удалить кольцо"""
+        self.map.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_stale_rings():
+    """Удалить кольца мониторов, которые завершились, не закрыв их (SIGKILL, падение)
+
+    /dev/shm живёт в RAM, поэтому брошенные кольца занимают память до
+    перезагрузки. Кольцо считается брошенным, если процесса с pid из его
+    имени (perfmon-<pid>-<семейство>) больше нет.
+    """
+    try:
+        names = os.listdir(SHM_DIR)
+    except OSError:
+        return
+    alive = {}
+    for name in names:
+        prefix, _, rest = name.partition('-')
+        pid = rest.partition('-')[0]
+        if prefix != 'perfmon' or not pid.isdigit():
+            continue
+        if pid not in alive:
+            try:
+                os.kill(int(pid), 0)
+                alive[pid] = True
+            except ProcessLookupError:
+                alive[pid] = False
+            except PermissionError:
+                # Процесс есть, но принадлежит другому пользователю
+                alive[pid] = True
+        if not alive[pid]:
+            try:
+                os.unlink(f"{SHM_DIR}/{name}")
+            except OSError as e:
+                print(f"Warning: cannot remove stale ring {name}: {e}")
+
+
+class RingStore(StoreWrapper):
+    """Хранилище, которое кроме записи на диск публикует строки в кольца в разделяемой памяти
+
+    Список колец с их путями и полями записей лежит в ring.json каталога
+    данных; читатели подключаются к ним через RingReader.
+    """
+
+    def __init__(self, store, output_dir, families, capacity=RING_CAPACITY):
+        super().__init__(store)
+        self.index_path = output_dir / RING_FILENAME
+        remove_stale_rings()
+
+        families = [*families, TICKS]
+        self.packer = RecordPacker(families)
+        self.rings = {
+            family: Ring(f"{SHM_DIR}/perfmon-{os.getpid()}-{family}",
+                         self.packer.structs[family].size, capacity)
+            for family in families
+        }
+
+        index = {
+            'pid': os.getpid(),
+            'capacity': capacity,
+            'families': {
+                family: {'path': ring.path, 'fields': self.packer.layouts[family]}
+                for family, ring in self.rings.items()
+            },
+        }
+        with open(self.index_path, 'w') as f:
+            json.dump(index, f, indent=2)
+
+    def _publish(self, family, tick, row):
+        ring = self.rings[family]
+        self.packer.pack_into(family, ring.map, ring.begin(), tick, row)
+        ring.publish()
+
+    def write(self, family, tick, row):
+        """Записать строку семейства и опубликовать её в кольце"""
+        self.store.write(family, tick, row)
+        try:
+            self._publish(family, tick, row)
+        except struct.error as e:
+            print(f"Error publishing {family} row: {e}")
+
+    def write_tick(self, tick, timestamp, wall_time):
+        self.store.write_tick(tick, timestamp, wall_time)
+        self._publish(TICKS, tick, (timestamp, wall_time))
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        """Закрыть хранилище и удалить кольца вместе с их списком"""
+        self.store.close()
+        for ring in self.rings.values():
+            ring.close()
+        self.index_path.unlink(missing_ok=True)
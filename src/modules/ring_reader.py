@@ -0,0 +1,94 @@
+import json
+import mmap
+import time
+
+import numpy as np
+
+from .ring import (RING_HEADER, RING_HEADER_SIZE, RING_MAGIC, RING_SEQUENCE, RING_VERSION, RING_WRITTEN,
+                   RING_WRITTEN_OFFSET, sequence, slot_size)
+from .schema import RING_FILENAME
+
+
+class RingReader:
+    """Чтение кольца семейства из разделяемой памяти без чтения файлов
+
+    Записи отдаются numpy массивами, скопированными из памяти кольца и
+    проверенными по версиям слотов (см. Ring), так что они не меняются,
+    когда писатель идёт дальше.
+    """
+
+    def __init__(self, path, fields):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, capacity, _ = RING_HEADER.unpack_from(self.map, 0)
+        if magic != RING_MAGIC:
+            raise ValueError(f"{path} is not a metrics ring")
+        if version != RING_VERSION:
+            raise ValueError(f"{path}: unsupported ring version {version}")
+
+        self.dtype = np.dtype([tuple(field) for field in fields])
+        if self.dtype.itemsize != record_size:
+            raise ValueError(f"{path}: record size {record_size} does not match its fields")
+        self.capacity = capacity
+        slot = np.dtype({'names': ['sequence', 'record'], 'formats': ['<u8', self.dtype],
+                         'offsets': [0, RING_SEQUENCE.size], 'itemsize': slot_size(record_size)})
+        self.slots = np.frombuffer(self.map, dtype=slot, count=capacity, offset=RING_HEADER_SIZE)
+
+    def written(self):
+        """Сколько записей опубликовано с начала мониторинга"""
+        return RING_WRITTEN.unpack_from(self.map, RING_WRITTEN_OFFSET)[0]
+
+    def read(self, since=0):
+        """Копия записей с номерами от since до текущего written
+
+        Возвращает (позиция для следующего чтения, записи). Версия каждого
+        слота читается до и после копирования; запись берётся, только если
+        обе равны версии её номера. Вытесненные из кольца (версия больше)
+        записи пропускаются, а с первой ещё не ставшей видимой целиком
+        (версия меньше) чтение продолжится в следующий раз.
+        """
+        end = self.written()
+        start = max(since, end - self.capacity, 0)
+        if start >= end:
+            return end, np.empty(0, dtype=self.dtype)
+
+        numbers = np.arange(start, end)
+        index = numbers % self.capacity
+        before = self.slots['sequence'][index]
+        records = self.slots['record'][index]
+        after = self.slots['sequence'][index]
+
+        expected = sequence(numbers)
+        pending = np.flatnonzero((before < expected) | (after < expected))
+        if len(pending):
+            end = int(numbers[pending[0]])
+        valid = (before == expected) & (after == expected) & (numbers < end)
+        return end, records[valid]
+
+    def latest(self, n):
+        """Последние n записей"""
+        return self.read(self.written() - n)[1]
+
+    def follow(self, interval=0.5, since=None):
+        """Бесконечно отдавать новые записи по мере их появления"""
+        position = self.written() if since is None else since
+        while True:
+            position, records = self.read(position)
+            if len(records):
+                yield records
+            else:
+                time.sleep(interval)
+
+    def close(self):
+        self.slots = None
+        self.map.close()
+
+
+def attach(data_dir):
+    """Подключиться к кольцам работающего монитора: {семейство: RingReader}"""
+    with open(data_dir / RING_FILENAME) as f:
+        index = json.load(f)
+    return {
+        family: RingReader(entry['path'], entry['fields'])
+        for family, entry in index['families'].items()
+    }
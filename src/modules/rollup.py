@@ -0,0 +1,145 @@
+import math
+
+from .schema import COUNTER_COLUMNS, ROLLUP_SKIP, ROLLUP_TIERS, rollup_family
+from .store import StoreWrapper
+
+
+def _number(value):
+    """Число из значения сборщика или None для пропуска"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+class Rollup:
+    """Свёртка одного семейства в корзины фиксированной длины
+
+    Каждый сэмпл обновляет счётчики текущей корзины за O(1) на колонку;
+    строка свёртки выдаётся, когда приходит сэмпл из следующей корзины.
+    Скорость счётчиков считается по предыдущему сэмплу, в том числе через
+    границу корзины.
+    """
+
+    def __init__(self, columns, counters, seconds):
+        self.seconds = seconds
+        self.fields = [(i, column in counters) for i, column in enumerate(columns)
+                       if column not in ROLLUP_SKIP]
+        self.bucket = None
+        self.tick = None
+        self.previous = {}
+        self._reset()
+
+    def _reset(self):
+        self.samples = 0
+        self.timestamp = None
+        n = len(self.fields)
+        self.count = [0] * n
+        self.sum = [0.0] * n
+        self.min = [math.inf] * n
+        self.max = [-math.inf] * n
+        self.last = [math.nan] * n
+
+    def add(self, tick, row):
+        """Добавить сэмпл; вернуть (tick, строка) закрытой корзины или None"""
+        timestamp = _number(row[0])
+        if timestamp is None:
+            return None
+
+        bucket = int(timestamp // self.seconds)
+        closed = None
+        if self.bucket is not None and bucket != self.bucket:
+            closed = self.emit()
+        self.bucket = bucket
+        self.tick = tick
+        self.timestamp = timestamp
+
+        values = 0
+        for k, (i, counter) in enumerate(self.fields):
+            value = _number(row[i])
+            if value is None:
+                continue
+            values += 1
+            if counter:
+                previous = self.previous.get(k)
+                self.previous[k] = (timestamp, value)
+                if previous is None or timestamp <= previous[0]:
+                    self.last[k] = value
+                    continue
+                rate = (value - previous[1]) / (timestamp - previous[0])
+                self.count[k] += 1
+                if rate > self.max[k]:
+                    self.max[k] = rate
+            else:
+                self.count[k] += 1
+                self.sum[k] += value
+                if value < self.min[k]:
+                    self.min[k] = value
+                if value > self.max[k]:
+                    self.max[k] = value
+            self.last[k] = value
+
+        # Маркер пропуска не считается сэмплом
+        if values:
+            self.samples += 1
+        return closed
+
+    def emit(self):
+        """Строка текущей корзины, после чего корзина начинается заново"""
+        if self.bucket is None or self.samples == 0:
+            self._reset()
+            return None
+
+        row = [self.timestamp, self.bucket * self.seconds, self.samples]
+        for k, (_, counter) in enumerate(self.fields):
+            count = self.count[k]
+            if counter:
+                row += [self.last[k], self.max[k] if count else math.nan]
+            elif count:
+                row += [self.sum[k] / count, self.min[k], self.max[k], self.last[k]]
+            else:
+                row += [math.nan] * 4
+        tick = self.tick
+        self._reset()
+        return tick, row
+
+
+class RollupStore(StoreWrapper):
+    """Хранилище, которое рядом с сырыми строками пишет их свёртки по уровням ROLLUP_TIERS
+
+    Свёртки -- обычные семейства хранилища (cpu@10s, cpu@1m, ...), поэтому
+    сегменты, удаление старых данных и экспорт работают с ними так же.
+    """
+
+    def __init__(self, store, families, columns):
+        super().__init__(store)
+        self.rollups = {
+            family: [(rollup_family(family, tier),
+                      Rollup(columns[family], COUNTER_COLUMNS.get(family, ()), seconds))
+                     for tier, seconds in ROLLUP_TIERS.items()]
+            for family in families if rollup_family(family, next(iter(ROLLUP_TIERS))) in columns
+        }
+
+    def write(self, family, tick, row):
+        """Записать строку семейства и закрытые ей корзины свёрток"""
+        self.store.write(family, tick, row)
+        for name, rollup in self.rollups.get(family, ()):
+            closed = rollup.add(tick, row)
+            if closed is not None:
+                self.store.write(name, *closed)
+
+    def write_tick(self, tick, timestamp, wall_time):
+        self.store.write_tick(tick, timestamp, wall_time)
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        """Дописать незакрытые корзины и закрыть хранилище"""
+        for family_rollups in self.rollups.values():
+            for name, rollup in family_rollups:
+                closed = rollup.emit()
+                if closed is not None:
+                    self.store.write(name, *closed)
+        self.store.close()
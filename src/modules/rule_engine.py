@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+
+from .rules import COMPARATORS, RULES, TREND_TRANSFORMS, format_details
+from .schema import rate_column
+
+# Столько строк матрицы значений сравнивается за раз, чтобы память не росла с длиной записи
+BLOCK_ROWS = 1 << 14
+
+# Колонки свёртки, по которым проверяются правила порога: среднее корзины прячет
+# пики, поэтому берётся её экстремум в сторону сравнения (у счётчика --
+# максимальная скорость внутри корзины)
+EXTREME_SUFFIXES = {
+    ('raw', 'max'): '_max',
+    ('raw', 'min'): '_min',
+    ('rate', 'max'): '_rate_max',
+}
+
+
+def _mean(values):
+    """Среднее без NaN; NaN, если значений нет"""
+    values = values[~np.isnan(values)]
+    return values.mean() if len(values) else np.nan
+
+
+class RuleEngine:
+    """Проверка всех правил за один векторный проход
+
+    Ряды правил (колонки семейства, преобразование, окно) считаются по
+    одному разу, даже если на них ссылается несколько правил. Все ряды
+    выравниваются по номеру строки в одну матрицу (короткие дополняются
+    NaN), и пороги всех правил с одинаковым сравнением проверяются одной
+    операцией numpy. Стоимость растёт с числом различных рядов, а не правил.
+
+    Данные можно подавать кусками (evaluate_chunks): между кусками ряд
+    помнит последнюю строку для diff и rate, хвост окна rolling и первые и
+    последние строки для правил тренда, поэтому результат не зависит от
+    размера кусков. Правила тренда проверяются один раз, на конце записи.
+    """
+
+    def __init__(self, rules=RULES):
+        self.rules = list(rules)
+        self.families = list(dict.fromkeys(rule['family'] for rule in self.rules))
+
+        # Различные ряды и номер ряда каждого правила
+        self.keys = list(dict.fromkeys(self.series_key(rule) for rule in self.rules))
+        positions = {key: j for j, key in enumerate(self.keys)}
+        self.rule_series = np.array([positions[self.series_key(rule)] for rule in self.rules], dtype=np.intp)
+
+        # Правила, проверяемые по строкам, сгруппированные по сравнению
+        self.row_rules = np.array([i for i, rule in enumerate(self.rules)
+                                   if rule['transform'] not in TREND_TRANSFORMS], dtype=np.intp)
+        thresholds = np.array([float(rule['threshold']) for rule in self.rules])
+        ops = np.array([rule['op'] for rule in self.rules])
+        self.thresholds = thresholds[self.row_rules]
+        self.groups = [(COMPARATORS[op], ops[self.row_rules] == op) for op in np.unique(ops[self.row_rules])]
+
+    @staticmethod
+    def series_key(rule):
+        """Ряд, по которому проверяется правило
+
+        Последний элемент -- экстремум корзины свёртки, нужный сравнению
+        правила (см. EXTREME_SUFFIXES); у остальных преобразований -- None.
+        """
+        extreme = None
+        if rule['transform'] in ('raw', 'rate'):
+            extreme = 'min' if rule['op'] in ('<', '<=') else 'max'
+        return rule['family'], tuple(rule['metrics']), rule['transform'], rule.get('window'), extreme
+
+    def _series(self, df, key, carry):
+        """Значения ряда по куску семейства с учётом предыдущих кусков; None, если колонок нет"""
+        _, metrics, transform, window, extreme = key
+        if not all(metric in df.columns for metric in metrics):
+            return None
+
+        # Свёртка (у неё есть колонка bucket): экстремум корзины вместо среднего
+        suffix = EXTREME_SUFFIXES.get((transform, extreme))
+        if suffix and len(metrics) == 1 and 'bucket' in df.columns and metrics[0] + suffix in df.columns:
+            if transform == 'rate':
+                carry['value'] = df[metrics[0]].to_numpy(dtype=float)[-1]
+                carry['timestamp'] = df['timestamp'].to_numpy(dtype=float)[-1]
+            return df[metrics[0] + suffix].to_numpy(dtype=float)
+
+        # Скорость счётчика, уже посчитанная загрузчиком по всему кадру
+        if transform == 'rate' and len(metrics) == 1 and rate_column(metrics[0]) in df.columns and not carry:
+            carry['value'] = df[metrics[0]].to_numpy(dtype=float)[-1]
+            carry['timestamp'] = df['timestamp'].to_numpy(dtype=float)[-1]
+            return df[rate_column(metrics[0])].to_numpy(dtype=float)
+
+        values = df[list(metrics)].to_numpy(dtype=float).sum(axis=1)
+        if transform == 'raw':
+            return values
+        if transform == 'rolling':
+            history = np.concatenate((carry.get('tail', values[:0]), values))
+            carry['tail'] = history[max(len(history) - window + 1, 0):] if window > 1 else values[:0]
+            return pd.Series(history).rolling(window).mean().to_numpy()[len(history) - len(values):]
+
+        timestamps = df['timestamp'].to_numpy(dtype=float)
+        if transform in TREND_TRANSFORMS:
+            carry['rows'] = carry.get('rows', 0) + len(values)
+            carry['head'] = np.concatenate((carry.get('head', values[:0]), values))[:window]
+            carry['head_time'] = np.concatenate((carry.get('head_time', timestamps[:0]), timestamps))[:window]
+            carry['tail'] = np.concatenate((carry.get('tail', values[:0]), values))[-window:]
+            carry['tail_time'] = np.concatenate((carry.get('tail_time', timestamps[:0]), timestamps))[-window:]
+            return None
+
+        delta = np.diff(values, prepend=carry.get('value', np.nan))
+        carry['value'] = values[-1]
+        if transform == 'diff':
+            carry['timestamp'] = timestamps[-1]
+            return delta
+        elapsed = np.diff(timestamps, prepend=carry.get('timestamp', np.nan))
+        carry['timestamp'] = timestamps[-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return delta / elapsed
+
+    @staticmethod
+    def _trend(key, carry):
+        """Значение правила тренда по первым и последним window строкам записи и его статистика"""
+        _, _, transform, window, _ = key
+        if carry.get('rows', 0) <= window:
+            return None
+
+        start, end = _mean(carry['head']), _mean(carry['tail'])
+        if transform == 'ratio':
+            if start:
+                value = end / start
+            else:
+                value = np.inf if end > 0 else np.nan
+        else:
+            elapsed = carry['tail_time'].mean() - carry['head_time'].mean()
+            value = (end - start) / elapsed if elapsed > 0 else 0
+        return dict(start=start, end=end, change=end - start, value=value)
+
+    def evaluate(self, frames, indexed=False):
+        """Находки по кадрам семейств {семейство: DataFrame} в порядке правил
+
+        Правила, для которых нет семейства или колонок, пропускаются. При
+        indexed -- пары (номер правила, находка).
+        """
+        return self.evaluate_chunks({family: [df] for family, df in frames.items()}, indexed)
+
+    def start(self):
+        """Состояние проверки до первой строки: перенос рядов между кусками и счётчики правил
+
+        Состояние -- обычный словарь с numpy массивами, его можно сохранить
+        (pickle) и продолжить проверку с того же места в другом процессе.
+        """
+        return {
+            'carries': [{} for _ in self.keys],
+            'present': np.zeros(len(self.keys), dtype=bool),
+            'samples': np.zeros(len(self.row_rules), dtype=np.int64),
+            'totals': np.zeros(len(self.row_rules)),
+        }
+
+    def evaluate_chunks(self, chunks, indexed=False, state=None):
+        """Находки по кускам семейств {семейство: куски DataFrame по порядку}
+
+        На каждом шаге берётся следующий кусок каждого семейства, куски
+        выравниваются по номеру строки в одну матрицу и проверяются вместе.
+        В памяти одновременно только по одному куску на семейство. При
+        state проверка продолжается с состояния предыдущих кусков (см.
+        start), и оно обновляется на месте; находки -- по всем строкам.
+        """
+        state = self.start() if state is None else state
+        carries, present = state['carries'], state['present']
+        samples, totals = state['samples'], state['totals']
+
+        iterators = {family: iter(parts) for family, parts in chunks.items()}
+        while iterators:
+            parts = {}
+            for family, parts_iter in list(iterators.items()):
+                part = next(parts_iter, None)
+                if part is None:
+                    del iterators[family]
+                elif len(part):
+                    parts[family] = part
+            if not parts:
+                continue
+
+            matrix = np.full((max(len(part) for part in parts.values()), len(self.keys)), np.nan)
+            for j, key in enumerate(self.keys):
+                part = parts.get(key[0])
+                if part is None:
+                    continue
+                column = self._series(part, key, carries[j])
+                if column is not None or carries[j]:
+                    present[j] = True
+                if column is not None:
+                    matrix[:len(column), j] = column
+
+            index = self.rule_series[self.row_rules]
+            for begin in range(0, len(matrix), BLOCK_ROWS):
+                values = matrix[begin:begin + BLOCK_ROWS][:, index]
+                hits = np.zeros(values.shape, dtype=bool)
+                for compare, selected in self.groups:
+                    hits[:, selected] = compare(values[:, selected], self.thresholds[selected])
+                samples += hits.sum(axis=0)
+                totals += np.where(hits, values, 0).sum(axis=0)
+
+        findings = self._findings(carries, present, samples, totals)
+        return findings if indexed else [finding for _, finding in findings]
+
+    def _findings(self, carries, present, samples, totals):
+        """Пары (номер правила, находка) по итогам проверки в порядке правил"""
+        row_position = {i: k for k, i in enumerate(self.row_rules)}
+        findings = []
+        for i, rule in enumerate(self.rules):
+            j = self.rule_series[i]
+            if not present[j]:
+                continue
+            if i in row_position:
+                k = row_position[i]
+                if not samples[k]:
+                    continue
+                stats = dict(samples=int(samples[k]), mean=totals[k] / samples[k], total=totals[k])
+            else:
+                stats = self._trend(self.keys[j], carries[j])
+                if stats is None or not COMPARATORS[rule['op']](stats['value'], rule['threshold']):
+                    continue
+            findings.append((i, {
+                'category': rule['category'],
+                'severity': rule['severity'],
+                'issue': rule['issue'],
+                'details': format_details(rule, **stats),
+                'suggestion': rule.get('suggestion', ''),
+            }))
+        return findings
@@ -0,0 +1,196 @@
+import json
+import operator
+
+# Сравнения, которые можно использовать в правилах
+COMPARATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+# Сколько первых и последних сэмплов сравнивают правила тренда
+TREND_WINDOW = 10
+
+# Правила детектирования аномалий
+#
+# Значение правила считается по колонкам metrics семейства family (если
+# колонок несколько, они складываются) преобразованием transform:
+#   raw    -- значение как есть;
+#   diff   -- разность с предыдущей строкой;
+#   rate   -- разность с предыдущей строкой в секунду;
+#   rolling -- среднее последних window строк (пока их меньше -- не определено);
+#   growth -- (среднее последних window строк - среднее первых window) в
+#             секунду между средними timestamp этих строк;
+#   ratio  -- среднее последних window строк к среднему первых window.
+# Правила тренда (growth, ratio) проверяются, только когда строк больше window.
+#
+# Значение сравнивается с threshold через op. details -- шаблон описания
+# находки: {samples}, {mean}, {total} -- число, среднее и сумма сработавших
+# значений (mean и total умножаются на scale, если он задан), для правил
+# тренда -- {start}, {end}, {change} и {value}; {threshold} -- порог правила.
+RULES = [
+    {
+        'family': 'cpu', 'metrics': ['system'], 'transform': 'raw', 'op': '>', 'threshold': 30,
+        'category': 'CPU', 'severity': 'HIGH', 'issue': 'High System CPU Time',
+        'suggestion': 'Check for excessive system calls, context switches, or kernel operations',
+        'details': 'System time exceeded {threshold}% for {samples} samples (avg: {mean:.2f}%)',
+    },
+    {
+        'family': 'cpu', 'metrics': ['iowait'], 'transform': 'raw', 'op': '>', 'threshold': 20,
+        'category': 'CPU', 'severity': 'HIGH', 'issue': 'High IOWait',
+        'suggestion': 'Disk I/O bottleneck detected. Check disk performance and I/O patterns',
+        'details': 'IOWait exceeded {threshold}% for {samples} samples (avg: {mean:.2f}%)',
+    },
+    {
+        'family': 'cpu', 'metrics': ['runqueue'], 'transform': 'raw', 'op': '>', 'threshold': 5,
+        'category': 'CPU', 'severity': 'MEDIUM', 'issue': 'Long Runqueue',
+        'suggestion': 'CPU contention detected. Consider reducing concurrency or adding CPU resources',
+        'details': 'Runqueue length exceeded {threshold} for {samples} samples (avg: {mean:.2f})',
+    },
+    {
+        'family': 'cpu', 'metrics': ['proc_system'], 'transform': 'rate', 'op': '>', 'threshold': 1.0,
+        'category': 'CPU', 'severity': 'MEDIUM', 'issue': 'Process System Time Growth',
+        'suggestion': 'Process is making frequent system calls. Profile with strace or perf',
+        'details': 'Process system time grew faster than 1s/s in {samples} samples',
+    },
+    {
+        'family': 'memory', 'metrics': ['rss_mb'], 'transform': 'growth', 'window': TREND_WINDOW,
+        'op': '>', 'threshold': 0.1,
+        'category': 'Memory', 'severity': 'CRITICAL', 'issue': 'Memory Leak Detected',
+        'suggestion': 'Investigate memory allocations with valgrind or heap profiler',
+        'details': 'RSS grew from {start:.2f}MB to {end:.2f}MB ({change:.2f}MB total, {value:.4f}MB/s)',
+    },
+    {
+        'family': 'memory', 'metrics': ['page_faults_major'], 'transform': 'rate', 'op': '>', 'threshold': 10,
+        'category': 'Memory', 'severity': 'HIGH', 'issue': 'High Major Page Faults',
+        'suggestion': 'Memory pressure detected. Check if working set exceeds physical memory',
+        'details': 'Major page faults exceeded {threshold}/s for {samples} samples (avg: {mean:.2f}/s)',
+    },
+    {
+        'family': 'memory', 'metrics': ['mem_percent'], 'transform': 'raw', 'op': '>', 'threshold': 80,
+        'category': 'Memory', 'severity': 'MEDIUM', 'issue': 'High Memory Usage',
+        'suggestion': 'Monitor for OOM conditions. Consider increasing memory limits',
+        'details': 'Memory usage exceeded {threshold}% for {samples} samples (avg: {mean:.2f}%)',
+    },
+    {
+        'family': 'disk', 'metrics': ['proc_write_bytes'], 'transform': 'rate', 'op': '>', 'threshold': 10000,
+        'category': 'Disk', 'severity': 'MEDIUM', 'issue': 'High Write Rate',
+        'suggestion': 'Check if writes are buffered or if there are many small sync operations',
+        'details': 'Write rate exceeded 10MB/s for {samples} samples (avg: {mean:.2f}MB/s)',
+        'scale': 1 / 1024,
+    },
+    {
+        'family': 'disk', 'metrics': ['io_wait_time'], 'transform': 'raw', 'op': '>', 'threshold': 10,
+        'category': 'Disk', 'severity': 'HIGH', 'issue': 'High I/O Wait Time',
+        'suggestion': 'Disk latency issue. Check disk health and consider faster storage',
+        'details': 'I/O wait time exceeded {threshold}ms for {samples} samples (avg: {mean:.2f}ms)',
+    },
+    {
+        'family': 'network', 'metrics': ['rx_errors', 'tx_errors'], 'transform': 'diff', 'op': '>', 'threshold': 0,
+        'category': 'Network', 'severity': 'HIGH', 'issue': 'Packet Errors',
+        'suggestion': 'Check network interface, cables, and NIC configuration',
+        'details': 'Detected {total:.0f} packet errors during monitoring',
+    },
+    {
+        'family': 'network', 'metrics': ['rx_dropped', 'tx_dropped'], 'transform': 'diff', 'op': '>', 'threshold': 0,
+        'category': 'Network', 'severity': 'MEDIUM', 'issue': 'Dropped Packets',
+        'suggestion': 'Check for buffer overflows, increase ring buffer size, or reduce load',
+        'details': 'Detected {total:.0f} dropped packets during monitoring',
+    },
+    {
+        'family': 'threads', 'metrics': ['num_threads'], 'transform': 'ratio', 'window': TREND_WINDOW,
+        'op': '>', 'threshold': 1.5,
+        'category': 'Threads', 'severity': 'MEDIUM', 'issue': 'Thread Count Growth',
+        'suggestion': 'Check for thread leaks or unbounded thread pool growth',
+        'details': 'Thread count grew from {start:.0f} to {end:.0f}',
+    },
+    {
+        'family': 'threads', 'metrics': ['involuntary_switches'], 'transform': 'rate', 'op': '>', 'threshold': 1000,
+        'category': 'Threads', 'severity': 'MEDIUM', 'issue': 'High Involuntary Context Switches',
+        'suggestion': 'CPU contention or too many runnable threads. Consider thread affinity',
+        'details': 'Involuntary switches exceeded {threshold}/s for {samples} samples (avg: {mean:.0f}/s)',
+    },
+    {
+        'family': 'threads', 'metrics': ['disk_sleep'], 'transform': 'raw', 'op': '>', 'threshold': 0,
+        'category': 'Threads', 'severity': 'MEDIUM', 'issue': 'Threads in Uninterruptible Sleep',
+        'suggestion': 'Threads blocked on I/O operations. Check disk performance',
+        'details': 'Threads in disk sleep state for {samples} samples (avg: {mean:.2f})',
+    },
+    {
+        'family': 'tcp', 'metrics': ['time_wait'], 'transform': 'raw', 'op': '>', 'threshold': 1000,
+        'category': 'TCP', 'severity': 'MEDIUM', 'issue': 'High TIME-WAIT Connections',
+        'suggestion': 'Many short-lived connections. Consider connection pooling or SO_REUSEADDR',
+        'details': 'TIME-WAIT connections exceeded {threshold} for {samples} samples (avg: {mean:.0f})',
+    },
+    {
+        'family': 'tcp', 'metrics': ['recv_q_total'], 'transform': 'raw', 'op': '>', 'threshold': 1000,
+        'category': 'TCP', 'severity': 'HIGH', 'issue': 'High Recv-Q Size',
+        'suggestion': 'Application not reading from sockets fast enough. Check for blocking operations',
+        'details': 'Recv-Q exceeded {threshold} bytes for {samples} samples (avg: {mean:.0f})',
+    },
+    {
+        'family': 'tcp', 'metrics': ['send_q_total'], 'transform': 'raw', 'op': '>', 'threshold': 1000,
+        'category': 'TCP', 'severity': 'HIGH', 'issue': 'High Send-Q Size',
+        'suggestion': 'Network congestion or slow receiver. Check network bandwidth and RTT',
+        'details': 'Send-Q exceeded {threshold} bytes for {samples} samples (avg: {mean:.0f})',
+    },
+    {
+        'family': 'interrupts', 'metrics': ['net_rx_softirq'], 'transform': 'rate', 'op': '>', 'threshold': 100000,
+        'category': 'Interrupts', 'severity': 'MEDIUM', 'issue': 'High NET_RX SoftIRQ Rate',
+        'suggestion': 'High network receive load. Consider interrupt coalescing or RSS tuning',
+        'details': 'NET_RX softirq rate exceeded 100k/s for {samples} samples (avg: {mean:.0f}/s)',
+    },
+]
+
+# Преобразования, которые сравнивают начало и конец записи
+TREND_TRANSFORMS = {'growth', 'ratio'}
+
+# Все преобразования; правилам тренда и rolling нужен window
+TRANSFORMS = {'raw', 'diff', 'rate', 'rolling', *TREND_TRANSFORMS}
+WINDOW_TRANSFORMS = {'rolling', *TREND_TRANSFORMS}
+
+# Обязательные поля правила
+RULE_FIELDS = ('family', 'metrics', 'transform', 'op', 'threshold', 'category', 'severity', 'issue')
+
+SEVERITIES = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+
+
+def check_rule(rule):
+    """Проверить описание правила; ошибка -- ValueError с понятным текстом"""
+    missing = [field for field in RULE_FIELDS if field not in rule]
+    if missing:
+        raise ValueError(f"rule {rule.get('issue', rule)!r}: missing {', '.join(missing)}")
+    if rule['transform'] not in TRANSFORMS:
+        raise ValueError(f"rule {rule['issue']!r}: unknown transform {rule['transform']!r}")
+    if rule['op'] not in COMPARATORS:
+        raise ValueError(f"rule {rule['issue']!r}: unknown comparator {rule['op']!r}")
+    if rule['severity'] not in SEVERITIES:
+        raise ValueError(f"rule {rule['issue']!r}: unknown severity {rule['severity']!r}")
+    if rule['transform'] in WINDOW_TRANSFORMS and not rule.get('window', 0) > 0:
+        raise ValueError(f"rule {rule['issue']!r}: transform {rule['transform']!r} needs a window")
+    if isinstance(rule['metrics'], str):
+        rule['metrics'] = [rule['metrics']]
+    return rule
+
+
+def load_rules(path):
+    """Правила из JSON файла: список правил в формате RULES"""
+    with open(path) as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError(f"{path}: expected a list of rules")
+    return [check_rule(rule) for rule in rules]
+
+
+def format_details(rule, **stats):
+    """Описание находки по шаблону details правила"""
+    scale = rule.get('scale', 1)
+    for name in ('mean', 'total'):
+        if name in stats:
+            stats[name] *= scale
+    template = rule.get('details')
+    if template is not None:
+        return template.format(threshold=rule['threshold'], **stats)
+    condition = f"{'+'.join(rule['metrics'])} {rule['transform']} {rule['op']} {rule['threshold']}"
+    return condition + ': ' + ', '.join(f"{name} {value:.4g}" for name, value in stats.items())
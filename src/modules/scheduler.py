@@ -0,0 +1,52 @@
+import time
+
+# Дедлайны ближе этого допуска считаются одновременными и обслуживаются за одно пробуждение
+COALESCE_WINDOW = 0.001
+
+
+class Scheduler:
+    """Планировщик сборщиков на монотонных часах с абсолютными дедлайнами
+
+    Момент k-го запуска сборщика с интервалом T всегда равен start + k*T,
+    поэтому время сбора и неточность sleep не накапливаются в дрейф.
+    Если сборщик опоздал больше чем на интервал, пропущенные слоты не
+    догоняются пачкой, а считаются в skipped.
+    """
+
+    def __init__(self, intervals, start=None, clock=time.monotonic):
+        self.intervals = dict(intervals)
+        self.clock = clock
+        self.start = clock() if start is None else start
+        self.slots = dict.fromkeys(self.intervals, 0)
+        self.skipped = dict.fromkeys(self.intervals, 0)
+
+    def due_at(self, name):
+        """Запланированное время следующего запуска сборщика"""
+        return self.start + self.slots[name] * self.intervals[name]
+
+    def next_deadline(self):
+        """Ближайший дедлайн среди всех сборщиков"""
+        return min(self.due_at(name) for name in self.slots)
+
+    def wait(self):
+        """Дождаться ближайшего дедлайна и вернуть {имя: запланированное время}"""
+        delay = self.next_deadline() - self.clock()
+        if delay > 0:
+            time.sleep(delay)
+
+        now = self.clock()
+        due = {}
+        for name, interval in self.intervals.items():
+            scheduled = self.due_at(name)
+            if scheduled > now + COALESCE_WINDOW:
+                continue
+            due[name] = scheduled
+
+            # Следующий слот строго после текущего момента
+            slot = self.slots[name] + 1
+            first_future = int((now - self.start) / interval) + 1
+            if first_future > slot:
+                self.skipped[name] += first_future - slot
+                slot = first_future
+            self.slots[name] = slot
+        return due
@@ -0,0 +1,197 @@
+import struct
+
+# Запланированное время сбора и отклонение от него, их добавляет планировщик
+SCHEDULE_COLUMNS = ['scheduled', 'jitter_ms']
+
+# Колонки по семействам метрик (одинаковые в CSV и двоичном формате)
+COLUMNS = {
+    'cpu': ['timestamp', 'user', 'system', 'iowait', 'idle',
+            'proc_user', 'proc_system', 'proc_total',
+            'load_1m', 'load_5m', 'load_15m', 'runqueue'] + SCHEDULE_COLUMNS,
+    'memory': ['timestamp', 'rss_mb', 'vsz_mb', 'mem_percent',
+               'total_mem_mb', 'used_mem_mb', 'free_mem_mb',
+               'cached_mb', 'page_faults_minor', 'page_faults_major'] + SCHEDULE_COLUMNS,
+    'disk': ['timestamp', 'reads', 'writes', 'read_kb', 'write_kb',
+             'io_wait_time', 'proc_read_bytes', 'proc_write_bytes'] + SCHEDULE_COLUMNS,
+    'network': ['timestamp', 'rx_packets', 'tx_packets', 'rx_bytes',
+                'tx_bytes', 'rx_errors', 'tx_errors', 'rx_dropped', 'tx_dropped'] + SCHEDULE_COLUMNS,
+    'threads': ['timestamp', 'num_threads', 'voluntary_switches',
+                'involuntary_switches', 'running', 'sleeping', 'disk_sleep'] + SCHEDULE_COLUMNS,
+    'tcp': ['timestamp', 'established', 'syn_sent', 'syn_recv',
+            'time_wait', 'close_wait', 'recv_q_total', 'send_q_total'] + SCHEDULE_COLUMNS,
+    'interrupts': ['timestamp', 'total_irqs', 'net_rx_softirq',
+                   'net_tx_softirq', 'timer_softirq'] + SCHEDULE_COLUMNS,
+    # Агрегаты tcp_info по сокетам процесса (только при сборе через netlink)
+    'tcp_info': ['timestamp', 'sockets', 'rtt_avg_ms', 'rtt_max_ms', 'cwnd_avg',
+                 'retrans_total', 'retransmitting'] + SCHEDULE_COLUMNS,
+    # Метрики каждого потока процесса: прирост CPU времени с прошлого сэмпла
+    'thread_detail': ['timestamp', 'tid', 'name', 'state', 'last_cpu', 'cpu_percent',
+                      'user_ms', 'system_ms', 'voluntary_switches', 'involuntary_switches']
+                     + SCHEDULE_COLUMNS,
+    # Метрики каждого отслеживаемого процесса в режиме нескольких целей
+    'processes': ['timestamp', 'pid', 'comm', 'cpu_percent', 'proc_user', 'proc_system',
+                  'rss_mb', 'vsz_mb', 'mem_percent', 'page_faults_minor', 'page_faults_major',
+                  'num_threads', 'voluntary_switches', 'involuntary_switches',
+                  'proc_read_bytes', 'proc_write_bytes'] + SCHEDULE_COLUMNS,
+    # Время работы каждого сборщика: ok, timeout, busy, error или late
+    'timing': ['timestamp', 'collector', 'duration_ms', 'status'],
+}
+
+# Имена CSV файлов по семействам метрик
+FILENAMES = {
+    'cpu': 'cpu_metrics.csv',
+    'memory': 'memory_metrics.csv',
+    'disk': 'disk_metrics.csv',
+    'network': 'network_metrics.csv',
+    'threads': 'thread_metrics.csv',
+    'tcp': 'tcp_metrics.csv',
+    'interrupts': 'interrupt_metrics.csv',
+    'tcp_info': 'tcp_info_metrics.csv',
+    'thread_detail': 'thread_detail_metrics.csv',
+    'processes': 'process_metrics.csv',
+    'timing': 'collector_timing.csv',
+}
+
+# Уровни свёртки: суффикс семейства и длина корзины в секундах, от мелкого к грубому
+ROLLUP_TIERS = {'10s': 10, '1m': 60}
+
+# Семейства, для которых во время сбора строятся свёртки (по одной строке на тик)
+ROLLUP_FAMILIES = ['cpu', 'memory', 'disk', 'network', 'threads', 'tcp', 'interrupts', 'tcp_info']
+
+# Накопительные счётчики: в свёртке хранится последнее значение и максимальная скорость,
+# min/max/mean самого счётчика смысла не имеют
+COUNTER_COLUMNS = {
+    'cpu': ['proc_user', 'proc_system'],
+    'memory': ['page_faults_minor', 'page_faults_major'],
+    'disk': ['proc_read_bytes', 'proc_write_bytes'],
+    'network': ['rx_packets', 'tx_packets', 'rx_bytes', 'tx_bytes',
+                'rx_errors', 'tx_errors', 'rx_dropped', 'tx_dropped'],
+    'threads': ['voluntary_switches', 'involuntary_switches'],
+    'interrupts': ['total_irqs', 'net_rx_softirq', 'net_tx_softirq', 'timer_softirq'],
+}
+
+# Колонки сырых данных, которые в свёртку не попадают
+ROLLUP_SKIP = {'timestamp', 'scheduled'}
+
+
+def rollup_family(family, tier):
+    """Имя семейства свёртки, например cpu@10s"""
+    return f"{family}@{tier}"
+
+
+def rollup_columns(family):
+    """Колонки свёртки семейства
+
+    timestamp -- время последнего сэмпла корзины, bucket -- её начало. Для
+    обычной колонки под её именем лежит среднее (так графики и детектор
+    читают свёртку как сырые данные), рядом min, max и последнее значение.
+    Для счётчика под его именем лежит последнее значение, поэтому скорость
+    по соседним строкам считается как обычно, рядом -- максимальная скорость
+    внутри корзины.
+    """
+    counters = COUNTER_COLUMNS.get(family, ())
+    columns = ['timestamp', 'bucket', 'samples']
+    for column in COLUMNS[family]:
+        if column in ROLLUP_SKIP:
+            continue
+        if column in counters:
+            columns += [column, f"{column}_rate_max"]
+        else:
+            columns += [column, f"{column}_min", f"{column}_max", f"{column}_last"]
+    return columns
+
+
+for _family in ROLLUP_FAMILIES:
+    for _tier in ROLLUP_TIERS:
+        COLUMNS[rollup_family(_family, _tier)] = rollup_columns(_family)
+        FILENAMES[rollup_family(_family, _tier)] = FILENAMES[_family].replace('.csv', f"_{_tier}.csv")
+
+# Двоичный формат: файл записей фиксированного размера на семейство и их описание
+BINARY_FILENAMES = {family: f"{family}.bin" for family in COLUMNS}
+SCHEMA_FILENAME = 'schema.json'
+
+# Список сегментов при записи сегментами по времени
+MANIFEST_FILENAME = 'manifest.json'
+
+# Список колец в разделяемой памяти работающего монитора
+RING_FILENAME = 'ring.json'
+
+# Поток аномалий, найденных во время сбора
+ANOMALIES_FILENAME = 'anomalies.jsonl'
+
+# Номер тика общий для всех семейств; время каждого тика пишется в ticks.bin
+TICKS = 'ticks'
+TICK_TYPE = '<u4'
+TICK_LAYOUT = [('tick', TICK_TYPE), ('timestamp', '<f8'), ('wall_time', '<f8')]
+BINARY_FILENAMES[TICKS] = 'ticks.bin'
+
+# Типы колонок в формате numpy; колонки, которых здесь нет, хранятся как float64
+DEFAULT_TYPE = '<f8'
+COLUMN_TYPES = {
+    'tid': '<i4',
+    'pid': '<i4',
+    'last_cpu': '<i4',
+    'name': 'S16',
+    'comm': 'S16',
+    'state': 'S1',
+    'collector': 'S16',
+    'status': 'S8',
+}
+
+# Единицы колонок; у колонок, которых здесь нет, единица -- штуки (count)
+DEFAULT_UNIT = 'count'
+COLUMN_UNITS = {
+    'tick': 'id', 'timestamp': 's', 'wall_time': 's', 'scheduled': 's', 'jitter_ms': 'ms', 'bucket': 's',
+    'user': '%', 'system': '%', 'iowait': '%', 'idle': '%', 'cpu_percent': '%', 'mem_percent': '%',
+    'proc_user': 's', 'proc_system': 's', 'proc_total': '%',
+    'load_1m': 'load', 'load_5m': 'load', 'load_15m': 'load',
+    'rss_mb': 'MB', 'vsz_mb': 'MB', 'total_mem_mb': 'MB', 'used_mem_mb': 'MB',
+    'free_mem_mb': 'MB', 'cached_mb': 'MB',
+    'read_kb': 'KB', 'write_kb': 'KB', 'proc_read_bytes': 'KB', 'proc_write_bytes': 'KB',
+    'io_wait_time': 'ms', 'duration_ms': 'ms', 'user_ms': 'ms', 'system_ms': 'ms',
+    'rx_bytes': 'bytes', 'tx_bytes': 'bytes', 'recv_q_total': 'bytes', 'send_q_total': 'bytes',
+    'rtt_avg_ms': 'ms', 'rtt_max_ms': 'ms', 'cwnd_avg': 'segments',
+    'tid': 'id', 'pid': 'id', 'last_cpu': 'id', 'name': 'text', 'comm': 'text', 'state': 'text',
+    'collector': 'text', 'status': 'text',
+}
+
+# Значения пропуска: NaN для float, -1 для целых, пустая строка для текста
+MISSING_INT = -1
+
+# Коды struct для числовых типов
+STRUCT_CODES = {'<f8': 'd', '<i4': 'i', '<u4': 'I'}
+
+
+def column_type(column):
+    """Тип колонки в формате numpy"""
+    return COLUMN_TYPES.get(column, DEFAULT_TYPE)
+
+
+def column_unit(column):
+    """Единица колонки, для производных колонок свёртки и скоростей -- единица исходной"""
+    if column in COLUMN_UNITS:
+        return COLUMN_UNITS[column]
+    for suffix in ('_rate_max', '_rate'):
+        if column.endswith(suffix):
+            return f"{column_unit(column[:-len(suffix)])}/s"
+    for suffix in ('_min', '_max', '_last'):
+        if column.endswith(suffix):
+            return column_unit(column[:-len(suffix)])
+    return DEFAULT_UNIT
+
+
+def rate_column(column):
+    """Имя производной колонки со скоростью счётчика"""
+    return f"{column}_rate"
+
+
+def record_layout(family):
+    """Поля записи семейства: номер тика и колонки с их типами"""
+    if family == TICKS:
+        return list(TICK_LAYOUT)
+    return [('tick', TICK_TYPE)] + [(column, column_type(column)) for column in COLUMNS[family]]
+
+
+def record_struct(layout):
+    """struct.Struct записи без выравнивания, совпадающий с numpy dtype тех же полей"""
+    return struct.Struct('<' + ''.join(STRUCT_CODES.get(kind) or f"{kind[1:]}s" for _, kind in layout))
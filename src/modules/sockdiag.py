@@ -0,0 +1,180 @@
+import errno
+import os
+import socket
+import struct
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_INFO = 2
+INET_DIAG_REQ_BYTECODE = 1
+
+# Операции фильтра inet_diag (include/uapi/linux/inet_diag.h): сравнения порта
+# берут номер порта из поля no следующей за ними операции
+INET_DIAG_BC_JMP = 1
+INET_DIAG_BC_S_GE = 2
+INET_DIAG_BC_S_LE = 3
+INET_DIAG_BC_D_GE = 4
+INET_DIAG_BC_D_LE = 5
+BC_OP = struct.Struct('=BBH')
+
+# Все состояния TCP, включая LISTEN (нужен для портов процесса)
+ALL_STATES = 0xffffffff
+
+# nlmsghdr и inet_diag_req_v2 (sockid нулевой -- дамп всех сокетов)
+NLMSGHDR = struct.Struct('=IHHII')
+INET_DIAG_REQ_V2 = struct.Struct('=BBBxI48x')
+
+# inet_diag_msg: family, state, timer, retrans; порты в сетевом порядке байт;
+# после sockid и expires -- rqueue, wqueue, uid, inode
+DIAG_HEAD = struct.Struct('=BBBB')
+DIAG_PORTS = struct.Struct('>HH')
+DIAG_TAIL = struct.Struct('=IIII')
+DIAG_PORTS_OFFSET = 4
+DIAG_TAIL_OFFSET = 56
+DIAG_MSG_SIZE = 72
+
+RTATTR = struct.Struct('=HH')
+
+# Поля struct tcp_info (include/uapi/linux/tcp.h): rtt и snd_cwnd, total_retrans
+TCP_INFO_RTT = struct.Struct('=I')
+TCP_INFO_RTT_OFFSET = 68
+TCP_INFO_CWND_OFFSET = 80
+TCP_INFO_TOTAL_RETRANS_OFFSET = 100
+TCP_INFO_MIN_SIZE = 104
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def states_mask(states):
+    """Маска idiag_states для номеров состояний TCP"""
+    mask = 0
+    for state in states:
+        mask |= 1 << state
+    return mask
+
+
+def port_filter(port):
+    """Байт-код фильтра ядра: локальный или удалённый порт равен port
+
+    При выполнении условия операция переходит на yes байт вперёд, иначе на
+    no; переход ровно на конец программы принимает сокет, за конец --
+    отбрасывает. Ядро проверяет, что цепочка переходов yes проходит через
+    каждую операцию, поэтому ИЛИ записано переходом JMP. Равенство --
+    парами GE/LE, как у ss: они есть во всех ядрах с sock_diag.
+    """
+    def compare(code, yes, no):
+        return BC_OP.pack(code, yes, no) + BC_OP.pack(0, 0, port)
+
+    return b''.join((
+        compare(INET_DIAG_BC_S_GE, 8, 20),   # sport >= port, иначе к проверке dport
+        compare(INET_DIAG_BC_S_LE, 8, 12),   # sport <= port, иначе к проверке dport
+        BC_OP.pack(INET_DIAG_BC_JMP, 4, 20), # sport == port -- принять
+        compare(INET_DIAG_BC_D_GE, 8, 20),   # dport >= port, иначе отбросить
+        compare(INET_DIAG_BC_D_LE, 8, 12),   # dport <= port -- принять, иначе отбросить
+    ))
+
+
+class SockDiag:
+    """Дамп TCP сокетов через NETLINK_SOCK_DIAG без запуска ss
+
+    Ответы ядра читаются через recv_into в один переиспользуемый буфер,
+    из каждого сообщения через struct.unpack_from берутся только нужные поля.
+    """
+
+    def __init__(self, bufsize=1 << 16):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG)
+        self.buf = bytearray(bufsize)
+        self.seq = 0
+
+    def dump(self, family, states=ALL_STATES, with_info=True, port=None):
+        """Сокеты TCP семейства family в состояниях из маски states
+
+        С port ядро само отбирает сокеты с таким локальным или удалённым
+        портом (port_filter), и остальные сокеты хоста в пространство
+        пользователя не копируются. Выдаёт кортежи (state, retransmitting,
+        sport, dport, rqueue, wqueue, inode, rtt_us, cwnd, total_retrans);
+        поля tcp_info равны None, если ядро их не вернуло (например, для
+        TIME-WAIT).
+        """
+        self.seq += 1
+        ext = 1 << (INET_DIAG_INFO - 1) if with_info else 0
+        request = INET_DIAG_REQ_V2.pack(family, socket.IPPROTO_TCP, ext, states)
+        if port is not None:
+            bytecode = port_filter(port)
+            request += RTATTR.pack(RTATTR.size + len(bytecode), INET_DIAG_REQ_BYTECODE) + bytecode
+        header = NLMSGHDR.pack(NLMSGHDR.size + len(request), SOCK_DIAG_BY_FAMILY,
+                               NLM_F_REQUEST | NLM_F_DUMP, self.seq, 0)
+        self.sock.send(header + request)
+
+        buf = self.buf
+        while True:
+            n = self.sock.recv_into(buf)
+            off = 0
+            while off + NLMSGHDR.size <= n:
+                length, msg_type, _, seq, _ = NLMSGHDR.unpack_from(buf, off)
+                if length < NLMSGHDR.size:
+                    return
+                if seq != self.seq:
+                    off += _align(length)
+                    continue
+                if msg_type == NLMSG_DONE:
+                    return
+                if msg_type == NLMSG_ERROR:
+                    code = -struct.unpack_from('=i', buf, off + NLMSGHDR.size)[0]
+                    if code:
+                        raise OSError(code, os.strerror(code))
+                    return
+
+                msg = off + NLMSGHDR.size
+                _, state, _, retransmitting = DIAG_HEAD.unpack_from(buf, msg)
+                sport, dport = DIAG_PORTS.unpack_from(buf, msg + DIAG_PORTS_OFFSET)
+                rqueue, wqueue, _, inode = DIAG_TAIL.unpack_from(buf, msg + DIAG_TAIL_OFFSET)
+
+                rtt = cwnd = total_retrans = None
+                attr = msg + DIAG_MSG_SIZE
+                end = off + length
+                while attr + RTATTR.size <= end:
+                    attr_len, attr_type = RTATTR.unpack_from(buf, attr)
+                    if attr_len < RTATTR.size:
+                        break
+                    if attr_type == INET_DIAG_INFO and attr_len - RTATTR.size >= TCP_INFO_MIN_SIZE:
+                        info = attr + RTATTR.size
+                        rtt, = TCP_INFO_RTT.unpack_from(buf, info + TCP_INFO_RTT_OFFSET)
+                        cwnd, = TCP_INFO_RTT.unpack_from(buf, info + TCP_INFO_CWND_OFFSET)
+                        total_retrans, = TCP_INFO_RTT.unpack_from(buf, info + TCP_INFO_TOTAL_RETRANS_OFFSET)
+                    attr += _align(attr_len)
+
+                yield (state, retransmitting, sport, dport, rqueue, wqueue,
+                       inode, rtt, cwnd, total_retrans)
+                off += _align(length)
+
+    def close(self):
+        """Закрыть netlink сокет"""
+        self.sock.close()
+
+
+def socket_inodes(pid):
+    """Inode сокетов, открытых процессом (по ссылкам socket:[N] в /proc/[pid]/fd)"""
+    inodes = set()
+    fd_dir = f"/proc/{pid}/fd"
+    try:
+        entries = os.scandir(fd_dir)
+    except OSError:
+        return inodes
+    with entries:
+        for entry in entries:
+            try:
+                target = os.readlink(entry.path)
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.EACCES):
+                    continue
+                raise
+            if target.startswith('socket:['):
+                inodes.add(int(target[8:-1]))
+    return inodes
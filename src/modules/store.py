@@ -0,0 +1,307 @@
+import csv
+import json
+import os
+import shutil
+
+from .records import RecordPacker
+from .rules import RULES
+from .schema import (BINARY_FILENAMES, FILENAMES, MANIFEST_FILENAME, ROLLUP_FAMILIES, ROLLUP_TIERS,
+                     SCHEMA_FILENAME, TICKS, column_unit, rollup_family)
+
+# Буфер файла на семейство: между сбросами BatchWriter данные не уходят в ядро мелкими кусками
+WRITE_BUFFER = 1 << 18
+
+
+class StoreWrapper:
+    """Хранилище-обёртка в цепочке make_store (свёртки, кольца, онлайн-детектор)
+
+    Обёртка сама пишет только свои данные и передаёт строки дальше в store.
+    Атрибуты, которых у неё нет (resumed, start_time и last_tick
+    сегментированного хранилища), берутся у обёрнутого хранилища, так что
+    монитор работает с любой цепочкой одинаково.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getattr__(self, name):
+        if name == 'store':
+            # store ещё не задан (например, при копировании объекта): не уходить в рекурсию
+            raise AttributeError(name)
+        return getattr(self.store, name)
+
+
+class CsvStore:
+    """Запись семейств метрик в CSV файлы, по одному на семейство"""
+
+    filenames = FILENAMES
+
+    def __init__(self, output_dir, families, columns, start_time):
+        self.files = {
+            family: open(output_dir / FILENAMES[family], 'w', newline='', buffering=WRITE_BUFFER)
+            for family in families
+        }
+        self.writers = {family: csv.writer(f) for family, f in self.files.items()}
+        for family, writer in self.writers.items():
+            writer.writerow(columns[family])
+
+    def write(self, family, tick, row):
+        """Записать строку семейства"""
+        self.writers[family].writerow(row)
+
+    def write_tick(self, tick, timestamp, wall_time):
+        """В CSV номера тиков не хранятся"""
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class BinaryStore:
+    """Запись семейств метрик в двоичные файлы записей фиксированного размера
+
+    Запись -- номер тика и типизированные колонки семейства, упакованные
+    struct без выравнивания. Описание полей лежит в schema.json, поэтому
+    файл читается через numpy.memmap без разбора текста. Номер тика общий
+    для всех семейств, время каждого тика пишется в ticks.bin.
+    """
+
+    filenames = BINARY_FILENAMES
+
+    def __init__(self, output_dir, families, columns, start_time):
+        families = [*families, TICKS]
+        self.packer = RecordPacker(families)
+        self.files = {
+            family: open(output_dir / BINARY_FILENAMES[family], 'wb', buffering=WRITE_BUFFER)
+            for family in families
+        }
+
+        schema = {
+            'version': 1,
+            'start_time': start_time,
+            'families': {
+                family: {
+                    'file': BINARY_FILENAMES[family],
+                    'fields': self.packer.layouts[family],
+                    'units': {name: column_unit(name) for name, _ in self.packer.layouts[family]},
+                }
+                for family in families
+            },
+        }
+        with open(output_dir / SCHEMA_FILENAME, 'w') as f:
+            json.dump(schema, f, indent=2)
+
+    def write(self, family, tick, row):
+        """Записать строку семейства"""
+        self.files[family].write(self.packer.pack(family, tick, row))
+
+    def write_tick(self, tick, timestamp, wall_time):
+        """Записать время тика"""
+        self.files[TICKS].write(self.packer.structs[TICKS].pack(tick, timestamp, wall_time))
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+# Форматы хранения метрик по имени
+STORES = {
+    'binary': BinaryStore,
+    'csv': CsvStore,
+}
+
+
+def read_manifest(data_dir):
+    """Манифест сегментированного каталога или None"""
+    path = data_dir / MANIFEST_FILENAME
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def directory_size(path):
+    """Суммарный размер файлов каталога в байтах"""
+    with os.scandir(path) as entries:
+        return sum(entry.stat().st_size for entry in entries if entry.is_file())
+
+
+class SegmentedStore:
+    """Запись метрик сегментами по времени с манифестом и удалением старых сегментов
+
+    Каждый сегмент -- подкаталог с обычным хранилищем (двоичным или CSV),
+    границы сегментов кратны segment_seconds от начала записи. manifest.json
+    перечисляет сегменты с диапазонами времени и тиков и обновляется при
+    каждом сбросе. Закрытые сегменты удаляются, когда они старше max_age
+    секунд или когда все сегменты вместе больше max_bytes. У сегментов
+    старше raw_max_age удаляются только сырые данные, свёртки остаются.
+
+    Если в каталоге уже есть манифест, запись продолжается новыми
+    сегментами: время и номера тиков идут дальше от начала первого запуска,
+    старые данные не перезаписываются.
+    """
+
+    def __init__(self, output_dir, families, columns, start_time, store_class,
+                 segment_seconds=3600, max_bytes=None, max_age=None, raw_max_age=None):
+        self.output_dir = output_dir
+        self.families = families
+        self.columns = columns
+        self.store_class = store_class
+        self.segment_seconds = segment_seconds
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.raw_max_age = raw_max_age
+
+        self.manifest = read_manifest(output_dir)
+        self.resumed = self.manifest is not None and bool(self.manifest['segments'])
+        if self.manifest is None:
+            self.manifest = {
+                'version': 1,
+                'format': store_class.__name__,
+                'start_time': start_time,
+                'segment_seconds': segment_seconds,
+                'next_index': 0,
+                'segments': [],
+            }
+        self.start_time = self.manifest['start_time']
+        self.last_tick = self.manifest['segments'][-1]['last_tick'] if self.resumed else 0
+
+        self.current = None
+        self.entry = None
+        self.segment_end = None
+
+    def _rotate(self, tick, timestamp, wall_time):
+        """Закрыть текущий сегмент и начать новый с тика tick"""
+        if self.current is not None:
+            self.current.close()
+            self.entry['bytes'] = directory_size(self.output_dir / self.entry['name'])
+
+        # Каталоги, оставшиеся без манифеста, не перезаписываются
+        index = self.manifest['next_index']
+        while (self.output_dir / f"segment_{index:06d}").exists():
+            index += 1
+        self.manifest['next_index'] = index + 1
+        name = f"segment_{index:06d}"
+        path = self.output_dir / name
+        path.mkdir()
+
+        self.current = self.store_class(path, self.families, self.columns, self.start_time)
+        self.entry = {
+            'name': name,
+            'start': timestamp,
+            'end': timestamp,
+            'wall_start': wall_time,
+            'wall_end': wall_time,
+            'first_tick': tick,
+            'last_tick': tick,
+            'bytes': 0,
+            'raw': True,
+        }
+        self.manifest['segments'].append(self.entry)
+        self.segment_end = (timestamp // self.segment_seconds + 1) * self.segment_seconds
+
+        self._apply_retention(timestamp)
+        self._write_manifest()
+
+    def _prune_raw(self, segment):
+        """Удалить из закрытого сегмента сырые данные, оставив свёртки и тики"""
+        path = self.output_dir / segment['name']
+        for family in self.families:
+            if '@' not in family:
+                (path / self.store_class.filenames[family]).unlink(missing_ok=True)
+        segment['raw'] = False
+        segment['bytes'] = directory_size(path)
+
+    def _apply_retention(self, now):
+        """Удалить старые закрытые сегменты по возрасту и суммарному размеру"""
+        segments = self.manifest['segments']
+        if self.raw_max_age is not None:
+            for segment in segments[:-1]:
+                if segment.get('raw', True) and now - segment['end'] > self.raw_max_age:
+                    self._prune_raw(segment)
+
+        total = sum(segment['bytes'] for segment in segments)
+        while len(segments) > 1:
+            oldest = segments[0]
+            expired = self.max_age is not None and now - oldest['end'] > self.max_age
+            oversized = self.max_bytes is not None and total > self.max_bytes
+            if not (expired or oversized):
+                break
+            shutil.rmtree(self.output_dir / oldest['name'], ignore_errors=True)
+            total -= oldest['bytes']
+            segments.pop(0)
+            print(f"Retention: removed {oldest['name']} ({oldest['start']:.0f}-{oldest['end']:.0f}s)")
+
+    def _write_manifest(self):
+        """Записать манифест атомарно, чтобы читатели не видели его наполовину"""
+        path = self.output_dir / MANIFEST_FILENAME
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, path)
+
+    def write(self, family, tick, row):
+        """Записать строку семейства в текущий сегмент"""
+        self.current.write(family, tick, row)
+
+    def write_tick(self, tick, timestamp, wall_time):
+        """Записать время тика; тик за границей сегмента открывает новый сегмент"""
+        if self.current is None or timestamp >= self.segment_end:
+            self._rotate(tick, timestamp, wall_time)
+        self.entry['end'] = timestamp
+        self.entry['wall_end'] = wall_time
+        self.entry['last_tick'] = tick
+        self.current.write_tick(tick, timestamp, wall_time)
+
+    def flush(self):
+        if self.current is None:
+            return
+        self.current.flush()
+        self.entry['bytes'] = directory_size(self.output_dir / self.entry['name'])
+        self._write_manifest()
+
+    def close(self):
+        if self.current is None:
+            return
+        self.current.close()
+        self.entry['bytes'] = directory_size(self.output_dir / self.entry['name'])
+        self._write_manifest()
+
+
+def make_store(kind, output_dir, families, columns, start_time, segment_seconds=None,
+               max_bytes=None, max_age=None, raw_max_age=None, rollup=True, ring=0, detect=False):
+    """Хранилище формата kind: при заданном segment_seconds -- сегментированное,
+    при rollup -- со свёртками семейств по уровням ROLLUP_TIERS, при ring > 0 --
+    с публикацией последних ring строк каждого семейства в разделяемой памяти,
+    при detect -- с проверкой правил аномалий на каждой строке (detect -- True
+    для встроенных правил или список правил)"""
+    # Обёртки наследуют StoreWrapper из этого модуля, поэтому импортируются здесь
+    from .online_detector import OnlineDetector
+    from .ring import RingStore
+    from .rollup import RollupStore
+
+    stored = list(families)
+    if rollup:
+        stored += [rollup_family(family, tier) for family in families
+                   if family in ROLLUP_FAMILIES for tier in ROLLUP_TIERS]
+
+    if segment_seconds is None:
+        store = STORES[kind](output_dir, stored, columns, start_time)
+    else:
+        store = SegmentedStore(output_dir, stored, columns, start_time, STORES[kind],
+                               segment_seconds, max_bytes, max_age, raw_max_age)
+    if rollup:
+        store = RollupStore(store, families, columns)
+    if ring:
+        store = RingStore(store, output_dir, families, ring)
+    if detect:
+        store = OnlineDetector(store, output_dir, families, columns, RULES if detect is True else detect)
+    return store
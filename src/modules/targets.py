@@ -0,0 +1,79 @@
+import os
+import re
+
+
+def read_comm_ppid(pid):
+    """comm и PPID процесса из /proc/[pid]/stat"""
+    with open(f"/proc/{pid}/stat", 'rb') as f:
+        data = f.read()
+    lparen = data.index(b'(')
+    rparen = data.rindex(b')')
+    comm = data[lparen + 1:rparen].decode(errors='replace')
+    ppid = int(data[rparen + 2:].split(None, 2)[1])
+    return comm, ppid
+
+
+def scan_processes():
+    """Все процессы системы: {pid: (comm, ppid)}"""
+    processes = {}
+    with os.scandir('/proc') as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                processes[int(entry.name)] = read_comm_ppid(entry.name)
+            except (OSError, ValueError, IndexError):
+                # Процесс завершился во время обхода
+                continue
+    return processes
+
+
+class TargetSet:
+    """Набор отслеживаемых процессов: явные PID, шаблон имени и/или дерево от корня
+
+    discover() пересобирает набор: завершившиеся процессы выпадают,
+    новые процессы с подходящим именем и новые потомки корня добавляются.
+    """
+
+    def __init__(self, pids=(), name=None, tree=None):
+        self.pids = list(pids)
+        self.name = re.compile(name) if name else None
+        self.tree = tree
+        self.current = {}
+
+    def discover(self):
+        """Обновить набор целей и вернуть {pid: comm}"""
+        processes = scan_processes()
+        found = {}
+
+        for pid in self.pids:
+            if pid in processes:
+                found[pid] = processes[pid][0]
+
+        if self.name is not None:
+            for pid, (comm, _) in processes.items():
+                if self.name.search(comm):
+                    found[pid] = comm
+
+        if self.tree is not None and self.tree in processes:
+            children = {}
+            for pid, (_, ppid) in processes.items():
+                children.setdefault(ppid, []).append(pid)
+            stack = [self.tree]
+            while stack:
+                pid = stack.pop()
+                found[pid] = processes[pid][0]
+                stack.extend(children.get(pid, ()))
+
+        # Сам монитор никогда не считается целью
+        found.pop(os.getpid(), None)
+        self.current = dict(sorted(found.items()))
+        return self.current
+
+    def primary(self):
+        """PID для общесистемных CSV: корень дерева, первый явный PID или первый найденный"""
+        if self.tree is not None:
+            return self.tree
+        if self.pids:
+            return self.pids[0]
+        return next(iter(self.current), None)
@@ -1,24 +1,101 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import matplotlib
 import pandas as pd
+
+# Графики только сохраняются в файлы: неинтерактивный бэкенд, в том числе в процессах пула
+matplotlib.use('Agg')
+
 import matplotlib.pyplot as plt
 import seaborn as sns
-from pathlib import Path
+
+from .batch_detector import run_data_dir
+from .dashboard import HOST, INTERVAL, PORT, serve
+from .downsample import band, downsample
+from .loader import FAMILIES, has_family, load_frame
+from .schema import rate_column
 
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (14, 8)
 
+# Графики полного набора в порядке построения: имя метода MetricsVisualizer
+PLOTS = [
+    'plot_cpu_metrics',
+    'plot_memory_metrics',
+    'plot_disk_metrics',
+    'plot_network_metrics',
+    'plot_thread_metrics',
+    'plot_thread_detail_metrics',
+    'plot_tcp_metrics',
+    'plot_interrupt_metrics',
+]
+
+# Форматы файлов графиков; dpi влияет только на растровый png
+FORMATS = ('png', 'svg', 'pdf')
+DPI = 150
+
+
 class MetricsVisualizer:
-    def __init__(self, data_dir="monitoring_data"):
+    def __init__(self, data_dir="monitoring_data", window=None, tier='auto', cache=False, format='png', dpi=DPI,
+                 full_resolution=False):
         self.data_dir = Path(data_dir)
+        # Окно анализа (start, end) в секундах timestamp; None -- все данные
+        self.window = window
+        # Уровень свёртки: 'auto' -- самый грубый, разрешающий окно; None -- сырые данные
+        self.tier = tier
+        # Кэшировать загруженные метрики на диске (<data_dir>/.cache)
+        self.cache = cache
+        # Формат файлов графиков (см. FORMATS) и разрешение растровых графиков
+        self.format = format
+        self.dpi = dpi
+        # Рисовать все сэмплы, без прореживания до ширины оси в пикселях
+        self.full_resolution = full_resolution
         self.output_dir = self.data_dir / "plots"
         self.output_dir.mkdir(exist_ok=True)
 
     def load_data(self, filename):
-        """Загрузить CSV файл"""
-        filepath = self.data_dir / filename
-        if not filepath.exists():
-            print(f"Warning: {filepath} not found")
-            return None
-        return pd.read_csv(filepath)
+        """Загрузить метрики семейства по имени его CSV файла (двоичный формат или CSV)"""
+        df = load_frame(self.data_dir, FAMILIES[filename], self.window, self.tier, rates=True, cache=self.cache)
+        if df is None:
+            print(f"Warning: {self.data_dir / filename} not found")
+        elif df.attrs['tier'] != 'raw':
+            print(f"Using {df.attrs['tier']} rollup for {filename}")
+        return df
+
+    def save(self, fig, name):
+        """Сохранить фигуру в <output_dir>/<name>.<format> и закрыть её"""
+        path = self.output_dir / f"{name}.{self.format}"
+        fig.tight_layout()
+        fig.savefig(path, dpi=self.dpi, bbox_inches='tight')
+        print(f"Saved: {path}")
+        plt.close(fig)
+
+    def buckets(self, ax):
+        """Число столбцов пикселей оси в сохраняемом файле; 0 -- не прореживать"""
+        if self.full_resolution:
+            return 0
+        return int(ax.bbox.width * self.dpi / ax.figure.dpi)
+
+    def plot(self, ax, x, y, **kwargs):
+        """Линия ряда, прореженная до огибающей min/max по столбцам пикселей оси"""
+        return ax.plot(*downsample(x, y, self.buckets(ax)), **kwargs)
+
+    def fill(self, ax, x, y, **kwargs):
+        """Заливка от нуля до ряда, прореженная до полосы min/max по столбцам пикселей оси"""
+        return ax.fill_between(*band(x, y, self.buckets(ax)), **kwargs)
+
+    def rate(self, df, column):
+        """Скорость изменения колонки в секунду по реальному времени между сэмплами
+
+        Для счётчиков берётся скорость, посчитанная загрузчиком.
+        """
+        if rate_column(column) in df.columns:
+            return df[rate_column(column)]
+        return df[column].diff() / df['timestamp'].diff()
 
     def plot_cpu_metrics(self):
         """График CPU метрик"""
@@ -29,9 +106,9 @@ class MetricsVisualizer:
         fig, axes = plt.subplots(3, 2, figsize=(16, 12))
 
         # CPU usage breakdown
-        axes[0, 0].plot(df['timestamp'], df['user'], label='User', alpha=0.7)
-        axes[0, 0].plot(df['timestamp'], df['system'], label='System', alpha=0.7)
-        axes[0, 0].plot(df['timestamp'], df['iowait'], label='IOWait', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], df['user'], label='User', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], df['system'], label='System', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], df['iowait'], label='IOWait', alpha=0.7)
         axes[0, 0].set_title('System CPU Usage (%)')
         axes[0, 0].set_xlabel('Time (s)')
         axes[0, 0].set_ylabel('CPU %')
@@ -39,7 +116,7 @@ class MetricsVisualizer:
         axes[0, 0].grid(True, alpha=0.3)
 
         # Process CPU
-        axes[0, 1].plot(df['timestamp'], df['proc_total'], label='Total CPU', color='red', linewidth=2)
+        self.plot(axes[0, 1], df['timestamp'], df['proc_total'], label='Total CPU', color='red', linewidth=2)
         axes[0, 1].set_title('Process CPU Usage (%)')
         axes[0, 1].set_xlabel('Time (s)')
         axes[0, 1].set_ylabel('CPU %')
@@ -47,8 +124,8 @@ class MetricsVisualizer:
         axes[0, 1].grid(True, alpha=0.3)
 
         # Process User vs System time
-        axes[1, 0].plot(df['timestamp'], df['proc_user'], label='User Time', alpha=0.7)
-        axes[1, 0].plot(df['timestamp'], df['proc_system'], label='System Time', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], df['proc_user'], label='User Time', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], df['proc_system'], label='System Time', alpha=0.7)
         axes[1, 0].set_title('Process User vs System Time (cumulative)')
         axes[1, 0].set_xlabel('Time (s)')
         axes[1, 0].set_ylabel('Time (s)')
@@ -56,9 +133,9 @@ class MetricsVisualizer:
         axes[1, 0].grid(True, alpha=0.3)
 
         # Load average
-        axes[1, 1].plot(df['timestamp'], df['load_1m'], label='1 min', alpha=0.7)
-        axes[1, 1].plot(df['timestamp'], df['load_5m'], label='5 min', alpha=0.7)
-        axes[1, 1].plot(df['timestamp'], df['load_15m'], label='15 min', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], df['load_1m'], label='1 min', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], df['load_5m'], label='5 min', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], df['load_15m'], label='15 min', alpha=0.7)
         axes[1, 1].set_title('Load Average')
         axes[1, 1].set_xlabel('Time (s)')
         axes[1, 1].set_ylabel('Load')
@@ -66,23 +143,20 @@ class MetricsVisualizer:
         axes[1, 1].grid(True, alpha=0.3)
 
         # Runqueue length
-        axes[2, 0].plot(df['timestamp'], df['runqueue'], color='purple', linewidth=2)
+        self.plot(axes[2, 0], df['timestamp'], df['runqueue'], color='purple', linewidth=2)
         axes[2, 0].set_title('Runqueue Length')
         axes[2, 0].set_xlabel('Time (s)')
         axes[2, 0].set_ylabel('Processes')
         axes[2, 0].grid(True, alpha=0.3)
 
         # IOWait detail
-        axes[2, 1].fill_between(df['timestamp'], df['iowait'], alpha=0.5, color='orange')
+        self.fill(axes[2, 1], df['timestamp'], df['iowait'], alpha=0.5, color='orange')
         axes[2, 1].set_title('IOWait Detail')
         axes[2, 1].set_xlabel('Time (s)')
         axes[2, 1].set_ylabel('IOWait %')
         axes[2, 1].grid(True, alpha=0.3)
 
-        plt.tight_layout()
-        plt.savefig(self.output_dir / 'cpu_analysis.png', dpi=150, bbox_inches='tight')
-        print(f"Saved: {self.output_dir / 'cpu_analysis.png'}")
-        plt.close()
+        self.save(fig, 'cpu_analysis')
     
 
     def plot_memory_metrics(self):
@@ -94,8 +168,8 @@ class MetricsVisualizer:
         fig, axes = plt.subplots(3, 2, figsize=(16, 12))
 
         # Process memory (RSS and VSZ)
-        axes[0, 0].plot(df['timestamp'], df['rss_mb'], label='RSS', linewidth=2)
-        axes[0, 0].plot(df['timestamp'], df['vsz_mb'], label='VSZ', alpha=0.7, linestyle='--')
+        self.plot(axes[0, 0], df['timestamp'], df['rss_mb'], label='RSS', linewidth=2)
+        self.plot(axes[0, 0], df['timestamp'], df['vsz_mb'], label='VSZ', alpha=0.7, linestyle='--')
         axes[0, 0].set_title('Process Memory Usage')
         axes[0, 0].set_xlabel('Time (s)')
         axes[0, 0].set_ylabel('Memory (MB)')
@@ -103,9 +177,9 @@ class MetricsVisualizer:
         axes[0, 0].grid(True, alpha=0.3)
 
         # System memory
-        axes[0, 1].plot(df['timestamp'], df['used_mem_mb'], label='Used', alpha=0.7)
-        axes[0, 1].plot(df['timestamp'], df['free_mem_mb'], label='Free', alpha=0.7)
-        axes[0, 1].plot(df['timestamp'], df['cached_mb'], label='Cached', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], df['used_mem_mb'], label='Used', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], df['free_mem_mb'], label='Free', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], df['cached_mb'], label='Cached', alpha=0.7)
         axes[0, 1].set_title('System Memory')
         axes[0, 1].set_xlabel('Time (s)')
         axes[0, 1].set_ylabel('Memory (MB)')
@@ -113,17 +187,17 @@ class MetricsVisualizer:
         axes[0, 1].grid(True, alpha=0.3)
 
         # Process memory percent
-        axes[1, 0].fill_between(df['timestamp'], df['mem_percent'], alpha=0.5, color='green')
+        self.fill(axes[1, 0], df['timestamp'], df['mem_percent'], alpha=0.5, color='green')
         axes[1, 0].set_title('Process Memory Usage (%)')
         axes[1, 0].set_xlabel('Time (s)')
         axes[1, 0].set_ylabel('Memory %')
         axes[1, 0].grid(True, alpha=0.3)
 
         # Page faults
-        axes[1, 1].plot(df['timestamp'], df['page_faults_minor'].diff(), 
-                        label='Minor Faults/s', alpha=0.7)
-        axes[1, 1].plot(df['timestamp'], df['page_faults_major'].diff(), 
-                        label='Major Faults/s', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], self.rate(df, 'page_faults_minor'), 
+                  label='Minor Faults/s', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], self.rate(df, 'page_faults_major'), 
+                  label='Major Faults/s', alpha=0.7)
         axes[1, 1].set_title('Page Faults Rate')
         axes[1, 1].set_xlabel('Time (s)')
         axes[1, 1].set_ylabel('Faults/s')
@@ -132,7 +206,7 @@ class MetricsVisualizer:
     
 
         # Memory growth rate
-        axes[2, 0].plot(df['timestamp'], df['rss_mb'].diff(), color='red', alpha=0.7)
+        self.plot(axes[2, 0], df['timestamp'], self.rate(df, 'rss_mb'), color='red', alpha=0.7)
         axes[2, 0].axhline(y=0, color='black', linestyle='--', alpha=0.3)
         axes[2, 0].set_title('RSS Growth Rate')
         axes[2, 0].set_xlabel('Time (s)')
@@ -141,10 +215,10 @@ class MetricsVisualizer:
 
 
         # Cumulative page faults
-        axes[2, 1].plot(df['timestamp'], df['page_faults_minor'], 
-                        label='Minor (cumulative)', alpha=0.7)
-        axes[2, 1].plot(df['timestamp'], df['page_faults_major'], 
-                        label='Major (cumulative)', alpha=0.7)
+        self.plot(axes[2, 1], df['timestamp'], df['page_faults_minor'], 
+                  label='Minor (cumulative)', alpha=0.7)
+        self.plot(axes[2, 1], df['timestamp'], df['page_faults_major'], 
+                  label='Major (cumulative)', alpha=0.7)
         axes[2, 1].set_title('Cumulative Page Faults')
         axes[2, 1].set_xlabel('Time (s)')
         axes[2, 1].set_ylabel('Count')
@@ -152,10 +226,7 @@ class MetricsVisualizer:
         axes[2, 1].grid(True, alpha=0.3)
 
         
-        plt.tight_layout()
-        plt.savefig(self.output_dir / 'memory_analysis.png', dpi=150, bbox_inches='tight')
-        print(f"Saved: {self.output_dir / 'memory_analysis.png'}")
-        plt.close()
+        self.save(fig, 'memory_analysis')
 
     def plot_disk_metrics(self):
         """График дисковых метрик"""
@@ -167,10 +238,10 @@ class MetricsVisualizer:
         fig, axes = plt.subplots(2, 2, figsize=(16, 10))
 
         # Process I/O bytes
-        axes[0, 0].plot(df['timestamp'], df['proc_read_bytes'].diff(), 
-                        label='Read', alpha=0.7)
-        axes[0, 0].plot(df['timestamp'], df['proc_write_bytes'].diff(), 
-                        label='Write', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], self.rate(df, 'proc_read_bytes'), 
+                  label='Read', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], self.rate(df, 'proc_write_bytes'), 
+                  label='Write', alpha=0.7)
         axes[0, 0].set_title('Process I/O Rate (KB/s)')
         axes[0, 0].set_xlabel('Time (s)')
         axes[0, 0].set_ylabel('KB/s')
@@ -178,9 +249,8 @@ class MetricsVisualizer:
         axes[0, 0].grid(True, alpha=0.3)
 
         # System I/O operations
-        df_numeric = df.apply(pd.to_numeric, errors='coerce')
-        axes[0, 1].plot(df['timestamp'], df_numeric['reads'], label='Reads', alpha=0.7)
-        axes[0, 1].plot(df['timestamp'], df_numeric['writes'], label='Writes', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], df['reads'], label='Reads', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], df['writes'], label='Writes', alpha=0.7)
         axes[0, 1].set_title('System I/O Operations')
         axes[0, 1].set_xlabel('Time (s)')
         axes[0, 1].set_ylabel('Operations')
@@ -188,10 +258,10 @@ class MetricsVisualizer:
         axes[0, 1].grid(True, alpha=0.3)
 
         # Cumulative I/O
-        axes[1, 0].plot(df['timestamp'], df['proc_read_bytes'], 
-                        label='Read (cumulative)', alpha=0.7)
-        axes[1, 0].plot(df['timestamp'], df['proc_write_bytes'], 
-                        label='Write (cumulative)', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], df['proc_read_bytes'], 
+                  label='Read (cumulative)', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], df['proc_write_bytes'], 
+                  label='Write (cumulative)', alpha=0.7)
         axes[1, 0].set_title('Cumulative Process I/O')
         axes[1, 0].set_xlabel('Time (s)')
         axes[1, 0].set_ylabel('KB')
@@ -199,17 +269,14 @@ class MetricsVisualizer:
         axes[1, 0].grid(True, alpha=0.3)
 
         # I/O wait time
-        axes[1, 1].plot(df['timestamp'], df_numeric['io_wait_time'], 
-                        color='red', linewidth=2)
+        self.plot(axes[1, 1], df['timestamp'], df['io_wait_time'], 
+                  color='red', linewidth=2)
         axes[1, 1].set_title('I/O Wait Time')
         axes[1, 1].set_xlabel('Time (s)')
         axes[1, 1].set_ylabel('Time (ms)')
         axes[1, 1].grid(True, alpha=0.3)
 
-        plt.tight_layout()
-        plt.savefig(self.output_dir / 'disk_analysis.png', dpi=150, bbox_inches='tight')
-        print(f"Saved: {self.output_dir / 'disk_analysis.png'}")
-        plt.close()
+        self.save(fig, 'disk_analysis')
 
     def plot_network_metrics(self):
         """График сетевых метрик"""
@@ -220,10 +287,10 @@ class MetricsVisualizer:
         fig, axes = plt.subplots(2, 2, figsize=(16, 10))
 
         # Packet rate
-        axes[0, 0].plot(df['timestamp'], df['rx_packets'].diff(), 
-                        label='RX', alpha=0.7)
-        axes[0, 0].plot(df['timestamp'], df['tx_packets'].diff(), 
-                        label='TX', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], self.rate(df, 'rx_packets'), 
+                  label='RX', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], self.rate(df, 'tx_packets'), 
+                  label='TX', alpha=0.7)
         axes[0, 0].set_title('Network Packet Rate (packets/s)')
         axes[0, 0].set_xlabel('Time (s)')
         axes[0, 0].set_ylabel('Packets/s')
@@ -232,10 +299,10 @@ class MetricsVisualizer:
 
         
         # Bandwidth
-        axes[0, 1].plot(df['timestamp'], df['rx_bytes'].diff() / 1024, 
-                        label='RX', alpha=0.7)
-        axes[0, 1].plot(df['timestamp'], df['tx_bytes'].diff() / 1024, 
-                        label='TX', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], self.rate(df, 'rx_bytes') / 1024, 
+                  label='RX', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], self.rate(df, 'tx_bytes') / 1024, 
+                  label='TX', alpha=0.7)
         axes[0, 1].set_title('Network Bandwidth (KB/s)')
         axes[0, 1].set_xlabel('Time (s)')
         axes[0, 1].set_ylabel('KB/s')
@@ -243,10 +310,10 @@ class MetricsVisualizer:
         axes[0, 1].grid(True, alpha=0.3)
 
         # Errors
-        axes[1, 0].plot(df['timestamp'], df['rx_errors'].diff(), 
-                        label='RX Errors', alpha=0.7)
-        axes[1, 0].plot(df['timestamp'], df['tx_errors'].diff(), 
-                        label='TX Errors', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], self.rate(df, 'rx_errors'), 
+                  label='RX Errors', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], self.rate(df, 'tx_errors'), 
+                  label='TX Errors', alpha=0.7)
         axes[1, 0].set_title('Network Errors (errors/s)')
         axes[1, 0].set_xlabel('Time (s)')
         axes[1, 0].set_ylabel('Errors/s')
@@ -254,20 +321,17 @@ class MetricsVisualizer:
         axes[1, 0].grid(True, alpha=0.3)
 
         # Dropped packets
-        axes[1, 1].plot(df['timestamp'], df['rx_dropped'].diff(), 
-                        label='RX Dropped', alpha=0.7)
-        axes[1, 1].plot(df['timestamp'], df['tx_dropped'].diff(), 
-                        label='TX Dropped', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], self.rate(df, 'rx_dropped'), 
+                  label='RX Dropped', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], self.rate(df, 'tx_dropped'), 
+                  label='TX Dropped', alpha=0.7)
         axes[1, 1].set_title('Dropped Packets (packets/s)')
         axes[1, 1].set_xlabel('Time (s)')
         axes[1, 1].set_ylabel('Packets/s')
         axes[1, 1].legend()
         axes[1, 1].grid(True, alpha=0.3)
 
-        plt.tight_layout()
-        plt.savefig(self.output_dir / 'network_analysis.png', dpi=150, bbox_inches='tight')
-        print(f"Saved: {self.output_dir / 'network_analysis.png'}")
-        plt.close()
+        self.save(fig, 'network_analysis')
 
     def plot_thread_metrics(self):
         """График метрик потоков"""
@@ -279,18 +343,18 @@ class MetricsVisualizer:
         fig, axes = plt.subplots(2, 2, figsize=(16, 10))
 
         # Thread count
-        axes[0, 0].plot(df['timestamp'], df['num_threads'], 
-                        color='blue', linewidth=2)
+        self.plot(axes[0, 0], df['timestamp'], df['num_threads'], 
+                  color='blue', linewidth=2)
         axes[0, 0].set_title('Number of Threads')
         axes[0, 0].set_xlabel('Time (s)')
         axes[0, 0].set_ylabel('Threads')
         axes[0, 0].grid(True, alpha=0.3)
 
         # Context switches
-        axes[0, 1].plot(df['timestamp'], df['voluntary_switches'].diff(), 
-                        label='Voluntary', alpha=0.7)
-        axes[0, 1].plot(df['timestamp'], df['involuntary_switches'].diff(), 
-                        label='Involuntary', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], self.rate(df, 'voluntary_switches'), 
+                  label='Voluntary', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], self.rate(df, 'involuntary_switches'), 
+                  label='Involuntary', alpha=0.7)
         axes[0, 1].set_title('Context Switches Rate (switches/s)')
         axes[0, 1].set_xlabel('Time (s)')
         axes[0, 1].set_ylabel('Switches/s')
@@ -298,9 +362,9 @@ class MetricsVisualizer:
         axes[0, 1].grid(True, alpha=0.3)
 
         # Thread states
-        axes[1, 0].plot(df['timestamp'], df['running'], label='Running', alpha=0.7)
-        axes[1, 0].plot(df['timestamp'], df['sleeping'], label='Sleeping', alpha=0.7)
-        axes[1, 0].plot(df['timestamp'], df['disk_sleep'], label='Disk Sleep', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], df['running'], label='Running', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], df['sleeping'], label='Sleeping', alpha=0.7)
+        self.plot(axes[1, 0], df['timestamp'], df['disk_sleep'], label='Disk Sleep', alpha=0.7)
         axes[1, 0].set_title('Thread States')
         axes[1, 0].set_xlabel('Time (s)')
         axes[1, 0].set_ylabel('Count')
@@ -308,10 +372,10 @@ class MetricsVisualizer:
         axes[1, 0].grid(True, alpha=0.3)
 
         # Cumulative context switches
-        axes[1, 1].plot(df['timestamp'], df['voluntary_switches'], 
-                        label='Voluntary', alpha=0.7)
-        axes[1, 1].plot(df['timestamp'], df['involuntary_switches'], 
-                        label='Involuntary', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], df['voluntary_switches'], 
+                  label='Voluntary', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], df['involuntary_switches'], 
+                  label='Involuntary', alpha=0.7)
         axes[1, 1].set_title('Cumulative Context Switches')
         axes[1, 1].set_xlabel('Time (s)')
         axes[1, 1].set_ylabel('Count')
@@ -319,10 +383,61 @@ class MetricsVisualizer:
         axes[1, 1].grid(True, alpha=0.3)
 
         
-        plt.tight_layout()
-        plt.savefig(self.output_dir / 'thread_analysis.png', dpi=150, bbox_inches='tight')
-        print(f"Saved: {self.output_dir / 'thread_analysis.png'}")
-        plt.close()
+        self.save(fig, 'thread_analysis')
+
+    def plot_thread_detail_metrics(self, top=8):
+        """График метрик отдельных потоков (есть только при --thread-detail)"""
+        if not has_family(self.data_dir, 'thread_detail'):
+            return
+        df = self.load_data('thread_detail_metrics.csv')
+        if df is None or df.empty:
+            return
+
+        # Маркеры пропуска без данных потока
+        df = df.dropna(subset=['cpu_percent'])
+
+        # Потоки, сжёгшие больше всего CPU за время мониторинга
+        df['label'] = df['tid'].astype(int).astype(str) + ' ' + df['name'].astype(str)
+        cpu_ms = (df['user_ms'] + df['system_ms']).groupby(df['label']).sum()
+        busiest = cpu_ms.sort_values(ascending=False).index[:top]
+        df = df[df['label'].isin(busiest)]
+
+        fig, axes = plt.subplots(2, 2, figsize=(16, 10))
+
+        # CPU по потокам
+        for label, thread in df.groupby('label'):
+            self.plot(axes[0, 0], thread['timestamp'], thread['cpu_percent'], label=label, alpha=0.7)
+        axes[0, 0].set_title(f'Per-Thread CPU Usage (top {top})')
+        axes[0, 0].set_xlabel('Time (s)')
+        axes[0, 0].set_ylabel('CPU %')
+        axes[0, 0].legend(fontsize='small')
+        axes[0, 0].grid(True, alpha=0.3)
+
+        # Вынужденные переключения контекста по потокам
+        for label, thread in df.groupby('label'):
+            self.plot(axes[0, 1], thread['timestamp'], self.rate(thread, 'involuntary_switches'),
+                      label=label, alpha=0.7)
+        axes[0, 1].set_title('Per-Thread Involuntary Switches Rate')
+        axes[0, 1].set_xlabel('Time (s)')
+        axes[0, 1].set_ylabel('Switches/s')
+        axes[0, 1].legend(fontsize='small')
+        axes[0, 1].grid(True, alpha=0.3)
+
+        # Суммарное CPU время потоков: user и system
+        totals = df.groupby('label')[['user_ms', 'system_ms']].sum().loc[busiest] / 1000
+        totals.plot.barh(stacked=True, ax=axes[1, 0], alpha=0.7)
+        axes[1, 0].set_title('Total CPU Time per Thread')
+        axes[1, 0].set_xlabel('CPU time (s)')
+        axes[1, 0].grid(True, alpha=0.3)
+
+        # Доля сэмплов в каждом состоянии
+        states = pd.crosstab(df['label'], df['state'], normalize='index').loc[busiest] * 100
+        states.plot.barh(stacked=True, ax=axes[1, 1], alpha=0.7)
+        axes[1, 1].set_title('Thread State Distribution')
+        axes[1, 1].set_xlabel('% of samples')
+        axes[1, 1].grid(True, alpha=0.3)
+
+        self.save(fig, 'thread_detail_analysis')
 
     def plot_tcp_metrics(self):
         """График TCP метрик"""
@@ -333,9 +448,9 @@ class MetricsVisualizer:
         fig, axes = plt.subplots(2, 2, figsize=(16, 10))
 
         # Connection states
-        axes[0, 0].plot(df['timestamp'], df['established'], label='Established', alpha=0.7)
-        axes[0, 0].plot(df['timestamp'], df['time_wait'], label='Time-Wait', alpha=0.7)
-        axes[0, 0].plot(df['timestamp'], df['close_wait'], label='Close-Wait', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], df['established'], label='Established', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], df['time_wait'], label='Time-Wait', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], df['close_wait'], label='Close-Wait', alpha=0.7)
         axes[0, 0].set_title('TCP Connection States')
         axes[0, 0].set_xlabel('Time (s)')
         axes[0, 0].set_ylabel('Connections')
@@ -343,8 +458,8 @@ class MetricsVisualizer:
         axes[0, 0].grid(True, alpha=0.3)
 
         # SYN states
-        axes[0, 1].plot(df['timestamp'], df['syn_sent'], label='SYN-Sent', alpha=0.7)
-        axes[0, 1].plot(df['timestamp'], df['syn_recv'], label='SYN-Recv', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], df['syn_sent'], label='SYN-Sent', alpha=0.7)
+        self.plot(axes[0, 1], df['timestamp'], df['syn_recv'], label='SYN-Recv', alpha=0.7)
         axes[0, 1].set_title('TCP SYN States')
         axes[0, 1].set_xlabel('Time (s)')
         axes[0, 1].set_ylabel('Connections')
@@ -352,27 +467,24 @@ class MetricsVisualizer:
         axes[0, 1].grid(True, alpha=0.3)
 
         # Recv-Q
-        axes[1, 0].plot(df['timestamp'], df['recv_q_total'], 
+        self.plot(axes[1, 0], df['timestamp'], df['recv_q_total'], 
 
-                        color='blue', linewidth=2)
+                  color='blue', linewidth=2)
         axes[1, 0].set_title('Total Recv-Q Size')
         axes[1, 0].set_xlabel('Time (s)')
         axes[1, 0].set_ylabel('Bytes')
         axes[1, 0].grid(True, alpha=0.3)
 
         # Send-Q
-        axes[1, 1].plot(df['timestamp'], df['send_q_total'], 
+        self.plot(axes[1, 1], df['timestamp'], df['send_q_total'], 
 
-                        color='red', linewidth=2)
+                  color='red', linewidth=2)
         axes[1, 1].set_title('Total Send-Q Size')
         axes[1, 1].set_xlabel('Time (s)')
         axes[1, 1].set_ylabel('Bytes')
         axes[1, 1].grid(True, alpha=0.3)
 
-        plt.tight_layout()
-        plt.savefig(self.output_dir / 'tcp_analysis.png', dpi=150, bbox_inches='tight')
-        print(f"Saved: {self.output_dir / 'tcp_analysis.png'}")
-        plt.close()
+        self.save(fig, 'tcp_analysis')
 
 
     def plot_interrupt_metrics(self):
@@ -385,12 +497,12 @@ class MetricsVisualizer:
 
 
         # SoftIRQ rates
-        axes[0, 0].plot(df['timestamp'], df['net_rx_softirq'].diff(), 
+        self.plot(axes[0, 0], df['timestamp'], self.rate(df, 'net_rx_softirq'), 
 
-                        label='NET_RX', alpha=0.7)
-        axes[0, 0].plot(df['timestamp'], df['net_tx_softirq'].diff(), 
+                  label='NET_RX', alpha=0.7)
+        self.plot(axes[0, 0], df['timestamp'], self.rate(df, 'net_tx_softirq'), 
 
-                        label='NET_TX', alpha=0.7)
+                  label='NET_TX', alpha=0.7)
         axes[0, 0].set_title('Network SoftIRQ Rate')
         axes[0, 0].set_xlabel('Time (s)')
         axes[0, 0].set_ylabel('Interrupts/s')
@@ -399,9 +511,9 @@ class MetricsVisualizer:
         
 
         # Timer softirq
-        axes[0, 1].plot(df['timestamp'], df['timer_softirq'].diff(), 
+        self.plot(axes[0, 1], df['timestamp'], self.rate(df, 'timer_softirq'), 
 
-                        color='orange', linewidth=2)
+                  color='orange', linewidth=2)
         axes[0, 1].set_title('Timer SoftIRQ Rate')
         axes[0, 1].set_xlabel('Time (s)')
         axes[0, 1].set_ylabel('Interrupts/s')
@@ -409,9 +521,9 @@ class MetricsVisualizer:
         
 
         # Cumulative NET_RX
-        axes[1, 0].plot(df['timestamp'], df['net_rx_softirq'], 
+        self.plot(axes[1, 0], df['timestamp'], df['net_rx_softirq'], 
 
-                        color='blue', alpha=0.7)
+                  color='blue', alpha=0.7)
         axes[1, 0].set_title('Cumulative NET_RX SoftIRQ')
         axes[1, 0].set_xlabel('Time (s)')
         axes[1, 0].set_ylabel('Count')
@@ -419,28 +531,64 @@ class MetricsVisualizer:
 
 
         # Cumulative NET_TX
-        axes[1, 1].plot(df['timestamp'], df['net_tx_softirq'], 
-                        color='red', alpha=0.7)
+        self.plot(axes[1, 1], df['timestamp'], df['net_tx_softirq'], 
+                  color='red', alpha=0.7)
         axes[1, 1].set_title('Cumulative NET_TX SoftIRQ')
         axes[1, 1].set_xlabel('Time (s)')
         axes[1, 1].set_ylabel('Count')
         axes[1, 1].grid(True, alpha=0.3)
 
         
-        plt.tight_layout()
-        plt.savefig(self.output_dir / 'interrupt_analysis.png', dpi=150, bbox_inches='tight')
-        print(f"Saved: {self.output_dir / 'interrupt_analysis.png'}")
-        plt.close()
+        self.save(fig, 'interrupt_analysis')
+
 
+    def serve_live(self, host=HOST, port=PORT, interval=INTERVAL):
+        """Живая панель в браузере: история и новые записи колец работающего монитора (см. dashboard)"""
+        serve(self.data_dir, host, port, interval)
 
     def create_all_plots(self):
         """Создать все графики"""
         print("Creating visualization plots...")
-        self.plot_cpu_metrics()
-        self.plot_memory_metrics()
-        self.plot_disk_metrics()
-        self.plot_network_metrics()
-        self.plot_thread_metrics()
-        self.plot_tcp_metrics()
-        self.plot_interrupt_metrics()
-        print(f"\nAll plots saved to: {self.output_dir}")
\ No newline at end of file
+        for name in PLOTS:
+            getattr(self, name)()
+        print(f"\nAll plots saved to: {self.output_dir}")
+
+
+def _render_plot(task):
+    """Построить один график одного прогона; выполняется в процессе пула
+
+    Вывод (сообщения загрузчика и ошибки) собирается в строку и печатается
+    родителем, чтобы не перемешиваться.
+    """
+    data_dir, name, options = task
+    log = io.StringIO()
+    with redirect_stdout(log):
+        try:
+            getattr(MetricsVisualizer(data_dir, **options), name)()
+        except Exception as e:
+            print(f"Error plotting {name} for {data_dir}: {e}")
+    return log.getvalue()
+
+
+def render_plots(data_dirs, jobs=None, **options):
+    """Построить полные наборы графиков многих прогонов в пуле процессов
+
+    Задача -- один график одного прогона (прогон x график): графики
+    независимы, каждый читает своё семейство метрик один раз, так что набор
+    графиков даже одного прогона строится на всех ядрах. Вывод задач
+    печатается в порядке прогонов и графиков. options передаются
+    MetricsVisualizer (window, tier, cache, format, dpi, full_resolution).
+    """
+    data_dirs = [run_data_dir(data_dir) for data_dir in data_dirs]
+    tasks = [(data_dir, name, options) for data_dir in data_dirs for name in PLOTS]
+
+    jobs = jobs or os.cpu_count()
+    print(f"Creating plots for {len(data_dirs)} runs x {len(PLOTS)} figures with {jobs} processes...")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        logs = list(pool.map(_render_plot, tasks))
+
+    for n, data_dir in enumerate(data_dirs):
+        print(f"\n# {data_dir}")
+        for log in logs[n * len(PLOTS):(n + 1) * len(PLOTS)]:
+            print(log, end='')
+        print(f"All plots saved to: {data_dir / 'plots'}")
@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+
+# Политика сброса по умолчанию: каждые FLUSH_ROWS строк или FLUSH_INTERVAL секунд
+FLUSH_ROWS = 1000
+FLUSH_INTERVAL = 5.0
+
+# Управляющие элементы очереди
+_FLUSH = object()
+_STOP = object()
+
+
+class BatchWriter:
+    """Фоновая запись строк в хранилище пачками
+
+    Цикл мониторинга только кладёт строки в очередь, а поток записи
+    разбирает её пачками и сбрасывает файлы на диск, когда с прошлого
+    сброса накопилось flush_rows строк, прошло flush_interval секунд или
+    пришёл запрос flush(). При close() очередь дописывается до конца.
+
+    Если процесс убит без close() (SIGKILL, падение интерпретатора),
+    теряются строки, ещё не сброшенные в ядро: не больше flush_rows строк
+    и не больше flush_interval секунд данных.
+    """
+
+    def __init__(self, store, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.store = store
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.flushes = 0
+        self.thread = threading.Thread(target=self._run, name='writer', daemon=True)
+        self.thread.start()
+
+    def write(self, family, tick, row):
+        """Поставить строку семейства в очередь на запись"""
+        self.queue.put((family, tick, row))
+
+    def write_tick(self, tick, timestamp, wall_time):
+        """Поставить время тика в очередь на запись"""
+        self.queue.put((None, tick, (timestamp, wall_time)))
+
+    def flush(self):
+        """Попросить поток записи сбросить всё накопленное"""
+        self.queue.put(_FLUSH)
+
+    def _write(self, item):
+        family, tick, row = item
+        try:
+            if family is None:
+                self.store.write_tick(tick, *row)
+            else:
+                self.store.write(family, tick, row)
+        except Exception as e:
+            print(f"Error writing {family or 'tick'} row: {e}")
+
+    def _flush(self):
+        self.store.flush()
+        self.flushes += 1
+
+    def _run(self):
+        rows = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = _FLUSH
+
+            if item is _STOP:
+                break
+            if item is not _FLUSH:
+                self._write(item)
+                rows += 1
+                if rows < self.flush_rows and time.monotonic() < deadline:
+                    continue
+
+            if rows:
+                self._flush()
+            rows = 0
+            deadline = time.monotonic() + self.flush_interval
+
+        # Дописать всё, что успели положить до остановки
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _FLUSH and item is not _STOP:
+                self._write(item)
+        self._flush()
+
+    def close(self):
+        """Дописать очередь, сбросить и закрыть хранилище"""
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.store.close()
@@ -5,20 +5,124 @@
 Собирает метрики CPU, памяти, диска, сети и ядра
 """
 
-import sys
-from modules import PerformanceMonitor
+import argparse
+from modules import PerformanceMonitor, ProcfsMonitor, TargetSet
+from modules.rules import load_rules
+from modules.writer import FLUSH_INTERVAL, FLUSH_ROWS
+
+def parse_assignment(value):
+    """Разобрать аргумент вида NAME=SEC"""
+    name, sep, seconds = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=SEC, got {value!r}")
+    return name, float(seconds)
+
+def parse_target(value):
+    """Разобрать цель: PID, PID,PID,..., name:REGEX или tree:PID
+
+    Для одного PID возвращается число, для остальных форм -- TargetSet.
+    """
+    try:
+        if value.startswith('name:'):
+            return TargetSet(name=value[5:])
+        if value.startswith('tree:'):
+            return TargetSet(tree=int(value[5:]))
+        if ',' in value:
+            return TargetSet(pids=[int(pid) for pid in value.split(',') if pid])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid target {value!r}")
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 perf_monitor.py <PID> [output_dir] [interval]")
-        sys.exit(1)
-    
-    pid = int(sys.argv[1])
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else "monitoring_data"
-    interval = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
-
-    monitor = PerformanceMonitor(pid, output_dir)
-    monitor.monitor(interval)
+    parser = argparse.ArgumentParser(
+        prog="perf_monitor.py",
+        description="Сбор метрик производительности процесса")
+    parser.add_argument("target", type=parse_target,
+                        help="PID исследуемого процесса; несколько процессов: "
+                             "PID,PID,... , name:REGEX (по comm) или tree:PID (процесс и все потомки)")
+    parser.add_argument("output_dir", nargs="?", default="monitoring_data",
+                        help="Каталог для CSV файлов")
+    parser.add_argument("interval", nargs="?", type=float, default=1.0,
+                        help="Интервал сбора метрик в секундах (для сборщиков без --rate)")
+    parser.add_argument("--backend", choices=("procfs", "shell"), default="procfs",
+                        help="procfs -- чтение /proc напрямую, "
+                             "shell -- старый сбор через mpstat/ps/iostat/ss")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Число потоков для параллельного сбора (0 -- по очереди)")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="Дедлайн сборщика в секундах (по умолчанию равен interval)")
+    parser.add_argument("--collector-deadline", action="append", default=[],
+                        metavar="NAME=SEC", type=parse_assignment,
+                        help="Дедлайн отдельного сборщика, например tcp=3")
+    parser.add_argument("--rate", action="append", default=[],
+                        metavar="NAME=SEC", type=parse_assignment,
+                        help="Собственный интервал сборщика, например cpu=0.1 tcp=5")
+    parser.add_argument("--thread-detail", action="store_true",
+                        help="Писать метрики каждого потока в thread_detail_metrics.csv (только procfs)")
+    parser.add_argument("--tcp", choices=("procfs", "netlink"), default="procfs",
+                        help="procfs -- все сокеты хоста из /proc/net/tcp, "
+                             "netlink -- сокеты процесса через sock_diag с RTT/cwnd/ретрансмиссиями")
+    parser.add_argument("--tcp-port", type=int, default=None,
+                        help="Для --tcp netlink: учитывать сокеты этого порта вместо сокетов процесса")
+    parser.add_argument("--format", choices=("binary", "csv"), default="binary",
+                        help="binary -- типизированные записи с schema.json (CSV можно получить через export_csv.py), "
+                             "csv -- текстовые CSV как раньше")
+    parser.add_argument("--flush-rows", type=int, default=FLUSH_ROWS,
+                        help="Сбрасывать данные на диск каждые N строк")
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL,
+                        help="Сбрасывать данные на диск не реже чем раз в T секунд "
+                             "(при SIGKILL теряется не больше этого окна)")
+    parser.add_argument("--segment", type=float, default=None, metavar="SEC",
+                        help="Писать данные сегментами по SEC секунд (например 3600) с manifest.json")
+    parser.add_argument("--retain-mb", type=float, default=None,
+                        help="С --segment: удалять старые сегменты, когда все вместе больше стольких МБ")
+    parser.add_argument("--retain-age", type=float, default=None, metavar="SEC",
+                        help="С --segment: удалять сегменты старше SEC секунд")
+    parser.add_argument("--retain-raw-age", type=float, default=None, metavar="SEC",
+                        help="С --segment: в сегментах старше SEC секунд оставлять только свёртки 10s/1m")
+    parser.add_argument("--no-rollup", dest="rollup", action="store_false",
+                        help="Не строить свёртки 10s/1m во время сбора")
+    parser.add_argument("--ring", type=int, default=0, metavar="N",
+                        help="Публиковать последние N строк каждого семейства в /dev/shm для живых читателей")
+    parser.add_argument("--detect", action="store_true",
+                        help="Проверять правила аномалий во время сбора и писать их в anomalies.jsonl")
+    parser.add_argument("--rules", default=None, metavar="FILE",
+                        help="С --detect: JSON файл с правилами вместо встроенных (как у detecting.py)")
+    args = parser.parse_args()
+
+    if args.segment is None and any(value is not None for value in (args.retain_mb, args.retain_age, args.retain_raw_age)):
+        parser.error("--retain-mb, --retain-age and --retain-raw-age require --segment")
+    if args.retain_raw_age is not None and not args.rollup:
+        parser.error("--retain-raw-age requires rollups")
+    if args.rules is not None:
+        if not args.detect:
+            parser.error("--rules requires --detect")
+        try:
+            args.detect = load_rules(args.rules)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot load rules: {e}")
+
+    store_options = dict(store=args.format, flush_rows=args.flush_rows, flush_interval=args.flush_interval,
+                         segment_seconds=args.segment, max_age=args.retain_age,
+                         raw_max_age=args.retain_raw_age, rollup=args.rollup, ring=args.ring,
+                         detect=args.detect,
+                         max_bytes=args.retain_mb * 1024 * 1024 if args.retain_mb is not None else None)
+    procfs_options = dict(thread_detail=args.thread_detail, tcp_source=args.tcp, tcp_port=args.tcp_port,
+                          **store_options)
+
+    if isinstance(args.target, TargetSet):
+        if args.backend != 'procfs':
+            parser.error("several targets are supported only by the procfs backend")
+        monitor = ProcfsMonitor(None, args.output_dir, targets=args.target, **procfs_options)
+        print(f"Tracking {len(args.target.current)} processes: {list(args.target.current.items())}")
+    elif args.backend == 'procfs':
+        monitor = ProcfsMonitor(args.target, args.output_dir, **procfs_options)
+    else:
+        if args.thread_detail or args.tcp != 'procfs':
+            parser.error("--thread-detail and --tcp netlink are supported only by the procfs backend")
+        monitor = PerformanceMonitor(args.target, args.output_dir, **store_options)
+    monitor.monitor(args.interval, workers=args.workers, deadline=args.deadline,
+                    deadlines=dict(args.collector_deadline), intervals=dict(args.rate))
 
 if __name__ == "__main__":
     main()
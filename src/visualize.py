@@ -4,13 +4,52 @@
 Визуализация собранных метрик производительности
 Создаёт графики для анализа CPU, памяти, диска, сети и прерываний
 """
-import sys
+import argparse
 from modules import MetricsVisualizer
+from modules.batch_detector import run_data_dir
+from modules.dashboard import HOST, INTERVAL, PORT
+from modules.visualizer import DPI, FORMATS, render_plots
 
 def main():
-    data_dir = sys.argv[1] if len(sys.argv) > 1 else "monitoring_data"
+    parser = argparse.ArgumentParser(description="Графики метрик производительности")
+    parser.add_argument("data_dirs", nargs="*", default=["monitoring_data"], metavar="data_dir",
+                        help="Каталоги с метриками монитора или каталоги прогонов performance_analysis_* "
+                             "(несколько -- параллельный режим)")
+    parser.add_argument("--from", dest="start", type=float, default=None, metavar="SEC",
+                        help="Начало окна анализа (секунды timestamp)")
+    parser.add_argument("--to", dest="end", type=float, default=None, metavar="SEC",
+                        help="Конец окна анализа (секунды timestamp)")
+    parser.add_argument("--tier", choices=("auto", "raw", "10s", "1m"), default="auto",
+                        help="Уровень данных: auto -- самая грубая свёртка, разрешающая окно")
+    parser.add_argument("--cache", action="store_true",
+                        help="Кэшировать разобранные метрики в <data_dir>/.cache: повторный анализ почти бесплатен")
+    parser.add_argument("--format", choices=FORMATS, default="png", help="Формат файлов графиков")
+    parser.add_argument("--dpi", type=int, default=DPI, help=f"Разрешение png графиков (по умолчанию {DPI})")
+    parser.add_argument("--full-resolution", action="store_true",
+                        help="Рисовать все сэмплы: без прореживания рядов до огибающей min/max по пикселям оси")
+    parser.add_argument("--jobs", type=int, default=None, metavar="N",
+                        help="Параллельный режим: графики (прогон x график) в N процессах (по умолчанию -- все ядра)")
+    parser.add_argument("--live", action="store_true",
+                        help="Вместо файлов графиков -- живая панель в браузере с новыми сэмплами работающего "
+                             "монитора (нужен monitoring.py --ring N)")
+    parser.add_argument("--host", default=HOST, help=f"Адрес панели --live (по умолчанию {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Порт панели --live (по умолчанию {PORT})")
+    parser.add_argument("--refresh", type=float, default=INTERVAL, metavar="SEC",
+                        help=f"Как часто панель --live проверяет новые сэмплы (по умолчанию {INTERVAL:g} с)")
+    args = parser.parse_args()
+    window = (args.start, args.end) if args.start is not None or args.end is not None else None
+    options = dict(window=window, tier=None if args.tier == 'raw' else args.tier, cache=args.cache,
+                   format=args.format, dpi=args.dpi, full_resolution=args.full_resolution)
 
-    visualizer = MetricsVisualizer(data_dir)
+    if args.live:
+        if len(args.data_dirs) > 1:
+            parser.error("--live shows one run at a time")
+        MetricsVisualizer(run_data_dir(args.data_dirs[0]), **options).serve_live(args.host, args.port, args.refresh)
+        return
+    if len(args.data_dirs) > 1 or args.jobs is not None:
+        render_plots(args.data_dirs, args.jobs, **options)
+        return
+    visualizer = MetricsVisualizer(run_data_dir(args.data_dirs[0]), **options)
     visualizer.create_all_plots()
 
 if __name__ == "__main__":